@@ -5,7 +5,8 @@ import json
 
 from django import forms
 from django.conf import settings
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.admin.widgets import SELECT2_TRANSLATIONS, AutocompleteSelect
 from django.core import validators
 from django.core.exceptions import ValidationError
@@ -17,15 +18,53 @@ from django_object_actions import DjangoObjectActions
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.locator import BlockUsageLocator, CourseLocator
 
-from .compat import (
-    course_exists,
-    create_course,
-    get_course_outline,
-    organization_options,
-    sequence_does_not_exist_exception,
-)
+from .compat import modulestore, outlines, sequence_does_not_exist_exception
+from .graph import LinkCycleError, refresh_cascade
+from .linked_keys import linked_source_sections
+from .locks import RefreshInProgress
+from .lookups import organization_options
 from .models import SectionToCourseLink
-from .utils import paste_from_template
+from .profiling import PROFILE_PARAMETER, counting, profiled
+from .progress import CacheProgressReporter
+from .throttle import RefreshThrottled, admin_wait, throttle_state
+from .utils import MAX_COURSE_KEY_LENGTH, create_course_from_sections, paste_from_template, refresh_links
+
+# Name of the request parameter the admin's scripts use to identify a refresh they'd like to poll progress for.
+PROGRESS_JOB_PARAMETER = '_progress_job'
+# Attribute of a request saying why the course it asked for couldn't be created, for the form to show.
+REFRESH_ERROR_ATTRIBUTE = 'section_to_course_refresh_error'
+
+
+def progress_reporter(request):
+    """
+    Get a progress callback which stores progress for the job named in a request, if any.
+    """
+    job_id = request.POST.get(PROGRESS_JOB_PARAMETER) or request.GET.get(PROGRESS_JOB_PARAMETER)
+    return CacheProgressReporter(job_id) if job_id else None
+
+
+def autocomplete_media():
+    """
+    Gather the static assets required for our autocomplete fields.
+    """
+    extra = '' if settings.DEBUG else '.min'
+    i18n_name = SELECT2_TRANSLATIONS.get(get_language())
+    i18n_file = ('admin/js/vendor/select2/i18n/%s.js' % i18n_name,) if i18n_name else ()
+    return forms.Media(
+        js=(
+               'admin/js/vendor/jquery/jquery%s.js' % extra,
+               'admin/js/vendor/select2/select2.full%s.js' % extra,
+           ) + i18n_file + (
+               'admin/js/jquery.init.js',
+               'section_to_course/js/admin-tools.js',
+           ),
+        css={
+            'screen': (
+                'admin/css/vendor/select2/select2%s.css' % extra,
+                'admin/css/autocomplete.css',
+            ),
+        },
+    )
 
 
 class ArbitraryAutocompleteSelect(AutocompleteSelect):
@@ -88,6 +127,18 @@ class CourseAutocompleteSelect(ArbitraryAutocompleteSelect):
         return reverse('section_to_course:course_autocomplete')
 
 
+class OrganizationAutocompleteSelect(ArbitraryAutocompleteSelect):
+    """
+    Widget which will autocomplete organization short names.
+    """
+
+    def get_url(self):
+        """
+        Get the URL for the organization autocomplete function.
+        """
+        return reverse('section_to_course:organization_autocomplete')
+
+
 class SectionAutocompleteSelect(ArbitraryAutocompleteSelect):
     """
     Widget which will autocomplete section IDs.
@@ -132,24 +183,7 @@ class SectionAutocompleteSelect(ArbitraryAutocompleteSelect):
         """
         Gather the static assets required for our autocomplete field.
         """
-        extra = '' if settings.DEBUG else '.min'
-        i18n_name = SELECT2_TRANSLATIONS.get(get_language())
-        i18n_file = ('admin/js/vendor/select2/i18n/%s.js' % i18n_name,) if i18n_name else ()
-        return forms.Media(
-            js=(
-                   'admin/js/vendor/jquery/jquery%s.js' % extra,
-                   'admin/js/vendor/select2/select2.full%s.js' % extra,
-               ) + i18n_file + (
-                   'admin/js/jquery.init.js',
-                   'section_to_course/js/admin-tools.js',
-               ),
-            css={
-                'screen': (
-                    'admin/css/vendor/select2/select2%s.css' % extra,
-                    'admin/css/autocomplete.css',
-                ),
-            },
-        )
+        return autocomplete_media()
 
 
 class CreateSectionToCourseLink(forms.ModelForm):
@@ -168,14 +202,20 @@ class CreateSectionToCourseLink(forms.ModelForm):
             course_field='source_course_id',
         ),
     )
+    additional_source_section_ids = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 3}),
+        help_text=_('Optional. The IDs of more sections to copy into the new course after the first, one per '
+                    'line, in order. These may come from any course.'),
+    )
     new_course_name = forms.CharField(
         max_length=255,
         widget=forms.TextInput(attrs={'placeholder': _('e.g. Introduction to Computer Science')}),
         help_text=_('The public display name for your course. This cannot be changed, '
                     'but you can set a different display name in Advanced Settings later.'),
     )
-    new_course_org = forms.ChoiceField(
-        choices=tuple(),
+    new_course_org = forms.CharField(
+        widget=OrganizationAutocompleteSelect('new_course_org'),
         help_text=_('The name of the organization sponsoring the course. Note: The organization '
                     'name is part of the course URL. This cannot be changed, but you can set a '
                     'different display name in Advanced Settings later. If your organization '
@@ -196,22 +236,64 @@ class CreateSectionToCourseLink(forms.ModelForm):
         validators=[validators.validate_slug],
     )
 
-    def __init__(self, *args, user, **kwargs):
+    def __init__(self, *args, user, refresh_error=None, **kwargs):
         """
-        Initialize the form with a user.
+        Initialize the form with a user, and the reason the course couldn't be created, if saving it failed.
         """
         self.user = user
+        self.refresh_error = refresh_error
         super().__init__(*args, **kwargs)
-        self.fields['new_course_org'].choices = organization_options()
+
+    def clean_new_course_org(self):
+        """
+        Make sure the organization exists.
+        """
+        org = self.cleaned_data.get('new_course_org', '')
+        if org not in {short_name for short_name, _name in organization_options() if short_name}:
+            raise ValidationError(_('Select a valid organization.'))
+        return org
 
     def clean_source_section_id(self):
         """
-        Convert the section ID into a BlockUsageLocator.
+        Convert the section ID into a BlockUsageLocator, making sure the section exists and isn't already linked.
         """
         try:
-            return BlockUsageLocator.from_string(self.cleaned_data.get('source_section_id', ''))
+            section_key = BlockUsageLocator.from_string(self.cleaned_data.get('source_section_id', ''))
         except InvalidKeyError as err:
             raise ValidationError(str(err)) from err
+        # Check now, since by the time the section is loaded, the new course will already have been created.
+        if not counting(modulestore(), 'modulestore').has_item(section_key):
+            raise ValidationError(_('This section does not exist.'))
+        # Like the section autocomplete, don't allow a section to be created into more than one mini-course.
+        if str(section_key) in linked_source_sections():
+            raise ValidationError(_('This section has already been made into a course.'))
+        return section_key
+
+    def clean_additional_source_section_ids(self):
+        """
+        Convert the additional section IDs into a list of BlockUsageLocators, making sure the sections exist.
+
+        Like the first section, sections which are already linked are rejected.
+        """
+        linked_sections = linked_source_sections()
+        section_keys = []
+        for line in self.cleaned_data.get('additional_source_section_ids', '').splitlines():
+            if not line.strip():
+                continue
+            try:
+                section_key = BlockUsageLocator.from_string(line.strip())
+            except InvalidKeyError as err:
+                raise ValidationError(str(err)) from err
+            if not counting(modulestore(), 'modulestore').has_item(section_key):
+                raise ValidationError(_('Section {section_id} does not exist.').format(section_id=section_key))
+            if str(section_key) in linked_sections:
+                raise ValidationError(
+                    _('Section {section_id} has already been made into a course.').format(section_id=section_key),
+                )
+            if section_key in section_keys:
+                raise ValidationError(_('Section {section_id} is listed twice.').format(section_id=section_key))
+            section_keys.append(section_key)
+        return section_keys
 
     def save_m2m(self):  # pylint: disable=method-hidden
         """Shim function that allows the form to save properly."""
@@ -221,18 +303,22 @@ class CreateSectionToCourseLink(forms.ModelForm):
         Validate the form, raising an error if the course key is too long or already exists.
         """
         super().clean()
+        if self.refresh_error:
+            raise ValidationError(self.refresh_error)
+        if self.cleaned_data.get('source_section_id') in self.cleaned_data.get('additional_source_section_ids', []):
+            raise ValidationError(_('The first section is also listed among the additional sections.'))
         org = self.cleaned_data.get('new_course_org', '')
         number = self.cleaned_data.get('new_course_number', '')
         run = self.cleaned_data.get('new_course_run', '')
         if not all((org, number, run)):
             # Validation error will pop up elsewhere.
             return self.cleaned_data
-        if len(run + number + org) > 65:
+        if len(run + number + org) > MAX_COURSE_KEY_LENGTH:
             raise ValidationError(
                 _('The course key is too long. Org, number, and run must be less than 65 characters total.'),
             )
         key = CourseLocator(org, number, run)
-        if course_exists(key):
+        if counting(modulestore(), 'modulestore').has_course(key):
             raise ValidationError(
                 _('A course with this number, org, and run already exists. Please choose different values.')
             )
@@ -240,24 +326,23 @@ class CreateSectionToCourseLink(forms.ModelForm):
 
     def save(self, *args, **kwargs):
         """
-        Create the course and then copy the section into it.
+        Create the course and then copy the sections into it, returning the link for the first section.
+
+        Someone is waiting on the page, so this only waits briefly for a turn, raising RefreshThrottled
+        before the course is created if it doesn't get one.
         """
         cleaned_data = self.cleaned_data
-        org = cleaned_data['new_course_org']
-        number = cleaned_data['new_course_number']
-        run = cleaned_data['new_course_run']
-        course = create_course(
+        return create_course_from_sections(
+            source_block_usage_keys=[
+                cleaned_data['source_section_id'], *cleaned_data.get('additional_source_section_ids', []),
+            ],
             user=self.user,
-            org=org,
-            number=number,
-            run=run,
+            org=cleaned_data['new_course_org'],
+            number=cleaned_data['new_course_number'],
+            run=cleaned_data['new_course_run'],
             display_name=cleaned_data['new_course_name'],
-        )
-        return paste_from_template(
-            destination_course_key=course.id,
-            source_block_usage_key=cleaned_data['source_section_id'],
-            user=self.user,
-        )
+            throttle_wait=admin_wait(),
+        )[0]
 
     class Meta:
         """
@@ -267,6 +352,7 @@ class CreateSectionToCourseLink(forms.ModelForm):
         fields = (
             'source_course_id',
             'source_section_id',
+            'additional_source_section_ids',
             'new_course_name',
             'new_course_org',
             'new_course_number',
@@ -276,15 +362,113 @@ class CreateSectionToCourseLink(forms.ModelForm):
 
 
 @admin.action(description=_('Refresh section content from source.'))
+@profiled
 def refresh_courses(model_admin, request, queryset):
     """Refresh selected courses in the admin."""
-    for item in queryset:
-        paste_from_template(
-            destination_course_key=item.destination_course_id,
-            source_block_usage_key=item.source_section_id,
-            user=request.user,
+    links = list(queryset)
+    refreshed = refresh_links(
+        links, user=request.user, progress=progress_reporter(request), throttle_wait=admin_wait(),
+    )
+    model_admin.message_user(request, _('Refreshed {} courses successfully.').format(len(refreshed)))
+    if len(refreshed) < len(links):
+        model_admin.message_user(
+            request,
+            _('Skipped {} courses which waited too long for other refreshes of them, or for their turn.').format(
+                len(links) - len(refreshed),
+            ),
+            level=messages.WARNING,
         )
-    model_admin.message_user(request, _('Refreshed {} courses successfully.').format(queryset.count()))
+
+
+@admin.action(description=_('Refresh section content from source, then refresh courses built from these.'))
+@profiled
+def refresh_courses_cascade(model_admin, request, queryset):
+    """Refresh selected courses in the admin, along with any courses that use them as a source."""
+    try:
+        result = refresh_cascade(list(queryset), user=request.user, throttle_wait=admin_wait())
+    except LinkCycleError as err:
+        model_admin.message_user(request, str(err), level=messages.ERROR)
+        return
+    model_admin.message_user(request, _('Refreshed {} courses successfully.').format(len(result.refreshed)))
+    if result.skipped:
+        model_admin.message_user(
+            request,
+            _('Skipped {} courses which were busy or throttled, or which are built from courses that were.').format(
+                len(result.skipped),
+            ),
+            level=messages.WARNING,
+        )
+
+
+class LinkFieldAutocompleteFilter(admin.FieldListFilter):
+    """
+    List filter for a course key field which looks up its choices as the user types.
+
+    The stock list filter lists every distinct value of the field in the sidebar, which means scanning the
+    whole table on every changelist load.
+    """
+
+    template = 'section_to_course/admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        """
+        Set up the lookup parameter before the parent class collects it from the query string.
+        """
+        self.lookup_kwarg = field_path
+        self.lookup_val = params.get(field_path)
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def expected_parameters(self):
+        """
+        Get the query string parameters this filter uses.
+        """
+        return [self.lookup_kwarg]
+
+    def has_output(self):
+        """
+        Show the filter even without choices, since they are loaded on demand.
+        """
+        return True
+
+    def choices(self, changelist):
+        """
+        List only the option to clear the filter and the currently selected value.
+        """
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+        }
+        if self.lookup_val is not None:
+            yield {
+                'selected': True,
+                'query_string': changelist.get_query_string({self.lookup_kwarg: self.lookup_val}),
+                'display': self.lookup_val,
+            }
+
+    def endpoint(self):
+        """
+        Get the URL the filter's choices are loaded from.
+        """
+        return reverse('section_to_course:link_field_autocomplete', kwargs={'field': self.field_path})
+
+
+class ReadReplicaChangeList(ChangeList):
+    """
+    Changelist which reads the links it lists from the read replica, if there is one.
+
+    Only GETs of the list use the replica. Running an action reads from the primary, since it may go on to
+    change the links it reads, and so does every other admin view, like the change form, which would
+    otherwise fail to find a link that was just added until the replica caught up.
+    """
+
+    def get_queryset(self, request):
+        """
+        Get the links to list, from the read replica when the list is only being displayed.
+        """
+        if request.method == 'GET':
+            self.root_queryset = self.root_queryset.for_reads()
+        return super().get_queryset(request)
 
 
 class SectionToCourseLinkAdmin(DjangoObjectActions, admin.ModelAdmin):
@@ -292,31 +476,120 @@ class SectionToCourseLinkAdmin(DjangoObjectActions, admin.ModelAdmin):
     Admin view for section to course links.
     """
 
-    list_display = ('name', 'source_course_id', 'source_section_id', 'destination_course_id', 'last_refresh', 'link')
-    list_filter = ('source_course_id', 'destination_course_id')
-    actions = [refresh_courses]
+    list_display = (
+        'name',
+        'source_course_id',
+        'source_section_id',
+        'destination_course_id',
+        'last_refresh',
+        'auto_refresh',
+        'link',
+    )
+    list_filter = (
+        ('source_course_id', LinkFieldAutocompleteFilter),
+        ('destination_course_id', LinkFieldAutocompleteFilter),
+    )
+    search_fields = ('source_course_id', 'destination_course_id', 'source_section_id', 'destination_section_id')
+    # Counting every link on each page load gets slow once there are many of them.
+    show_full_result_count = False
+    actions = [refresh_courses, refresh_courses_cascade]
     change_actions = ('refresh_this', )
+    change_list_template = 'section_to_course/admin/change_list.html'
+    change_form_template = 'section_to_course/admin/change_form.html'
 
+    @property
+    def media(self):
+        """
+        Include the assets for our autocomplete list filters.
+        """
+        return super().media + autocomplete_media()
+
+    @profiled
+    def changelist_view(self, request, extra_context=None):
+        """
+        Show the list of links, along with the state of the refresh throttles, profiling it if asked to.
+        """
+        if PROFILE_PARAMETER in request.GET:
+            # The changelist would otherwise take the parameter for a filter it doesn't know.
+            request.GET = request.GET.copy()
+            del request.GET[PROFILE_PARAMETER]
+        extra_context = {**(extra_context or {}), 'throttle_state': throttle_state()}
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def get_changelist(self, request, **kwargs):
+        """
+        Get the changelist class, which reads from the read replica when only displaying links.
+        """
+        return ReadReplicaChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search links by key prefix, which can use the indexes on the key columns.
+        """
+        return queryset.search(search_term), False
+
+    @profiled
     def refresh_this(self, request, obj):
         """
         Refresh this course from its source via a special button on the edit page.
+
+        Someone is waiting on the page, so this only waits briefly for a turn. If it doesn't get one, links
+        which refresh automatically are queued to refresh in the background instead, and others are rejected.
         """
-        paste_from_template(
-            destination_course_key=obj.destination_course_id,
-            source_block_usage_key=obj.source_section_id,
-            user=request.user,
-        )
+        try:
+            paste_from_template(
+                destination_course_key=obj.destination_course_id,
+                source_block_usage_key=obj.source_section_id,
+                user=request.user,
+                progress=progress_reporter(request),
+                throttle_wait=admin_wait(),
+            )
+        except RefreshThrottled:
+            if obj.auto_refresh:
+                # Deferred so that loading the admin doesn't pull in Celery.
+                from .tasks import schedule_auto_refresh  # pylint: disable=import-outside-toplevel
+                schedule_auto_refresh([obj.id])
+                self.message_user(
+                    request,
+                    _("Too many courses are being refreshed right now, so this refresh has been queued."),
+                    level=messages.WARNING,
+                )
+            else:
+                self.message_user(
+                    request,
+                    _("Too many courses are being refreshed right now, so this refresh was rejected. Try again later."),
+                    level=messages.WARNING,
+                )
+            return
+        except RefreshInProgress:
+            self.message_user(
+                request, _("Another refresh of this course is still running. Try again later."), level=messages.WARNING,
+            )
+            return
         self.message_user(request, _("Refreshed course successfully."))
 
     refresh_this.label = _("Refresh Course Content")
     refresh_this.short_description = _("Refresh this course's content from the source section.")
 
+    def get_changelist_instance(self, request):
+        """
+        Look up the course names for the current page of links all at once.
+        """
+        changelist = super().get_changelist_instance(request)
+        links = list(changelist.result_list)
+        titles = counting(outlines(), 'outline').get_course_titles({link.destination_course_id for link in links})
+        for link in links:
+            link.destination_course_title = titles.get(link.destination_course_id)
+        return changelist
+
     def name(self, obj):  # pylint: disable=no-self-use
         """
         Display course name.
         """
+        if hasattr(obj, 'destination_course_title'):
+            return obj.destination_course_title or str(obj.destination_course_id)
         try:
-            dest_course_outline = get_course_outline(obj.destination_course_id)
+            dest_course_outline = counting(outlines(), 'outline').get_course_outline(obj.destination_course_id)
         except sequence_does_not_exist_exception():
             # Add in some resilience here in case we deleted the course.
             dest_course_outline = None
@@ -352,6 +625,22 @@ class SectionToCourseLinkAdmin(DjangoObjectActions, admin.ModelAdmin):
             'link',
         )
 
+    def add_view(self, request, form_url='', extra_context=None):
+        """
+        Create a course, showing the form again with an error if there was no turn to copy sections into it.
+
+        The course is only created once there's a turn, so nothing has been created by then.
+        """
+        try:
+            return super().add_view(request, form_url, extra_context)
+        except RefreshThrottled:
+            setattr(
+                request,
+                REFRESH_ERROR_ATTRIBUTE,
+                _('Too many courses are being created or refreshed right now. Try again in a few minutes.'),
+            )
+            return super().add_view(request, form_url, extra_context)
+
     def get_form(self, request, obj, *args, **kwargs):
         """
         Change form depending on whether we're creating a new SectionToCourseLink or not.
@@ -361,6 +650,7 @@ class SectionToCourseLinkAdmin(DjangoObjectActions, admin.ModelAdmin):
             class UserAugmentedForm(CreateSectionToCourseLink):
                 def __new__(cls, *args, **kwargs):
                     kwargs['user'] = request.user
+                    kwargs['refresh_error'] = getattr(request, REFRESH_ERROR_ATTRIBUTE, None)
                     return CreateSectionToCourseLink(*args, **kwargs)
                 user = request.user
             return UserAugmentedForm
@@ -4,12 +4,17 @@ Tests for the API views of section_to_course.
 
 # pylint: disable=no-self-use
 from common.djangoapps.student.tests.factories import UserFactory
+from django.test import override_settings
 from django.urls import reverse
+from opaque_keys.edx.locator import CourseLocator
+from organizations.tests.factories import OrganizationFactory
 from rest_framework import status
 from rest_framework.test import APITestCase
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 
-from section_to_course.compat import update_outline_from_modulestore
+from section_to_course.compat import course_published_signal, update_outline_from_modulestore
+from section_to_course.profiling import PROFILE_HEADER
+from section_to_course.progress import DONE, CacheProgressReporter, ProgressTracker
 from section_to_course.tests.factories import SectionToCourseLinkFactory
 
 try:
@@ -103,6 +108,49 @@ class TestCourseAutoCompleteAPI(ModuleStoreTestCase, APITestCase):
         assert response.status_code == status.HTTP_200_OK
         assert response.data == result_data
 
+    def test_filters_org(self):
+        """
+        Test that results can be limited to one organization.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        self.create_courses()
+        response = self.client.get(reverse('section_to_course:course_autocomplete'), {'org': 'OpenCraft'})
+        assert response.status_code == status.HTTP_200_OK
+        assert [result['id'] for result in response.data['results']] == [
+            'course-v1:OpenCraft+Tutorials+Basic_Questions',
+        ]
+
+
+class TestOrganizationAutoCompleteAPI(APITestCase):
+    """
+    Tests for the organization autocomplete API.
+    """
+
+    def test_rejects_unauthorized(self):
+        """
+        Test that the API rejects unauthorized users.
+        """
+        user = UserFactory.create()
+        assert self.client.login(username=user.username, password='test')
+        response = self.client.get(reverse('section_to_course:organization_autocomplete'))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_filters_organizations(self):
+        """
+        Test that organizations are filtered by short name and name, and that new ones show up.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        OrganizationFactory(short_name='edX', name='edX Inc')
+        url = reverse('section_to_course:organization_autocomplete')
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'results': [{'id': 'edX', 'text': 'edX Inc (edX)'}]}
+        OrganizationFactory(short_name='OpenCraft', name='OpenCraft GmbH')
+        response = self.client.get(url, {'term': 'gmbh'})
+        assert response.data == {'results': [{'id': 'OpenCraft', 'text': 'OpenCraft GmbH (OpenCraft)'}]}
+
 
 def create_subsections():
     """Create some subsections."""
@@ -238,3 +286,276 @@ class TestSectionAutoCompleteAPI(ModuleStoreTestCase, APITestCase):
                 {'id': 'block-v1:edX+DemoX+Demo_Course+type@chapter+block@Experimentation', 'text': 'Experimentation'},
                 {'id': 'block-v1:edX+DemoX+Demo_Course+type@chapter+block@Elucidation', 'text': 'Elucidation'}],
         }
+
+    def test_without_outline(self):
+        """
+        Test that sections are listed from the modulestore when the course has no outline yet.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        course = CourseFactory(display_name='Demo Course', org='edX', course='DemoX')
+        BlockFactory(parent=course, category='chapter', display_name='Experimentation')
+        response = self.client.get(
+            reverse('section_to_course:section_autocomplete', kwargs={'course_id': 'course-v1:edX+DemoX+Demo_Course'})
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            'results': [
+                {'id': 'block-v1:edX+DemoX+Demo_Course+type@chapter+block@Experimentation', 'text': 'Experimentation'},
+            ],
+        }
+
+    def test_refreshes_after_publish(self):
+        """
+        Test that the cached sections of a course are cleared when it's published.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        section_data = create_subsections()
+        url = reverse('section_to_course:section_autocomplete', kwargs={'course_id': 'course-v1:edX+DemoX+Demo_Course'})
+        assert len(self.client.get(url).data['results']) == 3
+        BlockFactory(parent=section_data['course'], category='chapter', display_name='Fabrication')
+        update_outline_from_modulestore(section_data['course'].id)
+        assert len(self.client.get(url).data['results']) == 3
+        course_published_signal().send(sender=None, course_key=section_data['course'].id)
+        assert len(self.client.get(url).data['results']) == 4
+
+
+class TestLinkFieldAutocompleteAPI(ModuleStoreTestCase, APITestCase):
+    """
+    Tests for the link field autocomplete API.
+    """
+
+    def setUp(self):
+        """
+        Log in as a staff user.
+        """
+        super().setUp()
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+
+    def test_rejects_unauthorized(self):
+        """
+        Test that the API rejects unauthorized users.
+        """
+        user = UserFactory.create()
+        assert self.client.login(username=user.username, password='test')
+        response = self.client.get(
+            reverse('section_to_course:link_field_autocomplete', kwargs={'field': 'destination_course_id'}),
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_rejects_unknown_field(self):
+        """
+        Test that only course key fields can be looked up.
+        """
+        response = self.client.get(
+            reverse('section_to_course:link_field_autocomplete', kwargs={'field': 'last_refresh'}),
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_filters_distinct_keys(self):
+        """
+        Test that distinct keys are listed, filtered by prefix.
+        """
+        source = create_subsections()
+        for destination in (CourseLocator('foo', 'bar', 'baz'), CourseLocator('qux', 'bar', 'baz')):
+            SectionToCourseLinkFactory(
+                source_course=source['course'],
+                source_section=source['experimentation'],
+                destination_course=None,
+                destination_course_id=destination,
+            )
+        url = reverse('section_to_course:link_field_autocomplete', kwargs={'field': 'source_course_id'})
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            'results': [{'id': 'course-v1:edX+DemoX+Demo_Course', 'text': 'course-v1:edX+DemoX+Demo_Course'}],
+        }
+        url = reverse('section_to_course:link_field_autocomplete', kwargs={'field': 'destination_course_id'})
+        response = self.client.get(url, {'term': 'qux'})
+        assert response.data == {'results': [{'id': 'course-v1:qux+bar+baz', 'text': 'course-v1:qux+bar+baz'}]}
+
+
+class TestRefreshProgressAPI(APITestCase):
+    """
+    Tests for the refresh progress API.
+    """
+
+    def test_rejects_unauthorized(self):
+        """
+        Test that the API rejects unauthorized users.
+        """
+        user = UserFactory.create()
+        assert self.client.login(username=user.username, password='test')
+        response = self.client.get(reverse('section_to_course:refresh_progress', kwargs={'job_id': 'job-1'}))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_progress(self):
+        """
+        Test that the latest progress of a job is returned.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        url = reverse('section_to_course:refresh_progress', kwargs={'job_id': 'job-1'})
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        ProgressTracker(CacheProgressReporter('job-1')).report(DONE)
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['phase'] == DONE
+        assert response.data['fraction'] == 1
+
+
+class TestValidateNewCoursesAPI(ModuleStoreTestCase, APITestCase):
+    """
+    Tests for the bulk validation API.
+    """
+
+    def test_rejects_unauthorized(self):
+        """
+        Test that the API rejects unauthorized users.
+        """
+        user = UserFactory.create()
+        assert self.client.login(username=user.username, password='test')
+        response = self.client.post(reverse('section_to_course:validate_new_courses'), {'rows': []}, format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_rejects_malformed(self):
+        """
+        Test that the API rejects bodies without a list of rows.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        for data in ({}, {'rows': 'bogus'}, {'rows': ['bogus']}):
+            response = self.client.post(reverse('section_to_course:validate_new_courses'), data, format='json')
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_validates_rows(self):
+        """
+        Test that each row gets a verdict.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        sections = create_subsections()
+        response = self.client.post(
+            reverse('section_to_course:validate_new_courses'),
+            {'rows': [
+                {'org': 'edX', 'number': 'DemoX', 'run': 'Demo_Course', 'source_section_id': 'bogus'},
+                {
+                    'org': 'edX', 'number': 'DemoX', 'run': 'Demo_Course',
+                    'source_section_id': str(sections['postulation'].location),
+                },
+            ]},
+            format='json',
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [verdict['valid'] for verdict in response.data['results']] == [False, False]
+        assert 'The source section ID is not a valid usage key.' in response.data['results'][0]['errors']
+
+
+class TestExportLinksAPI(ModuleStoreTestCase, APITestCase):
+    """
+    Tests for the link export API.
+    """
+
+    def test_rejects_unauthorized(self):
+        """
+        Test that the API rejects unauthorized users.
+        """
+        user = UserFactory.create()
+        assert self.client.login(username=user.username, password='test')
+        response = self.client.get(reverse('section_to_course:export_links', kwargs={'export_format': 'csv'}))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_export(self):
+        """
+        Test that links are streamed in each format, and unknown formats are rejected.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        link = SectionToCourseLinkFactory.create()
+        response = self.client.get(reverse('section_to_course:export_links', kwargs={'export_format': 'csv'}))
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'text/csv'
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        assert lines[0].startswith('id,source_course_id,source_course_title,')
+        assert lines[1].startswith(f'{link.id},{link.source_course_id},')
+        response = self.client.get(reverse('section_to_course:export_links', kwargs={'export_format': 'jsonl'}))
+        assert response.status_code == status.HTTP_200_OK
+        assert b''.join(response.streaming_content).count(b'\n') == 1
+        response = self.client.get(reverse('section_to_course:export_links', kwargs={'export_format': 'xml'}))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert 'details' in response.data
+
+
+class TestProfileResultAPI(ModuleStoreTestCase, APITestCase):
+    """
+    Tests for profiling the API views and fetching the results.
+    """
+
+    def test_profile(self):
+        """
+        Test that a profiled autocomplete request can be fetched by the ID in its response.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        CourseFactory.create()
+        with override_settings(SECTION_TO_COURSE_PROFILING=True):
+            response = self.client.get(reverse('section_to_course:course_autocomplete'), {'_profile': ''})
+        assert response.status_code == status.HTTP_200_OK
+        profile_id = response[PROFILE_HEADER]
+        response = self.client.get(reverse('section_to_course:profile_result', kwargs={'profile_id': profile_id}))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['label'] == 'CourseAutocomplete.get'
+        response = self.client.get(reverse('section_to_course:profile_result', kwargs={'profile_id': 'missing'}))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestMetricsAPI(ModuleStoreTestCase, APITestCase):
+    """
+    Tests for the metrics endpoint.
+    """
+
+    def test_rejects_unauthorized(self):
+        """
+        Test that only staff can read the metrics.
+        """
+        user = UserFactory.create()
+        assert self.client.login(username=user.username, password='test')
+        response = self.client.get(reverse('section_to_course:metrics'))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_metrics(self):
+        """
+        Test that autocomplete requests show up in the metrics.
+        """
+        user = UserFactory.create(is_staff=True)
+        assert self.client.login(username=user.username, password='test')
+        CourseFactory.create()
+        self.client.get(reverse('section_to_course:course_autocomplete'))
+        response = self.client.get(reverse('section_to_course:metrics'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        lines = response.content.decode('utf-8').splitlines()
+        assert 'section_to_course_autocomplete_seconds_count{autocomplete="course"} 1' in lines
+        assert 'section_to_course_autocomplete_results_bucket{autocomplete="course",le="1"} 1' in lines
+        assert 'section_to_course_auto_refreshes_queued 0' in lines
+
+    @override_settings(SECTION_TO_COURSE_METRICS_TOKEN='scraper-token')
+    def test_token(self):
+        """
+        Test that a scraper can read the metrics with the configured bearer token, and only with it.
+        """
+        url = reverse('section_to_course:metrics')
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer scraper-token')
+        assert response.status_code == status.HTTP_200_OK
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong-token')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_token_unset(self):
+        """
+        Test that no bearer token is accepted unless one is configured.
+        """
+        response = self.client.get(reverse('section_to_course:metrics'), HTTP_AUTHORIZATION='Bearer ')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
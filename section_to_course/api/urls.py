@@ -9,9 +9,20 @@ from . import views
 app_name = 'section_to_course'
 urlpatterns = [
     path('autocomplete/course/', views.CourseAutocomplete.as_view(), name='course_autocomplete'),
+    path('autocomplete/organization/', views.OrganizationAutocomplete.as_view(), name='organization_autocomplete'),
     path(
         'autocomplete/course/<str:course_id>/sections/',
         views.SectionAutocomplete.as_view(),
         name='section_autocomplete',
-    )
+    ),
+    path(
+        'autocomplete/links/<str:field>/',
+        views.LinkFieldAutocomplete.as_view(),
+        name='link_field_autocomplete',
+    ),
+    path('validate/', views.ValidateNewCourses.as_view(), name='validate_new_courses'),
+    path('export/<str:export_format>/', views.ExportLinks.as_view(), name='export_links'),
+    path('metrics/', views.Metrics.as_view(), name='metrics'),
+    path('profile/<str:profile_id>/', views.ProfileResult.as_view(), name='profile_result'),
+    path('refresh/progress/<str:job_id>/', views.RefreshProgress.as_view(), name='refresh_progress'),
 ]
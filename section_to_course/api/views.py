@@ -2,16 +2,31 @@
 Helper API endpoints for the section to course application.
 """
 
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
 from django.utils.translation import gettext as _
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
 from rest_framework import status
-from rest_framework.permissions import IsAdminUser
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import BasePermission, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from ..compat import course_exists, get_course_outline, modulestore
-from ..models import SectionToCourseLink
+from ..compat import modulestore
+from ..export import EXPORT_FORMATS, link_rows
+from ..linked_keys import linked_destination_courses, linked_source_sections
+from ..lookups import get_course_sections, organization_options
+from ..metrics import observed_autocomplete, render_metrics
+from ..models import COURSE_KEY_FIELDS, SectionToCourseLink
+from ..profiling import counting, get_profile, profiled
+from ..progress import get_job_progress
+from ..search import TrigramIndex, course_index
+from ..utils import validate_new_courses
+
+# The most proposed courses which can be validated in a single request.
+MAX_VALIDATION_ROWS = 1000
 
 
 class CourseAutocomplete(APIView):
@@ -21,25 +36,44 @@ class CourseAutocomplete(APIView):
 
     permission_classes = [IsAdminUser]
 
+    @profiled
+    @observed_autocomplete('course')
     def get(self, request):
         """
         Get all courses and match a search term against them.
+
+        If an org is given, only that organization's courses are searched.
         """
         self.check_permissions(request)
-        section_courses = set(SectionToCourseLink.objects.values_list('destination_course_id', flat=True))
-        all_courses = [
-            {'id': str(course.id), 'text': f'{course.display_name} ({course.id})'}
-            for course in modulestore().get_courses()
-            if course.id not in section_courses
-        ]
-        term = request.GET.get('term', '').lower()
+        section_courses = linked_destination_courses()
         courses = [
-            entry for entry in all_courses
-            if entry['id'].lower().startswith(term) or entry['text'].lower().startswith(term)
+            entry for entry in course_index().search(request.GET.get('term', ''), org=request.GET.get('org') or None)
+            if entry['id'] not in section_courses
         ]
         return Response(data={'results': courses}, status=status.HTTP_200_OK)
 
 
+class OrganizationAutocomplete(APIView):
+    """
+    Autocomplete API endpoint for organizations.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    @observed_autocomplete('organization')
+    def get(self, request):
+        """
+        Get the organizations with a short name or name containing a search term.
+        """
+        term = request.GET.get('term', '').strip().lower()
+        organizations = [
+            {'id': short_name, 'text': f'{name} ({short_name})'}
+            for short_name, name in organization_options()
+            if short_name and (term in short_name.lower() or term in name.lower())
+        ]
+        return Response(data={'results': organizations}, status=status.HTTP_200_OK)
+
+
 class SectionAutocomplete(APIView):
     """
     Autocomplete API endpoint for course sections.
@@ -47,6 +81,8 @@ class SectionAutocomplete(APIView):
 
     permission_classes = [IsAdminUser]
 
+    @profiled
+    @observed_autocomplete('section')
     def get(self, request, course_id):
         """
         Get a listing of all sections in a course, matching a search term against them.
@@ -58,21 +94,168 @@ class SectionAutocomplete(APIView):
                 data={'details': _("{course_key} is not a valid course key.").format(course_key=course_id)},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        term = request.GET.get('term', '').lower()
-        if not course_exists(course_key):
+        if not counting(modulestore(), 'modulestore').has_course(course_key):
             return Response(
                 data={'details': _("Course {course_key} does not exist.").format(course_key=course_key)},
                 status=status.HTTP_404_NOT_FOUND,
             )
         # Don't allow this section to be created into more than one mini-course.
-        existing_keys = set(
-            SectionToCourseLink.objects.filter(
-                source_course_id=course_key,
-            ).values_list('source_section_id', flat=True)
-        )
-        sections = [
-            {'text': child.title, 'id': str(child.usage_key)} for child in get_course_outline(course_key).sections
-            if child.usage_key not in existing_keys
-            and (child.title.lower().startswith(term) or str(child.usage_key).lower().startswith(term))
-        ]
+        existing_keys = linked_source_sections()
+        index = TrigramIndex()
+        for section in get_course_sections(course_key):
+            if str(section.usage_key) not in existing_keys:
+                index.add(section.usage_key, section.title, {'text': section.title, 'id': str(section.usage_key)})
+        sections = index.search(request.GET.get('term', ''))
         return Response(data={'results': sections}, status=status.HTTP_200_OK)
+
+
+class LinkFieldAutocomplete(APIView):
+    """
+    Autocomplete API endpoint for the course keys used by existing section to course links.
+
+    Used by the admin's list filters, so that they don't need to list every distinct value up front.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, field):
+        """
+        Get the distinct values of a link field which start with a search term.
+        """
+        if field not in COURSE_KEY_FIELDS:
+            return Response(
+                data={'details': _("{field} is not a searchable field.").format(field=field)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        values = SectionToCourseLink.objects.for_reads().distinct_keys(field, request.GET.get('term', ''))
+        return Response(
+            data={'results': [{'id': str(value), 'text': str(value)} for value in values]},
+            status=status.HTTP_200_OK,
+        )
+
+
+class RefreshProgress(APIView):
+    """
+    API endpoint for polling the progress of a running refresh.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, job_id):
+        """
+        Get the latest progress event reported by a refresh job.
+        """
+        progress = get_job_progress(job_id)
+        if progress is None:
+            return Response(
+                data={'details': _("No progress has been reported for job {job_id}.").format(job_id=job_id)},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(data=progress, status=status.HTTP_200_OK)
+
+
+class ProfileResult(APIView):
+    """
+    API endpoint for fetching a profile recorded for a request. See the profiling module.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id):
+        """
+        Get a stored profile.
+        """
+        profile = get_profile(profile_id)
+        if profile is None:
+            return Response(
+                data={'details': _("No profile {profile_id} has been stored.").format(profile_id=profile_id)},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(data=profile, status=status.HTTP_200_OK)
+
+
+class HasMetricsToken(BasePermission):
+    """
+    Allows requests bearing the token configured by SECTION_TO_COURSE_METRICS_TOKEN, if there is one.
+    """
+
+    def has_permission(self, request, view):
+        """
+        Check the request's Authorization header for the token.
+        """
+        token = getattr(settings, 'SECTION_TO_COURSE_METRICS_TOKEN', None)
+        if not token:
+            return False
+        scheme, _space, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        return scheme.lower() == 'bearer' and constant_time_compare(credentials.strip(), token)
+
+
+class Metrics(APIView):
+    """
+    API endpoint exposing the plugin's metrics to Prometheus. See the metrics module.
+
+    Staff can read the metrics with their session. Prometheus can't log in, so it authenticates with the
+    token configured by SECTION_TO_COURSE_METRICS_TOKEN instead, sent as a bearer token, which is what
+    the ``authorization`` or ``bearer_token_file`` options of a scrape config send. Only session
+    authentication is used, so that other authentication classes don't take the bearer token for one of
+    theirs and reject it.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminUser | HasMetricsToken]
+
+    def get(self, request):
+        """
+        Get every metric in Prometheus' text format.
+        """
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ValidateNewCourses(APIView):
+    """
+    API endpoint for checking whether many section-based courses could be created, before creating them.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        """
+        Validate a list of proposed courses, returning a verdict for each.
+
+        Expects a body like ``{"rows": [{"org": ..., "number": ..., "run": ..., "source_section_id": ...}]}``.
+        """
+        rows = request.data.get('rows') if isinstance(request.data, dict) else None
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return Response(
+                data={'details': _("Expected a list of rows, each an object.")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(rows) > MAX_VALIDATION_ROWS:
+            return Response(
+                data={'details': _("At most {count} rows can be validated at once.").format(count=MAX_VALIDATION_ROWS)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(data={'results': validate_new_courses(rows)}, status=status.HTTP_200_OK)
+
+
+class ExportLinks(APIView):
+    """
+    API endpoint streaming every section to course link, with titles, for reporting.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, export_format):
+        """
+        Stream the links in the requested format.
+        """
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                data={'details': _('Unknown export format "{}".').format(export_format)},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        render, content_type = EXPORT_FORMATS[export_format]
+        rows = link_rows(SectionToCourseLink.objects.for_reads())
+        response = StreamingHttpResponse(render(rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="section_to_course_links.{export_format}"'
+        return response
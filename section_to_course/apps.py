@@ -39,3 +39,9 @@ class SectionToCourseConfig(AppConfig):
             }
         },
     }
+
+    def ready(self):
+        """
+        Connect signal handlers once the platform has loaded.
+        """
+        from . import signals  # pylint: disable=import-outside-toplevel, unused-import
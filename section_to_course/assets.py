@@ -0,0 +1,173 @@
+"""
+Copying of the static assets a section refers to.
+
+Sections refer to files in their course's contentstore with ``/static/`` URLs, which are only resolved
+within the course the block lives in, so when a section is copied to another course, those files need to be
+copied along with it. ``/asset-v1:`` URLs name their course, so copies of blocks using them keep serving the
+source course's files, and those files aren't copied. Refreshes copy the same files over
+and over, so assets are compared by content hash first, and only written when the destination doesn't
+already have an identical copy. Source courses are never written to.
+"""
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import unquote
+
+from section_to_course.compat import asset_not_found_exception, contentstore, static_content_class
+from section_to_course.profiling import counting
+
+log = logging.getLogger(__name__)
+
+# Name of the attribute we keep the content hash of copied assets in, so that later copies needn't read them.
+HASH_ATTRIBUTE = 'section_to_course_sha256'
+# References must start a URL, so that absolute URLs to other sites which happen to contain them don't count.
+_URL_START = r'''(?<![\w.:/@%-])'''
+_NAME = r'''([^\s"'<>?#()\\]+)'''
+STATIC_REFERENCE = re.compile(_URL_START + '/static/' + _NAME)
+# How many source asset hashes each process remembers.
+SOURCE_HASH_CACHE_SIZE = 1000
+
+_source_hashes = OrderedDict()
+_source_hashes_lock = threading.Lock()
+
+
+class AssetCopyReport:
+    """
+    Running totals of the assets handled by one or more copies.
+    """
+
+    def __init__(self):
+        """
+        Start with nothing copied.
+        """
+        self.copied = 0
+        self.skipped = 0
+        self.missing = 0
+        self.bytes_copied = 0
+        self.bytes_saved = 0
+
+    def __str__(self):
+        """
+        Summarize the totals.
+        """
+        return (
+            f'{self.copied} assets copied ({self.bytes_copied} bytes), {self.skipped} unchanged assets skipped '
+            f'({self.bytes_saved} bytes saved), {self.missing} missing'
+        )
+
+
+def content_hash(data):
+    """
+    Get the hash we compare the contents of assets by.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def _field_strings(block):
+    """
+    Get the strings stored in a block's explicitly set fields.
+    """
+    for field in block.fields.values():
+        if not field.is_set_on(block):
+            continue
+        value = field.read_from(block)
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, (list, tuple)):
+            yield from (item for item in value if isinstance(item, str))
+
+
+def referenced_assets(block):
+    """
+    Get the names of the static assets referred to by ``/static/`` URLs in a block and its descendants.
+    """
+    names = set()
+    blocks = [block]
+    while blocks:
+        current = blocks.pop()
+        for value in _field_strings(current):
+            names.update(unquote(match) for match in STATIC_REFERENCE.findall(value))
+        blocks.extend(current.get_children())
+    return names
+
+
+def _source_hash(store, location):
+    """
+    Get the content hash and length of a source asset, or None for both if it doesn't exist.
+
+    Hashes are worked out in memory, since source courses are only read from, and remembered by this process
+    until the asset is uploaded again. Assets which were themselves copied by us already have their hash.
+    If the asset had to be read to hash it, it's returned as well, so that it needn't be read again to copy
+    it. Otherwise None is returned in its place.
+    """
+    try:
+        attributes = store.get_attrs(location)
+    except asset_not_found_exception():
+        return None, None, None
+    if attributes.get(HASH_ATTRIBUTE):
+        return attributes[HASH_ATTRIBUTE], attributes.get('length', 0), None
+    memo_key = (str(location), str(attributes.get('uploadDate')), attributes.get('length'))
+    with _source_hashes_lock:
+        if memo_key in _source_hashes:
+            _source_hashes.move_to_end(memo_key)
+            return _source_hashes[memo_key] + (None,)
+    content = store.find(location)
+    result = content_hash(content.data), len(content.data)
+    with _source_hashes_lock:
+        _source_hashes[memo_key] = result
+        while len(_source_hashes) > SOURCE_HASH_CACHE_SIZE:
+            _source_hashes.popitem(last=False)
+    return result + (content,)
+
+
+def _destination_hash(store, location):
+    """
+    Get the content hash of a destination asset, or None if it doesn't exist.
+
+    The hash is read from the asset's attributes where we've stored it before, so that the asset itself only
+    needs to be read the first time.
+    """
+    try:
+        attributes = store.get_attrs(location)
+    except asset_not_found_exception():
+        return None
+    if attributes.get(HASH_ATTRIBUTE):
+        return attributes[HASH_ATTRIBUTE]
+    digest = content_hash(store.find(location).data)
+    store.set_attr(location, HASH_ATTRIBUTE, digest)
+    return digest
+
+
+def copy_assets(names, *, source_course_key, destination_course_key, report=None):
+    """
+    Copy static assets between courses, skipping any the destination already has identical copies of.
+
+    Returns an AssetCopyReport, which is the given one if any, updated with the results.
+    """
+    if report is None:
+        report = AssetCopyReport()
+    store = counting(contentstore(), 'contentstore')
+    static_content = static_content_class()
+    for name in sorted(names):
+        source_location = static_content.compute_location(source_course_key, name)
+        destination_location = static_content.compute_location(destination_course_key, name)
+        source_hash, length, source = _source_hash(store, source_location)
+        if source_hash is None:
+            log.warning('Asset %s is referenced but does not exist in %s.', name, source_course_key)
+            report.missing += 1
+            continue
+        if source_hash == _destination_hash(store, destination_location):
+            report.skipped += 1
+            report.bytes_saved += length
+            continue
+        if source is None:
+            source = store.find(source_location)
+        store.save(static_content(
+            destination_location, source.name, source.content_type, source.data, locked=source.locked,
+        ))
+        store.set_attr(destination_location, HASH_ATTRIBUTE, source_hash)
+        report.copied += 1
+        report.bytes_copied += length
+    return report
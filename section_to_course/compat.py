@@ -123,18 +123,35 @@ def update_from_source(
     )
 
 
-def derived_key(destination_course_key, block_key, destination_course):
+def derived_key(source_course_key, block_key, destination_parent):
     """
-    Get the derived ID for a block duplicated from a source block. See upstream function.
+    Get the derived ID for a block copied from block_key in source_course_key to under destination_parent.
+
+    See upstream function.
     """
     from xmodule.modulestore.store_utilities import derived_key as upstream_derived_key
     return upstream_derived_key(
-        destination_course_key,
+        source_course_key,
         block_key,
-        destination_course,
+        destination_parent,
     )
 
 
+def block_version(block):
+    """
+    Get a string identifying the version of a block, which changes whenever the block itself is edited.
+
+    The split modulestore records the version of the course structure each block was last changed in. Other
+    modulestores don't, so the time the block was last edited is used for them instead.
+    """
+    edit_info = getattr(block, '_edit_info', None)
+    version = getattr(edit_info, 'update_version', None)
+    if version is not None:
+        return str(version)
+    edited_on = getattr(block, 'edited_on', None)
+    return edited_on.isoformat() if edited_on else ''
+
+
 def get_course_outline(course_key: CourseLocator):
     """
     Get the course outline for a course. See upstream function.
@@ -143,6 +160,43 @@ def get_course_outline(course_key: CourseLocator):
     return upstream_get_course_outline(course_key)
 
 
+def get_course_titles(course_keys):
+    """
+    Get a mapping of course keys to the titles of their course outlines, in one query.
+
+    Courses without outlines are left out.
+    """
+    from openedx.core.djangoapps.content.learning_sequences.models import LearningContext
+    return dict(
+        LearningContext.objects.filter(context_key__in=list(course_keys)).values_list('context_key', 'title')
+    )
+
+
+class Outlines:
+    """
+    The course outline functions of the learning sequences app, gathered together like a store.
+    """
+
+    def get_course_outline(self, course_key: CourseLocator):  # pylint: disable=no-self-use
+        """
+        Get the course outline for a course. See get_course_outline.
+        """
+        return get_course_outline(course_key)
+
+    def get_course_titles(self, course_keys):  # pylint: disable=no-self-use
+        """
+        Get a mapping of course keys to the titles of their course outlines. See get_course_titles.
+        """
+        return get_course_titles(course_keys)
+
+
+def outlines():
+    """
+    Get the course outline functions, in a form that can be wrapped like the modulestore.
+    """
+    return Outlines()
+
+
 def update_outline_from_modulestore(course_key: CourseLocator):
     """
     Update the course outline for a course. See upstream function.
@@ -161,3 +215,51 @@ def sequence_does_not_exist_exception():
     """
     from openedx.core.djangoapps.content.learning_sequences.data import ObjectDoesNotExist
     return ObjectDoesNotExist
+
+
+def course_published_signal():
+    """
+    Get the signal sent by upstream whenever a course is published.
+    """
+    from xmodule.modulestore.django import SignalHandler
+    return SignalHandler.course_published
+
+
+def course_deleted_signal():
+    """
+    Get the signal sent by upstream whenever a course is deleted.
+    """
+    from xmodule.modulestore.django import SignalHandler
+    return SignalHandler.course_deleted
+
+
+def shared_task(*args, **kwargs):
+    """
+    Declare a Celery task, to be run by the platform's workers. See upstream function.
+    """
+    from celery import shared_task as upstream_shared_task
+    return upstream_shared_task(*args, **kwargs)
+
+
+def contentstore():
+    """
+    Get the contentstore from upstream, where static assets are kept.
+    """
+    from xmodule.contentstore.django import contentstore as upstream_contentstore
+    return upstream_contentstore()
+
+
+def static_content_class():
+    """
+    Get the StaticContent class from upstream.
+    """
+    from xmodule.contentstore.content import StaticContent
+    return StaticContent
+
+
+def asset_not_found_exception():
+    """
+    Get the NotFoundError exception raised by upstream's contentstore.
+    """
+    from xmodule.exceptions import NotFoundError
+    return NotFoundError
@@ -0,0 +1,158 @@
+"""
+Streaming exports of the section to course link table.
+
+Exports read links from the database in chunks and look up the titles for each chunk together, so that
+exporting any number of links takes a roughly constant amount of memory.
+"""
+import csv
+import json
+from collections import defaultdict
+
+from section_to_course.compat import modulestore, not_found_exception, outlines
+from section_to_course.models import SectionToCourseLink
+from section_to_course.profiling import counting
+
+EXPORT_FIELDS = (
+    'id',
+    'source_course_id',
+    'source_course_title',
+    'source_section_id',
+    'source_section_title',
+    'destination_course_id',
+    'destination_course_title',
+    'destination_section_id',
+    'destination_section_title',
+    'created',
+    'modified',
+    'last_refresh',
+)
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class TitleLookup:
+    """
+    Looks up the titles of courses and sections for an export, a chunk of links at a time.
+
+    Course titles are read from the course outlines of every course in the chunk at once. Section titles are
+    looked up with a single modulestore query per course in the chunk.
+    """
+
+    @staticmethod
+    def course_titles(course_keys):
+        """
+        Get a mapping of course keys to their titles. Courses which no longer exist are left out.
+
+        Courses whose outlines haven't been generated yet are looked up in the modulestore one at a time.
+        """
+        course_keys = set(course_keys)
+        titles = counting(outlines(), 'outline').get_course_titles(course_keys)
+        store = counting(modulestore(), 'modulestore')
+        for course_key in course_keys - set(titles):
+            course = store.get_course(course_key, depth=0)
+            if course:
+                titles[course_key] = course.display_name
+        return titles
+
+    @staticmethod
+    def section_titles(usage_keys):
+        """
+        Get a mapping of section usage keys to their titles. Sections which no longer exist are left out.
+        """
+        by_course = defaultdict(set)
+        for usage_key in usage_keys:
+            by_course[usage_key.course_key].add(usage_key)
+        titles = {}
+        store = counting(modulestore(), 'modulestore')
+        for course_key, course_usage_keys in by_course.items():
+            try:
+                sections = store.get_items(course_key, qualifiers={'category': 'chapter'})
+            except not_found_exception():
+                continue
+            for section in sections:
+                if section.location in course_usage_keys:
+                    titles[section.location] = section.display_name
+        return titles
+
+
+def _chunks(iterable, size):
+    """
+    Split an iterable into lists of up to the given size.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def link_rows(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generate a dictionary of EXPORT_FIELDS for each link, with titles filled in.
+
+    Links are ordered by source course, so that the sections in each chunk come from as few courses as possible.
+    """
+    if queryset is None:
+        queryset = SectionToCourseLink.objects.all()
+    links = queryset.order_by('source_course_id', 'id').iterator(chunk_size=chunk_size)
+    for chunk in _chunks(links, chunk_size):
+        course_titles = TitleLookup.course_titles(
+            [link.source_course_id for link in chunk] + [link.destination_course_id for link in chunk],
+        )
+        section_titles = TitleLookup.section_titles(
+            [link.source_section_id for link in chunk] + [link.destination_section_id for link in chunk],
+        )
+        for link in chunk:
+            yield {
+                'id': link.id,
+                'source_course_id': str(link.source_course_id),
+                'source_course_title': course_titles.get(link.source_course_id, ''),
+                'source_section_id': str(link.source_section_id),
+                'source_section_title': section_titles.get(link.source_section_id, ''),
+                'destination_course_id': str(link.destination_course_id),
+                'destination_course_title': course_titles.get(link.destination_course_id, ''),
+                'destination_section_id': str(link.destination_section_id),
+                'destination_section_title': section_titles.get(link.destination_section_id, ''),
+                'created': link.created.isoformat(),
+                'modified': link.modified.isoformat(),
+                'last_refresh': link.last_refresh.isoformat() if link.last_refresh else None,
+            }
+
+
+class _Echo:
+    """
+    A file-like object which hands back whatever is written to it, so csv.writer can produce lines lazily.
+    """
+
+    def write(self, value):
+        """
+        Return the value written.
+        """
+        return value
+
+
+def render_csv(rows):
+    """
+    Generate lines of CSV for export rows, starting with a header.
+    """
+    writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_jsonl(rows):
+    """
+    Generate lines of JSON for export rows.
+    """
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+# Renderers and content types for each export format.
+EXPORT_FORMATS = {
+    'csv': (render_csv, 'text/csv'),
+    'jsonl': (render_jsonl, 'application/x-ndjson'),
+}
@@ -0,0 +1,159 @@
+"""
+Refreshing chains of section to course links in dependency order.
+
+A destination course can itself be the source of further links. Refreshing such a chain in the wrong order
+copies stale content downstream, so links are ordered by a dependency graph: a link depends on every link
+whose destination course is its source course. Links are refreshed a generation at a time, where each
+generation only depends on earlier ones, and links to different destinations within a generation can be
+refreshed in parallel. When a link can't be refreshed, nothing downstream of it is either.
+"""
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from section_to_course.models import SectionToCourseLink
+from section_to_course.utils import closing_connections, refresh_links
+
+CascadeResult = namedtuple('CascadeResult', ['refreshed', 'skipped'])
+
+
+class LinkCycleError(Exception):
+    """
+    Raised when links depend on each other in a cycle, so there's no order to refresh them in.
+    """
+
+
+def cascade_workers():
+    """
+    Get the number of destination courses which may be refreshed at once during a cascading refresh.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_CASCADE_WORKERS', 4)
+
+
+def downstream_links(links):
+    """
+    Get the given links along with every link which depends on them, directly or indirectly.
+
+    Takes one query for each step down the chain.
+    """
+    collected = {link.id: link for link in links}
+    seen_courses = set()
+    frontier = {str(link.destination_course_id) for link in collected.values()}
+    while frontier:
+        seen_courses |= frontier
+        found = SectionToCourseLink.objects.filter(source_course_id__in=frontier)
+        frontier = set()
+        for link in found:
+            if link.id in collected:
+                continue
+            collected[link.id] = link
+            if str(link.destination_course_id) not in seen_courses:
+                frontier.add(str(link.destination_course_id))
+    return list(collected.values())
+
+
+def refresh_generations(links):
+    """
+    Sort links into generations, each of which only depends on links in earlier generations.
+
+    Only dependencies among the given links are considered. Raises LinkCycleError if the links depend on
+    each other in a cycle.
+    """
+    links = list(links)
+    by_source = defaultdict(list)
+    for link in links:
+        by_source[str(link.source_course_id)].append(link)
+    dependents = {
+        link.id: [
+            dependent for dependent in by_source[str(link.destination_course_id)]
+            # A section copied within its own course doesn't depend on itself.
+            if dependent.id != link.id
+        ]
+        for link in links
+    }
+    remaining = defaultdict(int)
+    for link_dependents in dependents.values():
+        for dependent in link_dependents:
+            remaining[dependent.id] += 1
+    generations = []
+    generation = [link for link in links if not remaining[link.id]]
+    while generation:
+        generations.append(generation)
+        next_generation = []
+        for link in generation:
+            for dependent in dependents[link.id]:
+                remaining[dependent.id] -= 1
+                if not remaining[dependent.id]:
+                    next_generation.append(dependent)
+        generation = next_generation
+    if sum(len(generation) for generation in generations) < len(links):
+        stuck = sorted(str(link) for link in links if remaining[link.id] > 0)
+        raise LinkCycleError(f'These links depend on each other in a cycle: {", ".join(stuck)}')
+    return generations
+
+
+def _link_key(link):
+    """
+    Identify a link by its source section and destination course, which refreshed copies of it share.
+    """
+    return str(link.source_section_id), str(link.destination_course_id)
+
+
+@closing_connections
+def _refresh_destination(links, user, throttle_wait):
+    """
+    Refresh the links to one destination course, in a worker thread.
+    """
+    return refresh_links(links, user=user, throttle_wait=throttle_wait)
+
+
+def refresh_cascade(links, *, user, max_workers=None, throttle_wait=None):
+    """
+    Refresh links and everything downstream of them, in dependency order.
+
+    Returns a CascadeResult of the links which were refreshed and those which were skipped. Like
+    refresh_links, links whose destination course is already being refreshed elsewhere, or which wait longer
+    than throttle_wait seconds for their turn, are skipped. So is everything downstream of a skipped link,
+    since refreshing it would copy content which wasn't brought up to date.
+    """
+    if max_workers is None:
+        max_workers = cascade_workers()
+    refreshed = []
+    skipped = []
+    # Destination courses some of whose links weren't refreshed, which their dependents mustn't copy from.
+    stale_courses = set()
+    for generation in refresh_generations(downstream_links(links)):
+        by_destination = defaultdict(list)
+        for link in generation:
+            if str(link.source_course_id) in stale_courses:
+                skipped.append(link)
+                stale_courses.add(str(link.destination_course_id))
+            else:
+                by_destination[str(link.destination_course_id)].append(link)
+        if not by_destination:
+            continue
+        if max_workers <= 1 or len(by_destination) == 1:
+            results = [refresh_links(
+                [link for destination_links in by_destination.values() for link in destination_links],
+                user=user,
+                throttle_wait=throttle_wait,
+            )]
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(by_destination))) as executor:
+                results = list(executor.map(
+                    _refresh_destination,
+                    by_destination.values(),
+                    [user] * len(by_destination),
+                    [throttle_wait] * len(by_destination),
+                ))
+        refreshed_keys = set()
+        for destination_refreshed in results:
+            refreshed.extend(destination_refreshed)
+            refreshed_keys.update(_link_key(link) for link in destination_refreshed)
+        for destination, destination_links in by_destination.items():
+            for link in destination_links:
+                if _link_key(link) not in refreshed_keys:
+                    skipped.append(link)
+                    stale_courses.add(destination)
+    return CascadeResult(refreshed, skipped)
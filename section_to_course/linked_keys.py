@@ -0,0 +1,91 @@
+"""
+Cached sets of the keys already used by section to course links.
+
+The autocomplete endpoints leave out courses and sections which are already linked, and check that on every
+keystroke. Rather than loading every link and building an opaque key object for each one per request, each
+process keeps frozensets of the key strings, and only reloads them when a version number shared through the
+cache says that links have been added or removed.
+"""
+import threading
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import models, router, transaction
+from django.db.models.functions import Cast
+
+from section_to_course.metrics import count_cache
+from section_to_course.models import SectionToCourseLink
+
+LINKED_KEYS_VERSION_KEY = 'section_to_course.linked_keys.version'
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def _version():
+    """
+    Get the current version of the linked keys, or None if the cache isn't keeping it.
+    """
+    version = cache.get(LINKED_KEYS_VERSION_KEY)
+    if version is None:
+        cache.add(LINKED_KEYS_VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(LINKED_KEYS_VERSION_KEY)
+    return version
+
+
+def _load(field):
+    """
+    Load the distinct values of a key field as strings, without parsing them into keys.
+
+    These are always read from the primary database, since a lagging replica could give us a stale set which
+    would then be kept until links next change.
+    """
+    return frozenset(
+        SectionToCourseLink.objects.using(router.db_for_write(SectionToCourseLink)).annotate(
+            key=Cast(field, output_field=models.CharField()),
+        ).values_list('key', flat=True).distinct()
+    )
+
+
+def linked_keys(field):
+    """
+    Get a frozenset of the string form of every value of a link's key field.
+    """
+    version = _version()
+    if version is None:
+        # Without the cache we'd never know when to reload, so always load fresh.
+        return _load(field)
+    with _lock:
+        loaded_version, keys = _loaded.get(field, (None, None))
+        count_cache('linked_keys', loaded_version == version)
+        if loaded_version != version:
+            keys = _load(field)
+            _loaded[field] = (version, keys)
+        return keys
+
+
+def linked_destination_courses():
+    """
+    Get the keys of every course that sections have been copied into, as strings.
+    """
+    return linked_keys('destination_course_id')
+
+
+def linked_source_sections():
+    """
+    Get the keys of every section that has been copied into a course, as strings.
+    """
+    return linked_keys('source_section_id')
+
+
+def links_changed():
+    """
+    Note that links have been added or removed, so every process reloads its linked keys.
+    """
+    cache.set(LINKED_KEYS_VERSION_KEY, uuid4().hex, timeout=None)
+    # Another process could reload between now and the commit, and keep what it read under the new version,
+    # so change it again once the change is visible to everyone.
+    transaction.on_commit(
+        lambda: cache.set(LINKED_KEYS_VERSION_KEY, uuid4().hex, timeout=None),
+        using=router.db_for_write(SectionToCourseLink),
+    )
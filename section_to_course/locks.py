@@ -0,0 +1,125 @@
+"""
+Locks which stop the same destination course from being refreshed by several requests at once.
+
+Refreshing a course rewrites its structure and publishes it, so two refreshes of the same destination
+racing each other would at best duplicate work, and at worst publish conflicting versions. Refreshes wait
+for the lock rather than giving up, since the one holding it may be copying other sections. Locks are held
+in the cache so that they apply across processes, and in process memory as well, so that they still apply
+between threads if the cache isn't shared or isn't available.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from section_to_course.metrics import increment
+
+log = logging.getLogger(__name__)
+
+DESTINATION_LOCK_KEY = 'section_to_course.lock.destination.{}'
+# Seconds between checks for a lock held by another process to be released.
+POLL_INTERVAL = 0.5
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+_held = threading.local()
+
+
+class RefreshInProgress(Exception):
+    """
+    Raised when a destination course is being refreshed elsewhere for longer than we're willing to wait.
+    """
+
+
+def lock_timeout():
+    """
+    Get the number of seconds after which a lock is assumed to belong to a refresh which died.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_LOCK_TIMEOUT', 60 * 30)
+
+
+def lock_wait():
+    """
+    Get the most seconds a refresh waits for another refresh of the same destination course to finish.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_LOCK_WAIT', 60 * 5)
+
+
+@contextmanager
+def _local_lock(key, wait):
+    """
+    Hold the in-process lock for a key, waiting up to wait seconds for it, and yield whether it was acquired.
+
+    Locks are only kept while some thread is using or waiting for them, so that they don't pile up for every
+    course ever refreshed.
+    """
+    with _local_locks_guard:
+        entry = _local_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    lock = entry[0]
+    acquired = lock.acquire(timeout=max(wait, 0))
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
+        with _local_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _local_locks[key]
+
+
+def refreshing_in_this_thread(destination_course_key):
+    """
+    Check if this thread is in the middle of refreshing a destination course.
+    """
+    return str(destination_course_key) in getattr(_held, 'keys', ())
+
+
+@contextmanager
+def destination_lock(destination_course_key, wait=None):
+    """
+    Hold the exclusive right to refresh a destination course.
+
+    If a refresh of the course is already running, this waits for it to finish, for up to wait seconds, or
+    SECTION_TO_COURSE_LOCK_WAIT by default, and then raises RefreshInProgress. A thread which already holds
+    the lock may take it again, so that refreshes can be nested in larger operations on the same course.
+    """
+    key = str(destination_course_key)
+    held = getattr(_held, 'keys', None)
+    if held is None:
+        held = _held.keys = set()
+    if key in held:
+        yield
+        return
+    if wait is None:
+        wait = lock_wait()
+    deadline = time.monotonic() + wait
+    with _local_lock(key, wait) as locally_acquired:
+        if not locally_acquired:
+            increment('section_to_course_refresh_failures_total', reason='busy')
+            raise RefreshInProgress(f'Timed out waiting for another refresh of {key} to finish.')
+        cache_key = DESTINATION_LOCK_KEY.format(key)
+        token = uuid4().hex
+        try:
+            acquired = cache.add(cache_key, token, timeout=lock_timeout())
+            while not acquired and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                acquired = cache.add(cache_key, token, timeout=lock_timeout())
+        except Exception:  # pylint: disable=broad-except
+            log.warning('Could not reach the cache to lock %s. Falling back to a local lock.', key, exc_info=True)
+            acquired, token = True, None
+        if not acquired:
+            increment('section_to_course_refresh_failures_total', reason='busy')
+            raise RefreshInProgress(f'Timed out waiting for another refresh of {key} to finish.')
+        held.add(key)
+        try:
+            yield
+        finally:
+            held.discard(key)
+            if token is not None and cache.get(cache_key) == token:
+                cache.delete(cache_key)
@@ -0,0 +1,80 @@
+"""
+Cached lookups of upstream data which the creation form and the autocomplete endpoints need on every use.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from opaque_keys.edx.locator import CourseLocator
+
+from section_to_course import compat
+from section_to_course.metrics import count_cache
+from section_to_course.profiling import counting
+
+ORGANIZATION_OPTIONS_CACHE_KEY = 'section_to_course.organization_options'
+# Changes to organizations clear the cache through signals, so this only matters for bulk updates.
+ORGANIZATION_OPTIONS_TIMEOUT = 60 * 60
+COURSE_SECTIONS_CACHE_KEY = 'section_to_course.course_sections.{}'
+# Publishing a course clears its sections, but its outline is regenerated after that, in the background. If the
+# sections were read from the outline in between, they're stale until this runs out.
+COURSE_SECTIONS_TIMEOUT = 60 * 5
+
+CourseSection = namedtuple('CourseSection', ['usage_key', 'title'])
+
+
+def organization_options():
+    """
+    Return a Django choice tuple of organizations that can be used to create a course.
+
+    The options are cached, since they're needed every time the creation form is used.
+    """
+    options = cache.get(ORGANIZATION_OPTIONS_CACHE_KEY)
+    count_cache('organization_options', options is not None)
+    if options is None:
+        options = compat.organization_options()
+        cache.set(ORGANIZATION_OPTIONS_CACHE_KEY, options, timeout=ORGANIZATION_OPTIONS_TIMEOUT)
+    return options
+
+
+def clear_organization_options():
+    """
+    Clear the cached organization options, so that they are reloaded the next time they're needed.
+    """
+    cache.delete(ORGANIZATION_OPTIONS_CACHE_KEY)
+
+
+def get_course_sections(course_key: CourseLocator):
+    """
+    Get the usage keys and titles of a course's sections, in order, as CourseSection tuples.
+
+    Sections are cached until the course is next published. See load_course_sections.
+    """
+    cache_key = COURSE_SECTIONS_CACHE_KEY.format(course_key)
+    sections = cache.get(cache_key)
+    count_cache('course_sections', sections is not None)
+    if sections is None:
+        sections = load_course_sections(course_key)
+        cache.set(cache_key, sections, timeout=COURSE_SECTIONS_TIMEOUT)
+    return sections
+
+
+def load_course_sections(course_key: CourseLocator):
+    """
+    Get the usage keys and titles of a course's sections, in order, as CourseSection tuples, without caching.
+
+    Sections are read from the course outline if it has been generated, or otherwise from the top level of the
+    course in the modulestore, without loading anything further down.
+    """
+    try:
+        outline = counting(compat.outlines(), 'outline').get_course_outline(course_key)
+    except compat.sequence_does_not_exist_exception():
+        course = counting(compat.modulestore(), 'modulestore').get_course(course_key, depth=1)
+        children = course.get_children() if course is not None else []
+        return [CourseSection(child.location, child.display_name) for child in children]
+    return [CourseSection(section.usage_key, section.title) for section in outline.sections]
+
+
+def clear_course_sections(course_key: CourseLocator):
+    """
+    Clear a course's cached sections, so that they are reloaded the next time they're needed.
+    """
+    cache.delete(COURSE_SECTIONS_CACHE_KEY.format(course_key))
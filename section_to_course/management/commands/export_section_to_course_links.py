@@ -0,0 +1,34 @@
+"""
+Django command for exporting section to course links for reporting.
+"""
+from django.core.management.base import BaseCommand
+
+from section_to_course.export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, link_rows
+from section_to_course.models import SectionToCourseLink
+
+
+class Command(BaseCommand):
+    """
+    Management command to export every section to course link, with titles, as CSV or JSON lines.
+    """
+
+    help = 'Exports every section to course link, with titles, as CSV or JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv', dest='export_format')
+        parser.add_argument(
+            '--output', type=str, default=None, help='File to write the export to. Defaults to standard output.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Number of links to read at a time.',
+        )
+
+    def handle(self, *args, **options):
+        render = EXPORT_FORMATS[options['export_format']][0]
+        lines = render(link_rows(SectionToCourseLink.objects.for_reads(), chunk_size=options['chunk_size']))
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(lines)
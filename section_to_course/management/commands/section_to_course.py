@@ -9,8 +9,11 @@ from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
 from opaque_keys.edx.locator import BlockUsageLocator
 
+from section_to_course.assets import AssetCopyReport
 from section_to_course.compat import not_found_exception
-from section_to_course.utils import paste_from_template
+from section_to_course.locks import RefreshInProgress
+from section_to_course.progress import DONE, render_progress_bar
+from section_to_course.utils import paste_sections
 
 User = get_user_model()
 
@@ -26,6 +29,21 @@ class Command(BaseCommand):
         parser.add_argument('source_section_id', type=str)
         parser.add_argument('destination_course_id', type=str)
         parser.add_argument('username', type=str)
+        parser.add_argument(
+            '--section', action='append', dest='additional_section_ids', default=[], metavar='SECTION_ID',
+            help='Another section to copy after the first. Can be given several times, and sections may come '
+                 'from any course. All sections are copied and published together.',
+        )
+        parser.add_argument(
+            '--no-progress', action='store_false', dest='progress', help='Do not display a progress bar.',
+        )
+
+    def render_progress(self, event):
+        """
+        Redraw the progress bar for a progress event.
+        """
+        self.stdout.write('\r' + render_progress_bar(event), ending='\n' if event.phase == DONE else '')
+        self.stdout.flush()
 
     def handle(self, *args, **options):
         try:
@@ -38,18 +56,30 @@ class Command(BaseCommand):
         except InvalidKeyError:
             self.stderr.write(self.style.ERROR(f'"{options["destination_course_id"]}" is not a valid course key.'))
             sys.exit(2)
+        source_block_usage_keys = []
+        for section_id in [options['source_section_id'], *options['additional_section_ids']]:
+            try:
+                source_block_usage_keys.append(BlockUsageLocator.from_string(section_id))
+            except InvalidKeyError:
+                self.stderr.write(self.style.ERROR(f'"{section_id}" is not a valid block usage key.'))
+                sys.exit(3)
+        asset_report = AssetCopyReport()
         try:
-            source_block_usage_key = BlockUsageLocator.from_string(options['source_section_id'])
-        except InvalidKeyError:
-            self.stderr.write(self.style.ERROR(f'"{options["source_section_id"]}" is not a valid block usage key.'))
-            sys.exit(3)
-        try:
-            paste_from_template(
+            paste_sections(
                 destination_course_key=destination_course_key,
-                source_block_usage_key=source_block_usage_key,
+                source_block_usage_keys=source_block_usage_keys,
                 user=user,
+                progress=self.render_progress if options['progress'] else None,
+                asset_report=asset_report,
             )
         except not_found_exception() as err:
             self.stderr.write(self.style.ERROR(str(err)))
             sys.exit(4)
-        self.stdout.write(self.style.SUCCESS('Section copied successfully.'))
+        except RefreshInProgress as err:
+            self.stderr.write(self.style.ERROR(str(err)))
+            sys.exit(5)
+        self.stdout.write(f'Static assets: {asset_report}.')
+        if len(source_block_usage_keys) > 1:
+            self.stdout.write(self.style.SUCCESS(f'{len(source_block_usage_keys)} sections copied successfully.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Section copied successfully.'))
@@ -52,6 +52,26 @@ class TestSectionToCourseCommand(MixedSplitTestCase):
             source_section_id=source_chapter.location,
         )
 
+    def test_command_with_several_sections(self):
+        """
+        Test that the command can copy several sections into one course.
+        """
+        other_chapter = BlockFactory(parent=CourseFactory(), category='chapter', display_name='Other Chapter')
+        stdout = StringIO()
+        call_command(
+            'section_to_course',
+            str(self.source_chapter.location),
+            str(self.destination_course.id),
+            self.user.username,
+            '--section', str(other_chapter.location),
+            '--no-progress',
+            stdout=stdout,
+        )
+        assert '2 sections copied successfully.' in stdout.getvalue()
+        assert set(SectionToCourseLink.objects.values_list('source_section_id', flat=True)) == {
+            self.source_chapter.location, other_chapter.location,
+        }
+
     def test_handles_nonexistent_user(self):
         """
         Test that the command handles a nonexistent user gracefully.
@@ -0,0 +1,27 @@
+"""
+Django command for warming section_to_course's caches after a deploy.
+"""
+from django.core.management.base import BaseCommand
+
+from section_to_course.warmup import WARMERS, warm_caches
+
+
+class Command(BaseCommand):
+    """
+    Management command to load section_to_course's caches ahead of traffic, reporting how long each took.
+    """
+
+    help = "Warms section_to_course's caches ahead of traffic, reporting how long each took"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cache', action='append', choices=[name for name, _warmer in WARMERS], dest='caches', default=None,
+            help='Only warm this cache. Can be given more than once. Defaults to every cache.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0.0
+        for name, elapsed in warm_caches(options['caches']):
+            total += elapsed
+            self.stdout.write(f'Warmed {name} in {elapsed:.3f} seconds.')
+        self.stdout.write(f'Warmed caches in {total:.3f} seconds.')
@@ -0,0 +1,296 @@
+"""
+Runtime metrics for section_to_course, exposed in Prometheus' text format.
+
+Metrics are counted in the cache, so that every web and worker process adds to the same numbers, and the
+metrics endpoint reports the totals no matter which process serves it. Every metric has a fixed set of
+label values, so the endpoint can read every series at once without keeping a list of them. Recording a
+metric never raises, since losing a count is better than failing the work being counted.
+
+The metrics recorded while serving a request are held back until the request finishes, then written to the
+cache together, so that requests like autocomplete keystrokes only make a few cache calls for all of them.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import wraps
+from itertools import product
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+METRIC_KEY = 'section_to_course.metrics.{}'
+METRICS_GUARD_KEY = 'section_to_course.metrics.guard'
+# Seconds to wait for exclusive use of the metrics before writing them anyway.
+METRICS_GUARD_WAIT = 0.5
+# Histogram sums are counted in millionths, since the cache can only add up whole numbers.
+SUM_SCALE = 1000000
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+RESULT_BUCKETS = (0, 1, 5, 10, 20, 50, 100)
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+AUTOCOMPLETES = ('course', 'organization', 'section')
+CACHES = ('course_index', 'course_sections', 'linked_keys', 'organization_options')
+PHASES = ('loading', 'copying', 'publishing', 'saving')
+FAILURE_REASONS = ('busy', 'error', 'throttled')
+
+_batch = threading.local()
+
+
+class Metric(namedtuple('Metric', ['name', 'kind', 'documentation', 'labels', 'buckets', 'collect'])):
+    """
+    The definition of a metric.
+
+    ``labels`` is a sequence of label names with every value each may take, ``buckets`` holds the upper bounds
+    of a histogram's buckets, and ``collect`` is a function which works out a gauge's value when it's read,
+    for gauges which aren't counted as they change.
+    """
+
+    __slots__ = ()
+
+    def series(self):
+        """
+        Get the label values of every series of this metric, as dictionaries.
+        """
+        names = [name for name, _values in self.labels]
+        return [dict(zip(names, values)) for values in product(*(values for _name, values in self.labels))]
+
+
+def _key(name, labels, suffix=''):
+    """
+    Get the cache key one number of a metric is counted under.
+    """
+    return METRIC_KEY.format('.'.join([name, *(labels[label] for label in sorted(labels))])) + suffix
+
+
+def _refreshes_waiting():
+    """
+    Count the refreshes waiting for their turn under the throttles.
+    """
+    # Deferred since the throttles record their own metrics.
+    from section_to_course.throttle import refreshes_waiting  # pylint: disable=import-outside-toplevel
+    return refreshes_waiting()
+
+
+METRICS = {
+    metric.name: metric for metric in (
+        Metric(
+            'section_to_course_autocomplete_seconds', 'histogram', 'Time taken to answer autocomplete requests.',
+            (('autocomplete', AUTOCOMPLETES),), LATENCY_BUCKETS, None,
+        ),
+        Metric(
+            'section_to_course_autocomplete_results', 'histogram', 'Results returned per autocomplete request.',
+            (('autocomplete', AUTOCOMPLETES),), RESULT_BUCKETS, None,
+        ),
+        Metric(
+            'section_to_course_cache_requests_total', 'counter', 'Lookups in the caches kept by section_to_course.',
+            (('cache', CACHES), ('result', ('hit', 'miss'))), None, None,
+        ),
+        Metric(
+            'section_to_course_refresh_phase_seconds', 'histogram', 'Time taken by each phase of copying a section.',
+            (('phase', PHASES),), DURATION_BUCKETS, None,
+        ),
+        Metric(
+            'section_to_course_blocks_copied_total', 'counter', 'Blocks copied into destination courses.',
+            (), None, None,
+        ),
+        Metric(
+            'section_to_course_refresh_failures_total', 'counter', 'Copies of sections which failed or were skipped.',
+            (('reason', FAILURE_REASONS),), None, None,
+        ),
+        Metric(
+            'section_to_course_refreshes_waiting', 'gauge', 'Refreshes waiting for their turn under the throttles.',
+            (), None, _refreshes_waiting,
+        ),
+        Metric(
+            'section_to_course_auto_refreshes_queued', 'gauge', 'Links with an automatic refresh queued.',
+            (), None, None,
+        ),
+    )
+}
+
+
+def metrics_enabled():
+    """
+    Check if metrics are being recorded.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_METRICS', True)
+
+
+def _add(values):
+    """
+    Add to several numbers, or hold them back to add later if a batch is being collected in this thread.
+    """
+    if not metrics_enabled():
+        return
+    pending = getattr(_batch, 'values', None)
+    if pending is None:
+        _write(values)
+        return
+    for key, amount in values.items():
+        pending[key] = pending.get(key, 0) + amount
+
+
+def _write(values):
+    """
+    Add to several numbers in the cache at once, starting any which haven't been counted yet.
+
+    The numbers are read and written back together while holding exclusive use of the metrics, so that
+    concurrent writes from other processes aren't lost.
+    """
+    token = uuid4().hex
+    try:
+        deadline = time.monotonic() + METRICS_GUARD_WAIT
+        acquired = cache.add(METRICS_GUARD_KEY, token, timeout=METRICS_GUARD_WAIT * 5)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.01)
+            acquired = cache.add(METRICS_GUARD_KEY, token, timeout=METRICS_GUARD_WAIT * 5)
+        if not acquired:
+            log.warning('Recording section_to_course metrics without exclusive use of them.')
+        try:
+            current = cache.get_many(list(values))
+            cache.set_many({key: current.get(key, 0) + amount for key, amount in values.items()}, timeout=None)
+        finally:
+            if acquired and cache.get(METRICS_GUARD_KEY) == token:
+                cache.delete(METRICS_GUARD_KEY)
+    except Exception:  # pylint: disable=broad-except
+        log.warning('Could not record section_to_course metrics.', exc_info=True)
+
+
+def start_batch():
+    """
+    Hold back the metrics recorded in this thread until flush_batch is called, to write them all at once.
+    """
+    flush_batch()
+    _batch.values = {}
+
+
+def flush_batch():
+    """
+    Write the metrics held back in this thread since start_batch, and stop holding them back.
+    """
+    values = getattr(_batch, 'values', None)
+    _batch.values = None
+    if values:
+        _write(values)
+
+
+def increment(name, amount=1, **labels):
+    """
+    Add to a counter or gauge.
+    """
+    _add({_key(name, labels): amount})
+
+
+def observe(name, value, **labels):
+    """
+    Record a value in a histogram.
+    """
+    buckets = METRICS[name].buckets
+    # Buckets are counted separately and added up when read, so each observation only touches one of them.
+    bucket = next((index for index, bound in enumerate(buckets) if value <= bound), len(buckets))
+    _add({
+        _key(name, labels, f'.bucket.{bucket}'): 1,
+        _key(name, labels, '.count'): 1,
+        _key(name, labels, '.sum'): int(round(value * SUM_SCALE)),
+    })
+
+
+def count_cache(name, hit):
+    """
+    Count a lookup in one of the caches.
+    """
+    increment('section_to_course_cache_requests_total', cache=name, result='hit' if hit else 'miss')
+
+
+@contextmanager
+def count_failures(unless=()):
+    """
+    Count an error escaping the code run within this as a failed refresh, unless it's one of the given types.
+    """
+    try:
+        yield
+    except unless:
+        raise
+    except Exception:
+        increment('section_to_course_refresh_failures_total', reason='error')
+        raise
+
+
+def observed_autocomplete(autocomplete):
+    """
+    Decorate an autocomplete view's get method to record how long it takes and how many results it returns.
+    """
+    def decorator(func):
+        """
+        Wrap the method.
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            response = func(*args, **kwargs)
+            observe('section_to_course_autocomplete_seconds', time.perf_counter() - started, autocomplete=autocomplete)
+            results = getattr(response, 'data', None)
+            if isinstance(results, dict) and 'results' in results:
+                observe('section_to_course_autocomplete_results', len(results['results']), autocomplete=autocomplete)
+            return response
+        return wrapper
+    return decorator
+
+
+def _format_labels(labels):
+    """
+    Format label values as they appear after a metric's name.
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+def _format_number(value):
+    """
+    Format a number for the text format, without a fraction for whole numbers.
+    """
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def render_metrics():
+    """
+    Render every metric in Prometheus' text exposition format.
+    """
+    keys = []
+    for metric in METRICS.values():
+        for labels in metric.series():
+            if metric.kind == 'histogram':
+                keys.extend(_key(metric.name, labels, f'.bucket.{index}') for index in range(len(metric.buckets) + 1))
+                keys.extend([_key(metric.name, labels, '.count'), _key(metric.name, labels, '.sum')])
+            elif metric.collect is None:
+                keys.append(_key(metric.name, labels))
+    values = cache.get_many(keys)
+    lines = []
+    for metric in METRICS.values():
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for labels in metric.series():
+            if metric.kind != 'histogram':
+                value = metric.collect() if metric.collect else values.get(_key(metric.name, labels), 0)
+                lines.append(f'{metric.name}{_format_labels(labels)} {_format_number(value)}')
+                continue
+            cumulative = 0
+            for index, bound in enumerate((*metric.buckets, '+Inf')):
+                cumulative += values.get(_key(metric.name, labels, f'.bucket.{index}'), 0)
+                bucket_labels = _format_labels({**labels, 'le': bound})
+                lines.append(f'{metric.name}_bucket{bucket_labels} {cumulative}')
+            total = values.get(_key(metric.name, labels, '.sum'), 0) / SUM_SCALE
+            lines.append(f'{metric.name}_sum{_format_labels(labels)} {_format_number(total)}')
+            lines.append(
+                f'{metric.name}_count{_format_labels(labels)} {values.get(_key(metric.name, labels, ".count"), 0)}'
+            )
+    return '\n'.join(lines) + '\n'
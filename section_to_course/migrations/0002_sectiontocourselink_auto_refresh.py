@@ -0,0 +1,24 @@
+# Generated by Django 3.2.19 on 2026-10-19 03:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('section_to_course', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sectiontocourselink',
+            name='auto_refresh',
+            field=models.BooleanField(default=False, help_text='Refresh this link automatically whenever its source course is published.'),
+        ),
+        migrations.AlterField(
+            model_name='sectiontocourselink',
+            name='last_refresh',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+    ]
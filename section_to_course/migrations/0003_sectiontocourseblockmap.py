@@ -0,0 +1,31 @@
+# Generated by Django 3.2.19 on 2026-10-19 03:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import opaque_keys.edx.django.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('section_to_course', '0002_sectiontocourselink_auto_refresh'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectionToCourseBlockMap',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_block_id', opaque_keys.edx.django.models.UsageKeyField(max_length=255)),
+                ('destination_block_id', opaque_keys.edx.django.models.UsageKeyField(max_length=255)),
+                ('block_type', models.CharField(max_length=64)),
+                ('source_version', models.CharField(blank=True, help_text='The version of the source block when it was last copied.', max_length=255)),
+                ('last_copied', models.DateTimeField(default=django.utils.timezone.now)),
+                ('link', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='block_maps', to='section_to_course.sectiontocourselink')),
+            ],
+            options={
+                'unique_together': {('link', 'source_block_id')},
+            },
+        ),
+    ]
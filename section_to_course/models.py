@@ -2,11 +2,86 @@
 Database models for section_to_course.
 """
 # from django.db import models
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from model_utils.models import TimeStampedModel
 from opaque_keys.edx.django.models import CourseKeyField, UsageKeyField
 
+COURSE_KEY_FIELDS = ('source_course_id', 'destination_course_id')
+USAGE_KEY_FIELDS = ('source_section_id', 'destination_section_id')
+
+
+def key_prefixes(term, key_type):
+    """
+    Get the key prefixes a search term could be referring to.
+
+    Staff often type only the part of a key after its type, like ``edX+DemoX``, so bare terms are also
+    tried as the start of a fully qualified key.
+    """
+    if ':' in term:
+        return [term]
+    return [term, f'{key_type}:{term}']
+
+
+def prefix_query(fields, term):
+    """
+    Build a query matching any of the given key fields against the prefixes a search term could refer to.
+    """
+    query = models.Q()
+    for field in fields:
+        key_type = 'course-v1' if field in COURSE_KEY_FIELDS else 'block-v1'
+        for prefix in key_prefixes(term, key_type):
+            query |= models.Q(**{f'{field}__istartswith': prefix})
+    return query
+
+
+def read_database():
+    """
+    Get the alias of the database read-only queries for links should use, or None to use the default.
+    """
+    alias = getattr(settings, 'SECTION_TO_COURSE_READ_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+class SectionToCourseLinkQuerySet(models.QuerySet):
+    """
+    Custom QuerySet for SectionToCourseLink.
+    """
+
+    def for_reads(self):
+        """
+        Send this query to the read replica configured by SECTION_TO_COURSE_READ_DATABASE, if any.
+
+        Only use this where reading slightly stale data is harmless, since replicas can lag behind the primary.
+        Anything which reads links it has just written, or caches what it reads, should stay on the primary.
+        """
+        alias = read_database()
+        return self.using(alias) if alias else self
+
+    def search(self, term):
+        """
+        Find links with a course or section key starting with the given term.
+
+        Only prefix matches are used, so that the lookups can be served from the indexes on the key columns.
+        """
+        term = term.strip()
+        if not term:
+            return self
+        return self.filter(prefix_query(COURSE_KEY_FIELDS + USAGE_KEY_FIELDS, term))
+
+    def distinct_keys(self, field, term='', limit=20):
+        """
+        Get a limited number of distinct values of a key field starting with the given term.
+
+        This allows choosing between values without scanning the whole table for every distinct value.
+        """
+        queryset = self
+        term = term.strip()
+        if term:
+            queryset = queryset.filter(prefix_query([field], term))
+        return queryset.order_by(field).values_list(field, flat=True).distinct()[:limit]
+
 
 class SectionToCourseLink(TimeStampedModel):
     """
@@ -20,6 +95,12 @@ class SectionToCourseLink(TimeStampedModel):
     source_section_id = UsageKeyField(max_length=255, db_index=True, null=False, blank=False)
     destination_section_id = UsageKeyField(max_length=255, db_index=True, null=False, blank=False)
     last_refresh = models.DateTimeField(null=True, blank=True, default=timezone.now)
+    auto_refresh = models.BooleanField(
+        default=False,
+        help_text='Refresh this link automatically whenever its source course is published.',
+    )
+
+    objects = SectionToCourseLinkQuerySet.as_manager()
 
     class Meta:
         """Meta settings for SectionToCourseLink model."""
@@ -32,3 +113,52 @@ class SectionToCourseLink(TimeStampedModel):
         """
         return f'<SectionToCourseLink #{self.id}, {str(self.source_course_id).split(":")[-1]} to ' \
                f'{str(self.destination_course_id).split(":")[-1]} for {str(self.source_section_id).split("@")[-1]}>'
+
+
+class SectionToCourseBlockMapQuerySet(models.QuerySet):
+    """
+    Queries on block maps.
+    """
+
+    def destinations(self, link, source_block_ids):
+        """
+        Get a mapping of the given source blocks of a link to the blocks they were last copied to.
+
+        Source blocks which haven't been copied yet are left out. This takes one query, on the unique index.
+        """
+        return dict(
+            self.filter(link=link, source_block_id__in=list(source_block_ids)).values_list(
+                'source_block_id', 'destination_block_id',
+            )
+        )
+
+
+class SectionToCourseBlockMap(models.Model):
+    """
+    Records which destination block each block of a link's source section was copied to, and from which version.
+
+    .. no_pii:
+    """
+
+    link = models.ForeignKey(SectionToCourseLink, on_delete=models.CASCADE, related_name='block_maps')
+    source_block_id = UsageKeyField(max_length=255, null=False, blank=False)
+    destination_block_id = UsageKeyField(max_length=255, null=False, blank=False)
+    block_type = models.CharField(max_length=64)
+    source_version = models.CharField(
+        max_length=255, blank=True, help_text='The version of the source block when it was last copied.',
+    )
+    last_copied = models.DateTimeField(default=timezone.now)
+
+    objects = SectionToCourseBlockMapQuerySet.as_manager()
+
+    class Meta:
+        """Meta settings for SectionToCourseBlockMap model."""
+
+        unique_together = ('link', 'source_block_id')
+
+    def __str__(self):
+        """
+        Get a string representation of this model instance.
+        """
+        return f'<SectionToCourseBlockMap #{self.id}, {str(self.source_block_id).split("@")[-1]} to ' \
+               f'{str(self.destination_block_id).split("@")[-1]} for link #{self.link_id}>'
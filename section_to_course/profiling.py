@@ -0,0 +1,193 @@
+"""
+Opt-in profiling of the plugin's views and admin actions.
+
+When the SECTION_TO_COURSE_PROFILING setting is on, staff can add the ``_profile`` parameter to the URL of a
+profiled view to have the request run under cProfile. The SQL queries and modulestore calls it makes are
+counted too, so slowness can be narrowed down to the ORM, the modulestore or the outline service. Profiles
+are stored in the cache, and their IDs are returned in a response header and as an admin message.
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import connections
+from django.http.response import HttpResponseBase
+from django.urls import NoReverseMatch, reverse
+from django.utils.translation import gettext as _
+from rest_framework.response import Response
+
+PROFILE_PARAMETER = '_profile'
+PROFILE_HEADER = 'X-Section-To-Course-Profile'
+PROFILE_CACHE_KEY = 'section_to_course.profile.{}'
+PROFILE_TIMEOUT = 60 * 60 * 24
+# How many of the most expensive functions are kept from each profile.
+PROFILE_STAT_LINES = 50
+
+_active = threading.local()
+
+
+def profiling_enabled():
+    """
+    Check if profiling has been turned on for this deployment.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_PROFILING', False)
+
+
+def profiling_requested(request):
+    """
+    Check if a request asks to be profiled, and is allowed to be.
+    """
+    return (
+        profiling_enabled()
+        and PROFILE_PARAMETER in request.GET
+        and getattr(request.user, 'is_staff', False)
+    )
+
+
+def count_call(name):
+    """
+    Count a call to an upstream service in the profile running in this thread, if any.
+    """
+    profile = getattr(_active, 'profile', None)
+    if profile is not None:
+        profile.calls[name] += 1
+
+
+class CountingProxy:
+    """
+    Wraps an object, counting calls to its methods in the running profile.
+    """
+
+    def __init__(self, wrapped, prefix):
+        """
+        Wrap an object. Calls are counted under the prefix followed by the method name.
+        """
+        self._wrapped = wrapped
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        """
+        Get an attribute of the wrapped object, counting calls if it's a method.
+        """
+        value = getattr(self._wrapped, name)
+        if not callable(value):
+            return value
+
+        @wraps(value)
+        def counted(*args, **kwargs):
+            count_call(f'{self._prefix}.{name}')
+            return value(*args, **kwargs)
+        return counted
+
+
+def counting(wrapped, prefix):
+    """
+    Wrap an object in a CountingProxy if a profile is running in this thread, or return it as is.
+    """
+    if getattr(_active, 'profile', None) is None:
+        return wrapped
+    return CountingProxy(wrapped, prefix)
+
+
+class Profile:
+    """
+    Context manager which profiles the code run within it, then stores the results in the cache.
+    """
+
+    def __init__(self, label):
+        """
+        Prepare a profile. The label says what was profiled.
+        """
+        self.label = label
+        self.profile_id = uuid4().hex
+        self.calls = Counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self._profiler = cProfile.Profile()
+        self._stack = ExitStack()
+        self._started = None
+
+    def _count_query(self, execute, sql, params, many, context):
+        """
+        Execute a query, counting it and the time it takes.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - started
+
+    def __enter__(self):
+        """
+        Start profiling.
+        """
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self._count_query))
+        _active.profile = self
+        self._started = time.perf_counter()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        """
+        Stop profiling and store the results.
+        """
+        self._profiler.disable()
+        elapsed = time.perf_counter() - self._started
+        _active.profile = None
+        self._stack.close()
+        stats = io.StringIO()
+        pstats.Stats(self._profiler, stream=stats).sort_stats('cumulative').print_stats(PROFILE_STAT_LINES)
+        cache.set(PROFILE_CACHE_KEY.format(self.profile_id), {
+            'label': self.label,
+            'elapsed': elapsed,
+            'queries': self.queries,
+            'query_time': self.query_time,
+            'calls': dict(self.calls),
+            'stats': stats.getvalue(),
+        }, timeout=PROFILE_TIMEOUT)
+
+
+def get_profile(profile_id):
+    """
+    Get a stored profile, or None if there isn't one with that ID.
+    """
+    return cache.get(PROFILE_CACHE_KEY.format(profile_id))
+
+
+def profiled(func):
+    """
+    Profile a view, admin view or admin action when its request asks to be.
+
+    The wrapped function must take the request as its second argument, as views on classes and admin actions
+    do.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        request = args[1]
+        if not profiling_requested(request):
+            return func(*args, **kwargs)
+        with Profile(func.__qualname__) as profile:
+            response = func(*args, **kwargs)
+        if isinstance(response, HttpResponseBase):
+            response[PROFILE_HEADER] = profile.profile_id
+        if isinstance(response, Response):
+            # API clients get the header, and have no use for a message showing up on their next admin page.
+            return response
+        try:
+            location = reverse('section_to_course:profile_result', kwargs={'profile_id': profile.profile_id})
+        except NoReverseMatch:
+            location = profile.profile_id
+        messages.info(request, _('Profile saved at {location}.').format(location=location), fail_silently=True)
+        return response
+    return wrapper
@@ -0,0 +1,196 @@
+"""
+Progress reporting for refreshes of section to course links.
+
+Refreshes report their progress by calling a callback with a ProgressEvent at each milestone. The
+callbacks here render those events for the management command, or store them in the cache so that
+the admin can poll for them while a refresh is running.
+"""
+import re
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from section_to_course.metrics import observe
+
+LOADING = 'loading'
+COPYING = 'copying'
+PUBLISHING = 'publishing'
+SAVING = 'saving'
+DONE = 'done'
+
+# Rough share of a refresh which is finished once each phase starts. Copying takes most of the time.
+PHASE_FRACTIONS = {
+    LOADING: 0.0,
+    COPYING: 0.1,
+    PUBLISHING: 0.8,
+    SAVING: 0.95,
+    DONE: 1.0,
+}
+
+PROGRESS_CACHE_KEY = 'section_to_course.progress.{}'
+PROGRESS_TIMEOUT = 60 * 60
+JOB_ID_PATTERN = re.compile(r'^[\w-]{1,64}$')
+
+
+class ProgressEvent(namedtuple('ProgressEvent', [
+    'phase',
+    'link_index',
+    'link_count',
+    'source_section_id',
+    'blocks_copied',
+    'blocks_total',
+    'elapsed',
+    'eta',
+])):
+    """
+    A snapshot of a refresh's progress.
+
+    ``link_index`` is the zero-based position of the link being refreshed among ``link_count`` links, and
+    ``elapsed`` and ``eta`` are in seconds. ``eta`` is None until there's enough information to estimate it.
+    """
+
+    __slots__ = ()
+
+    @property
+    def fraction(self):
+        """
+        Get the overall share of the work which is finished, between 0 and 1.
+        """
+        if self.phase == COPYING and self.blocks_total:
+            link_fraction = PHASE_FRACTIONS[COPYING] + (
+                (PHASE_FRACTIONS[PUBLISHING] - PHASE_FRACTIONS[COPYING]) * self.blocks_copied / self.blocks_total
+            )
+        else:
+            link_fraction = PHASE_FRACTIONS[self.phase]
+        return (self.link_index + link_fraction) / max(self.link_count, 1)
+
+    def as_dict(self):
+        """
+        Get a JSON serializable representation of the event.
+        """
+        return {
+            **self._asdict(),
+            'source_section_id': str(self.source_section_id) if self.source_section_id else None,
+            'fraction': self.fraction,
+        }
+
+
+class ProgressTracker:
+    """
+    Turns the milestones of one or more refreshes into progress events for a callback.
+    """
+
+    def __init__(self, callback=None, link_count=1):
+        """
+        Start tracking. The callback may be None, in which case events are discarded.
+        """
+        self.callback = callback
+        self.link_count = link_count
+        self.link_index = 0
+        self.source_section_id = None
+        self.blocks_copied = 0
+        self.blocks_total = None
+        self.started = time.monotonic()
+        self.phase = None
+        self.phase_started = None
+
+    def start_link(self, link_index, source_section_id):
+        """
+        Note that the refresh of another link has started.
+        """
+        self.link_index = link_index
+        self.source_section_id = source_section_id
+        self.blocks_copied = 0
+        self.blocks_total = None
+        # A phase left unfinished by the last link, because it failed, isn't worth timing.
+        self.phase = None
+
+    def report(self, phase, *, blocks_copied=None, blocks_total=None):
+        """
+        Report that a refresh has reached a phase, and send the resulting event to the callback.
+
+        Reaching a phase finishes the last one, and the time it took is recorded in the metrics.
+        """
+        now = time.monotonic()
+        if phase != self.phase:
+            if self.phase not in (None, DONE):
+                observe('section_to_course_refresh_phase_seconds', now - self.phase_started, phase=self.phase)
+            self.phase = phase
+            self.phase_started = now
+        if blocks_copied is not None:
+            self.blocks_copied = blocks_copied
+        if blocks_total is not None:
+            self.blocks_total = blocks_total
+        elapsed = now - self.started
+        event = ProgressEvent(
+            phase=phase,
+            link_index=self.link_index,
+            link_count=self.link_count,
+            source_section_id=self.source_section_id,
+            blocks_copied=self.blocks_copied,
+            blocks_total=self.blocks_total,
+            elapsed=elapsed,
+            eta=None,
+        )
+        fraction = event.fraction
+        if fraction > 0:
+            event = event._replace(eta=elapsed / fraction - elapsed)
+        if self.callback is not None:
+            self.callback(event)
+        return event
+
+
+def job_cache_key(job_id):
+    """
+    Get the cache key progress for a job is stored under, or None if the job ID isn't acceptable.
+    """
+    if not job_id or not JOB_ID_PATTERN.match(job_id):
+        return None
+    return PROGRESS_CACHE_KEY.format(job_id)
+
+
+class CacheProgressReporter:
+    """
+    Progress callback which stores the latest event for a job in the cache, where it can be polled for.
+    """
+
+    def __init__(self, job_id):
+        """
+        Set up reporting for a job. Invalid job IDs are ignored, so that reporting is never fatal.
+        """
+        self.cache_key = job_cache_key(job_id)
+
+    def __call__(self, event):
+        """
+        Store an event.
+        """
+        if self.cache_key is None:
+            return
+        cache.set(self.cache_key, {**event.as_dict(), 'updated': time.time()}, timeout=PROGRESS_TIMEOUT)
+
+
+def get_job_progress(job_id):
+    """
+    Get the latest progress stored for a job, or None if there isn't any.
+    """
+    cache_key = job_cache_key(job_id)
+    if cache_key is None:
+        return None
+    return cache.get(cache_key)
+
+
+def render_progress_bar(event, width=30):
+    """
+    Render a progress event as a single line of text.
+    """
+    filled = int(round(event.fraction * width))
+    bar = '#' * filled + '-' * (width - filled)
+    details = f'{event.phase}'
+    if event.link_count > 1:
+        details += f', link {event.link_index + 1}/{event.link_count}'
+    if event.blocks_total:
+        details += f', {event.blocks_copied}/{event.blocks_total} blocks'
+    if event.eta is not None and event.phase != DONE:
+        details += f', ETA {event.eta:.0f}s'
+    return f'[{bar}] {event.fraction:4.0%} {details}'
@@ -0,0 +1,442 @@
+"""
+Trigram search indexes used by the section_to_course autocomplete endpoints.
+
+The indexes are inverted indexes from character trigrams to documents, which lets us find substring and
+typo-tolerant matches without scanning every course title on every keystroke.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict, namedtuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from opaque_keys.edx.keys import CourseKey
+
+from .compat import modulestore
+from .metrics import count_cache
+from .profiling import counting
+
+# Minimum share of a term's trigrams a title must contain to be offered as a typo-tolerant match.
+FUZZY_THRESHOLD = 0.4
+# Only this much of a search term is considered, which bounds the number of trigrams looked up per query.
+MAX_TERM_LENGTH = 64
+
+COURSE_INDEX_EPOCH_KEY = 'section_to_course.course_index.epoch'
+COURSE_INDEX_SEQUENCE_KEY = 'section_to_course.course_index.sequence'
+COURSE_INDEX_JOURNAL_KEY = 'section_to_course.course_index.journal.{}'
+# How many course changes are kept around for other processes to replay before they must rebuild instead.
+COURSE_INDEX_JOURNAL_LENGTH = 1000
+COURSE_INDEX_JOURNAL_TIMEOUT = 60 * 60 * 24
+# Changes are numbered before they're written, so an entry can be missing for a moment while it's recorded.
+# One still missing after this many seconds has been lost, and the indexes are rebuilt.
+COURSE_INDEX_JOURNAL_GRACE = 10
+
+_WHITESPACE = re.compile(r'\s+')
+
+Document = namedtuple('Document', ['sequence', 'key', 'text', 'value'])
+
+
+def max_partitions():
+    """
+    Get the most organizations the course index keeps partitions for at once.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_COURSE_INDEX_PARTITIONS', 20)
+
+
+def normalize(text):
+    """
+    Lowercase some text and collapse its whitespace, so that it can be compared and split into trigrams.
+    """
+    return _WHITESPACE.sub(' ', str(text)).strip().lower()
+
+
+def key_words(key):
+    """
+    Get the parts of a key staff search by, as normalized text.
+
+    That's the key without its type, like ``edX+CS101+2023``, followed by each part of the course on its own,
+    and for a block, its ID.
+    """
+    body = str(key).split(':', 1)[-1]
+    course_part, _separator, block_part = body.partition('+type@')
+    parts = course_part.split('+')
+    if block_part:
+        parts.append(block_part.split('@', 1)[-1])
+    return normalize(' '.join([course_part, *parts]))
+
+
+def word_trigrams(text):
+    """
+    Get the trigrams of each word in some normalized text.
+
+    Words are padded with two spaces in front and one behind, in the style of PostgreSQL's pg_trgm, so that
+    the start of a word can be looked up by its padded trigrams.
+    """
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def substring_trigrams(term):
+    """
+    Get the trigrams every document containing a normalized term must also contain.
+
+    Returns a tuple of the trigrams and whether they are sufficient to find any substring, or only
+    documents with a word starting with the term.
+    """
+    words = term.split()
+    grams = {
+        word[i:i + 3]
+        for word in words
+        for i in range(len(word) - 2)
+    }
+    if grams:
+        return grams, True
+    # No word is long enough to contain a whole trigram. Words after the first must start a word in
+    # any match, so we can rely on their padded prefixes.
+    for word in words[1:]:
+        grams.update({f'  {word[0]}', f' {word[:2]}'} if len(word) > 1 else {f'  {word}'})
+    if grams:
+        return grams, True
+    # A single short word. There's no way to look up arbitrary substrings of one or two characters, so
+    # we only match it against the start of words.
+    word = words[0]
+    return ({f'  {word[0]}', f' {word[:2]}'} if len(word) > 1 else {f'  {word}'}), False
+
+
+class TrigramIndex:
+    """
+    An inverted index from trigrams to documents.
+
+    Each document has a key, which is matched by prefix, and a text, which is matched by substring along
+    with the parts of the key, so that ``CS101`` or ``edX+CS`` find a course as well as its title does. If
+    nothing matches a term exactly, texts sharing enough trigrams with it are returned instead, so that
+    small typos still find results.
+    """
+
+    def __init__(self):
+        """
+        Create an empty index.
+        """
+        self._documents = {}
+        self._postings = defaultdict(set)
+        self._sorted_keys = []
+        self._sequence = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        """
+        Get the number of documents in the index.
+        """
+        return len(self._documents)
+
+    def __contains__(self, key):
+        """
+        Check if a document key is in the index.
+        """
+        return str(key) in self._documents
+
+    def contains_ignoring_case(self, key):
+        """
+        Check if a document key is in the index, ignoring case.
+        """
+        lowered = str(key).lower()
+        with self._lock:
+            position = bisect_left(self._sorted_keys, (lowered,))
+            return position < len(self._sorted_keys) and self._sorted_keys[position][0] == lowered
+
+    def add(self, key, text, value):
+        """
+        Add a document to the index, replacing any existing document with the same key.
+        """
+        key = str(key)
+        with self._lock:
+            self.discard(key)
+            self._sequence += 1
+            document = Document(self._sequence, key.lower(), f'{normalize(text)} {key_words(key)}', value)
+            self._documents[key] = document
+            for gram in word_trigrams(document.text):
+                self._postings[gram].add(key)
+            insort(self._sorted_keys, (document.key, key))
+
+    def discard(self, key):
+        """
+        Remove a document from the index, if it is present.
+        """
+        key = str(key)
+        with self._lock:
+            document = self._documents.pop(key, None)
+            if document is None:
+                return
+            for gram in word_trigrams(document.text):
+                postings = self._postings[gram]
+                postings.discard(key)
+                if not postings:
+                    del self._postings[gram]
+            position = bisect_left(self._sorted_keys, (document.key, key))
+            del self._sorted_keys[position]
+
+    def search(self, term, limit=None):
+        """
+        Get the values of documents matching a search term, best matches first.
+
+        Keys starting with the term and texts starting with it rank first, followed by texts with a word
+        starting with it, followed by texts containing it anywhere. Only when none of those exist are
+        typo-tolerant matches returned.
+        """
+        term = normalize(term)[:MAX_TERM_LENGTH].strip()
+        with self._lock:
+            if not term:
+                # Documents are always re-inserted when replaced, so this is already in sequence order.
+                documents = list(self._documents.values())
+            else:
+                ranked = self._exact_matches(term) or self._fuzzy_matches(term)
+                documents = [self._documents[key] for key in sorted(ranked, key=ranked.get)]
+        if limit is not None:
+            documents = documents[:limit]
+        return [document.value for document in documents]
+
+    def _candidates(self, grams):
+        """
+        Get the keys of documents containing all of the given trigrams, starting from the rarest.
+        """
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        return candidates
+
+    def _exact_matches(self, term):
+        """
+        Get a mapping of the keys of documents matching a term by prefix or substring to their ranks.
+        """
+        ranked = {}
+        position = bisect_left(self._sorted_keys, (term,))
+        while position < len(self._sorted_keys) and self._sorted_keys[position][0].startswith(term):
+            ranked[self._sorted_keys[position][1]] = 0
+            position += 1
+        grams, any_substring = substring_trigrams(term)
+        for key in self._candidates(grams):
+            if key in ranked:
+                continue
+            text = self._documents[key].text
+            if text.startswith(term):
+                ranked[key] = 0
+            elif f' {term}' in text:
+                ranked[key] = 1
+            elif any_substring and term in text:
+                ranked[key] = 2
+        return {key: (rank, self._documents[key].sequence) for key, rank in ranked.items()}
+
+    def _fuzzy_matches(self, term):
+        """
+        Get a mapping of the keys of documents sharing enough trigrams with a term to their ranks.
+        """
+        grams = word_trigrams(term)
+        if len(term) < 3 or not grams:
+            return {}
+        counts = defaultdict(int)
+        for gram in grams:
+            for key in self._postings.get(gram, ()):
+                counts[key] += 1
+        required = FUZZY_THRESHOLD * len(grams)
+        return {
+            key: (-count, self._documents[key].sequence)
+            for key, count in counts.items()
+            if count >= required
+        }
+
+
+def add_course_to_index(index, course):
+    """
+    Add or replace a course in a trigram index, with a value ready for use in autocomplete fields.
+    """
+    index.add(course.id, course.display_name, {'id': str(course.id), 'text': f'{course.display_name} ({course.id})'})
+
+
+class CourseIndex:
+    """
+    Trigram indexes over the courses in the modulestore.
+
+    There's an index of every course, and smaller indexes partitioned by organization, so that searches
+    scoped to one organization don't depend on the size of the whole catalogue. Each is loaded from the
+    modulestore the first time it's needed. Only the most recently used organizations are kept, up to
+    SECTION_TO_COURSE_COURSE_INDEX_PARTITIONS of them.
+
+    Indexes are maintained incrementally once loaded. Processes share a journal of changed course keys
+    through the cache. Each process replays any changes it has not seen yet before searching, and starts
+    over from scratch if the journal has been lost or has moved too far ahead. Changes after one which is
+    still being recorded wait for it, for up to COURSE_INDEX_JOURNAL_GRACE seconds.
+    """
+
+    def __init__(self):
+        """
+        Create an empty course index, which will be loaded on first use.
+        """
+        self.index = None
+        self.partitions = OrderedDict()
+        self.epoch = None
+        self.sequence = 0
+        # The number of the first journal entry found missing, and when it was first found missing.
+        self._gap = None
+        self._lock = threading.RLock()
+
+    def search(self, term, limit=None, org=None):
+        """
+        Search for courses matching a term, optionally only within one organization.
+
+        Results are dictionaries ready for use in autocomplete fields.
+        """
+        return self.scope(org).search(term, limit=limit)
+
+    def has_course(self, course_key):
+        """
+        Check if a course exists, ignoring case as Studio does when creating courses.
+        """
+        return self.scope().contains_ignoring_case(course_key)
+
+    def scope(self, org=None):
+        """
+        Get the up to date trigram index of either one organization's courses or every course.
+        """
+        with self._lock:
+            self.sync()
+            if org is None:
+                count_cache('course_index', self.index is not None)
+                if self.index is None:
+                    self.index = self._load()
+                return self.index
+            partition = self.partitions.get(org)
+            count_cache('course_index', partition is not None)
+            if partition is None:
+                partition = self.partitions[org] = self._load(org)
+                while len(self.partitions) > max_partitions():
+                    self.partitions.popitem(last=False)
+            else:
+                self.partitions.move_to_end(org)
+            return partition
+
+    @staticmethod
+    def _load(org=None):
+        """
+        Load a trigram index of either one organization's courses or every course from the modulestore.
+
+        Only course summaries are read, since building every course block just for its title is slow. They're
+        fetched in one call, since the index keeps the title and key of every course it covers anyway, and
+        upstream reads them all at once regardless.
+        """
+        index = TrigramIndex()
+        kwargs = {'org': org} if org else {}
+        for course in counting(modulestore(), 'modulestore').get_course_summaries(**kwargs):
+            add_course_to_index(index, course)
+        return index
+
+    def reindex_course(self, course_key):
+        """
+        Update a single course in any loaded indexes from the modulestore.
+        """
+        course_key = CourseKey.from_string(str(course_key))
+        indexes = [index for index in (self.index, self.partitions.get(course_key.org)) if index is not None]
+        if not indexes:
+            return
+        course = counting(modulestore(), 'modulestore').get_course(course_key)
+        for index in indexes:
+            if course is None:
+                index.discard(course_key)
+            else:
+                add_course_to_index(index, course)
+
+    def rebuild(self):
+        """
+        Drop every loaded index, so that they're loaded again from the modulestore when next needed.
+        """
+        self.index = None
+        self.partitions.clear()
+
+    def sync(self):
+        """
+        Bring the loaded indexes up to date with changes recorded by any process.
+        """
+        with self._lock:
+            state = cache.get_many([COURSE_INDEX_EPOCH_KEY, COURSE_INDEX_SEQUENCE_KEY])
+            epoch = state.get(COURSE_INDEX_EPOCH_KEY)
+            sequence = state.get(COURSE_INDEX_SEQUENCE_KEY)
+            if epoch is None or sequence is None:
+                epoch, sequence = self._start_epoch()
+            if epoch is None:
+                # The cache isn't keeping anything, so this process can only rely on its own indexes.
+                epoch, sequence = self.epoch or uuid4().hex, self.sequence
+            if epoch != self.epoch or sequence - self.sequence > COURSE_INDEX_JOURNAL_LENGTH:
+                self.rebuild()
+                self._gap = None
+            elif sequence > self.sequence:
+                sequence = self._replay(sequence)
+            self.epoch, self.sequence = epoch, sequence
+
+    def _replay(self, sequence):
+        """
+        Replay the journal up to a sequence number, returning the number it was replayed up to.
+
+        Replay stops before an entry which is missing, unless it has been missing for longer than
+        COURSE_INDEX_JOURNAL_GRACE, in which case the indexes are rebuilt instead.
+        """
+        numbers = range(self.sequence + 1, sequence + 1)
+        changes = cache.get_many([COURSE_INDEX_JOURNAL_KEY.format(number) for number in numbers])
+        course_keys = []
+        for number in numbers:
+            course_key = changes.get(COURSE_INDEX_JOURNAL_KEY.format(number))
+            if course_key is None:
+                if self._gap is None or self._gap[0] != number:
+                    self._gap = (number, time.monotonic())
+                elif time.monotonic() - self._gap[1] > COURSE_INDEX_JOURNAL_GRACE:
+                    self.rebuild()
+                    self._gap = None
+                    return sequence
+                sequence = number - 1
+                break
+            course_keys.append(course_key)
+        else:
+            self._gap = None
+        for course_key in set(course_keys):
+            self.reindex_course(course_key)
+        return sequence
+
+    @staticmethod
+    def _start_epoch():
+        """
+        Start a new shared epoch, or adopt the one another process started at the same time.
+        """
+        cache.add(COURSE_INDEX_EPOCH_KEY, uuid4().hex, timeout=None)
+        cache.add(COURSE_INDEX_SEQUENCE_KEY, 0, timeout=None)
+        state = cache.get_many([COURSE_INDEX_EPOCH_KEY, COURSE_INDEX_SEQUENCE_KEY])
+        return state.get(COURSE_INDEX_EPOCH_KEY), state.get(COURSE_INDEX_SEQUENCE_KEY, 0)
+
+    @staticmethod
+    def record_change(course_key):
+        """
+        Record that a course has changed, so that every process updates it in their index.
+        """
+        try:
+            sequence = cache.incr(COURSE_INDEX_SEQUENCE_KEY)
+        except ValueError:
+            # The journal has been lost. Every process will rebuild once a new epoch starts.
+            cache.delete(COURSE_INDEX_EPOCH_KEY)
+            return
+        cache.set(COURSE_INDEX_JOURNAL_KEY.format(sequence), str(course_key), timeout=COURSE_INDEX_JOURNAL_TIMEOUT)
+
+
+_course_index = CourseIndex()
+
+
+def course_index():
+    """
+    Get the course index for this process.
+    """
+    return _course_index
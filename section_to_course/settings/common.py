@@ -4,7 +4,46 @@ Tweaks the platform settings to enable support for section_to_course.
 
 
 def plugin_settings(settings):
-    """Add django_object_actions to the installed apps so that its templates are loaded."""
+    """Add django_object_actions to the installed apps so that its templates are loaded, and set our defaults."""
     settings.INSTALLED_APPS += (
         'django_object_actions',
     )
+    # Seconds after which the lock on a destination course being refreshed is assumed to belong to a
+    # refresh which died, and is released.
+    settings.SECTION_TO_COURSE_LOCK_TIMEOUT = 60 * 30
+    # Seconds a refresh waits for another refresh of the same destination course to finish before it's skipped.
+    settings.SECTION_TO_COURSE_LOCK_WAIT = 60 * 5
+    # Whether staff may profile the plugin's views and admin actions by adding a _profile parameter to their URLs.
+    settings.SECTION_TO_COURSE_PROFILING = False
+    # How many destination courses may be refreshed at once when a refresh cascades to dependent courses.
+    settings.SECTION_TO_COURSE_CASCADE_WORKERS = 4
+    # Seconds a source course must go without being published before links with automatic refresh are refreshed.
+    settings.SECTION_TO_COURSE_AUTO_REFRESH_DELAY = 60 * 5
+    # Username automatic refreshes are made as. Automatic refreshes are skipped until this is set.
+    settings.SECTION_TO_COURSE_AUTO_REFRESH_USERNAME = None
+    # Alias of a read replica in DATABASES to send read-only link queries to, like autocomplete and listings.
+    settings.SECTION_TO_COURSE_READ_DATABASE = None
+    # How many organizations the course autocomplete keeps a separate search index for at once.
+    settings.SECTION_TO_COURSE_COURSE_INDEX_PARTITIONS = 20
+    # Whether each process serving requests warms section_to_course's caches in a background thread, starting on
+    # its first request.
+    settings.SECTION_TO_COURSE_WARM_UP_ON_START = False
+    # How many of the most recently used source courses have their sections loaded when warming caches.
+    settings.SECTION_TO_COURSE_WARM_UP_SECTIONS = 50
+    # Most refreshes which may write to the modulestore at once, in total and into each organization's courses.
+    # None means no limit.
+    settings.SECTION_TO_COURSE_MAX_REFRESHES = None
+    settings.SECTION_TO_COURSE_MAX_REFRESHES_PER_ORG = None
+    # Most blocks which may be copied per second, in total and into each organization's courses. None means no limit.
+    settings.SECTION_TO_COURSE_BLOCKS_PER_SECOND = None
+    settings.SECTION_TO_COURSE_BLOCKS_PER_SECOND_PER_ORG = None
+    # Seconds a refresh waits for its turn under the limits above before it's skipped.
+    settings.SECTION_TO_COURSE_THROTTLE_WAIT = 60 * 5
+    # Seconds a refresh started from the admin waits for its turn, since someone is waiting on the page, before
+    # it's rejected instead.
+    settings.SECTION_TO_COURSE_ADMIN_THROTTLE_WAIT = 5
+    # Whether runtime metrics are counted in the cache, for the metrics endpoint to expose to Prometheus.
+    settings.SECTION_TO_COURSE_METRICS = True
+    # A secret which Prometheus can send as a bearer token to read the metrics endpoint, since it can't log in.
+    # None means only staff can read the metrics.
+    settings.SECTION_TO_COURSE_METRICS_TOKEN = None
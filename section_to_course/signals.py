@@ -0,0 +1,104 @@
+"""
+Signal handlers for section_to_course.
+"""
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from organizations.models import Organization
+
+from .compat import course_deleted_signal, course_published_signal
+from .linked_keys import links_changed
+from .locks import refreshing_in_this_thread
+from .lookups import clear_course_sections, clear_organization_options
+from .metrics import flush_batch, start_batch
+from .models import SectionToCourseLink
+from .search import course_index
+from .warmup import start_warm_up
+
+WARM_UP_DISPATCH_UID = 'section_to_course.request_started.warm_up'
+
+
+@receiver(course_published_signal(), dispatch_uid='section_to_course.course_published.index')
+@receiver(course_deleted_signal(), dispatch_uid='section_to_course.course_deleted.index')
+def update_course_index(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    """
+    Keep the course search index up to date as courses change.
+    """
+    course_index().record_change(course_key)
+
+
+@receiver(course_published_signal(), dispatch_uid='section_to_course.course_published.sections')
+@receiver(course_deleted_signal(), dispatch_uid='section_to_course.course_deleted.sections')
+def update_course_sections(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    """
+    Clear the cached sections of a course whenever it changes.
+    """
+    clear_course_sections(course_key)
+
+
+@receiver(course_published_signal(), dispatch_uid='section_to_course.course_published.auto_refresh')
+def schedule_auto_refreshes(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    """
+    Schedule automatic refreshes of the links copying sections from a course which was just published.
+    """
+    if refreshing_in_this_thread(course_key):
+        # This is one of our own refreshes publishing its destination. Following on from it automatically
+        # could refresh back and forth forever if links form a cycle, so chains are left to the cascading
+        # refresh in the admin.
+        return
+    link_ids = list(
+        SectionToCourseLink.objects.filter(source_course_id=course_key, auto_refresh=True).values_list('id', flat=True)
+    )
+    if link_ids:
+        # Deferred so that loading the signal handlers doesn't pull in Celery and the refresh machinery.
+        from .tasks import schedule_auto_refresh  # pylint: disable=import-outside-toplevel
+        schedule_auto_refresh(link_ids)
+
+
+@receiver(post_save, sender=Organization, dispatch_uid='section_to_course.organization_saved')
+@receiver(post_delete, sender=Organization, dispatch_uid='section_to_course.organization_deleted')
+def update_organization_options(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Clear the cached organization options whenever an organization changes.
+    """
+    clear_organization_options()
+
+
+@receiver(post_save, sender=SectionToCourseLink, dispatch_uid='section_to_course.link_saved')
+@receiver(post_delete, sender=SectionToCourseLink, dispatch_uid='section_to_course.link_deleted')
+def update_linked_keys(sender, created=True, **kwargs):  # pylint: disable=unused-argument
+    """
+    Reload the sets of linked keys whenever a link is added or removed.
+    """
+    # Saving an existing link can only change its destination section, which isn't in any set.
+    if created:
+        links_changed()
+
+
+@receiver(request_started, dispatch_uid=WARM_UP_DISPATCH_UID)
+def warm_up_on_first_request(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Start warming this process's caches when it serves its first request, if that's turned on.
+
+    Waiting for a request, rather than starting as the app loads, keeps management commands and the master
+    process of a preforking server from warming caches they'll never use.
+    """
+    # Only the first of several simultaneous requests gets to disconnect the handler, so only it starts a warm-up.
+    if request_started.disconnect(dispatch_uid=WARM_UP_DISPATCH_UID):
+        start_warm_up()
+
+
+@receiver(request_started, dispatch_uid='section_to_course.request_started.metrics')
+def batch_request_metrics(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Hold back the metrics recorded while serving a request, so that they're written together once it's done.
+    """
+    start_batch()
+
+
+@receiver(request_finished, dispatch_uid='section_to_course.request_finished.metrics')
+def write_request_metrics(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Write the metrics recorded while serving a request.
+    """
+    flush_batch()
@@ -52,6 +52,67 @@
     return this;
   };
 
+  // The changelist filters load their choices as the user types, and apply the chosen one straight away.
+  $(() => {
+    $('.section-to-course-filter').courseSelect().on('change', (event) => {
+      const params = new URLSearchParams(window.location.search)
+      params.set(event.target.getAttribute('data-lookup'), event.target.value)
+      // Go back to the first page, since the current one may not exist once filtered.
+      params.delete('p')
+      window.location.search = params.toString()
+    })
+  })
+
+  // Refreshes can take a long time, so we poll for their progress while the refresh request is running.
+  // The page tells us where to poll, with a placeholder for the job ID.
+  const stallSeconds = 30
+  const watchProgress = (element) => {
+    const jobId = `${Date.now()}-${Math.random().toString(36).slice(2)}`
+    const progressUrl = $('#section-to-course-progress').attr('data-url-template').replace(/%3Cjob_id%3E/, jobId)
+    const $status = $('<p class="section-to-course-progress"></p>').insertBefore(element)
+    const poll = () => {
+      $.getJSON(progressUrl).done((event) => {
+        let text = `${Math.round(event.fraction * 100)}% ${event.phase}`
+        if (event.link_count > 1) {
+          text += `, link ${event.link_index + 1}/${event.link_count}`
+        }
+        if (event.blocks_total) {
+          text += `, ${event.blocks_copied}/${event.blocks_total} blocks`
+        }
+        if (event.eta !== null && event.phase !== 'done') {
+          text += `, about ${Math.round(event.eta)}s left`
+        }
+        if (Date.now() / 1000 - event.updated > stallSeconds) {
+          text += ` (no progress in the last ${stallSeconds}s)`
+        }
+        $status.text(text)
+      }).always(() => setTimeout(poll, 1000))
+    }
+    setTimeout(poll, 1000)
+    return jobId
+  }
+
+  $(() => {
+    if (!$('#section-to-course-progress').length) {
+      return
+    }
+    $('#changelist-form').on('submit', (event) => {
+      const $form = $(event.target)
+      if ($form.find('select[name=action]').val() === 'refresh_courses') {
+        $('<input type="hidden" name="_progress_job">').val(watchProgress($form)).appendTo($form)
+      }
+    })
+    $('form[action*="/actions/refresh_this/"]').on('submit', (event) => {
+      const $form = $(event.target)
+      $('<input type="hidden" name="_progress_job">').val(watchProgress($form.closest('ul'))).appendTo($form)
+    })
+    $('a[href*="/actions/refresh_this/"]').on('click', (event) => {
+      const url = new URL(event.currentTarget.href)
+      url.searchParams.set('_progress_job', watchProgress($(event.currentTarget).closest('ul')))
+      event.currentTarget.href = url.toString()
+    })
+  })
+
   // example matching string: course-v1:edX+DemoX+Demo_Course
   const courseRe = /[^:]+:[^+]+[+][^+]+[+][^+]+/
 
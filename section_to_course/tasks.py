@@ -0,0 +1,111 @@
+"""
+Celery tasks for section_to_course.
+
+Links with automatic refresh turned on are refreshed whenever their source course is published. Authors
+often publish many times in a row while editing, so refreshes are debounced: each publish pushes the link's
+refresh back until the source course has been quiet for SECTION_TO_COURSE_AUTO_REFRESH_DELAY seconds, and
+only one refresh task per link is queued at a time.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from section_to_course.compat import shared_task
+from section_to_course.metrics import increment
+from section_to_course.models import SectionToCourseLink
+from section_to_course.utils import refresh_links
+
+log = logging.getLogger(__name__)
+
+AUTO_REFRESH_DUE_KEY = 'section_to_course.auto_refresh.due.{}'
+AUTO_REFRESH_SCHEDULED_KEY = 'section_to_course.auto_refresh.scheduled.{}'
+# The scheduled flag is renewed whenever its task requeues itself and cleared when the task finishes, so this
+# only matters if the task is lost, in which case the link isn't refreshed automatically until it runs out.
+AUTO_REFRESH_SCHEDULED_TIMEOUT = 60 * 60 * 24
+
+
+def auto_refresh_delay():
+    """
+    Get the number of seconds a source course must go without being published before its links are refreshed.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_AUTO_REFRESH_DELAY', 60 * 5)
+
+
+def auto_refresh_user():
+    """
+    Get the user automatic refreshes are made as, or None if there isn't one configured.
+    """
+    username = getattr(settings, 'SECTION_TO_COURSE_AUTO_REFRESH_USERNAME', None)
+    if not username:
+        return None
+    return get_user_model().objects.filter(username=username).first()
+
+
+def schedule_auto_refresh(link_ids):
+    """
+    Push back the automatic refresh of some links, queueing a refresh task for any which don't have one.
+    """
+    delay = auto_refresh_delay()
+    due = time.time() + delay
+    for link_id in link_ids:
+        cache.set(AUTO_REFRESH_DUE_KEY.format(link_id), due, timeout=delay * 3)
+        _queue_auto_refresh(link_id, delay)
+
+
+def _queue_auto_refresh(link_id, countdown):
+    """
+    Queue a refresh task for a link, unless one is already queued or running.
+    """
+    if cache.add(AUTO_REFRESH_SCHEDULED_KEY.format(link_id), True, timeout=AUTO_REFRESH_SCHEDULED_TIMEOUT):
+        increment('section_to_course_auto_refreshes_queued')
+        auto_refresh_link.apply_async(args=[link_id], countdown=countdown)
+
+
+@shared_task(bind=True)
+def auto_refresh_link(self, link_id):
+    """
+    Refresh a link once its source course has been quiet for long enough, or wait some more if it hasn't.
+    """
+    due_key = AUTO_REFRESH_DUE_KEY.format(link_id)
+    scheduled_key = AUTO_REFRESH_SCHEDULED_KEY.format(link_id)
+    due = cache.get(due_key)
+    remaining = due - time.time() if due is not None else 0
+    # Eager tasks ignore their countdown, so waiting would just run the task again straight away.
+    if remaining > 0 and not self.request.is_eager:
+        cache.set(scheduled_key, True, timeout=AUTO_REFRESH_SCHEDULED_TIMEOUT)
+        auto_refresh_link.apply_async(args=[link_id], countdown=remaining)
+        return
+    refreshed = True
+    try:
+        refreshed = _auto_refresh(link_id)
+    finally:
+        if cache.delete(scheduled_key):
+            increment('section_to_course_auto_refreshes_queued', -1)
+    if not refreshed:
+        # The destination stayed busy or throttled for too long, so try again later.
+        schedule_auto_refresh([link_id])
+        return
+    # Publishes during the refresh found this task still running, so they only pushed back the due time.
+    due_now = cache.get(due_key)
+    if due_now is not None and due_now != due:
+        _queue_auto_refresh(link_id, max(due_now - time.time(), 0))
+
+
+def _auto_refresh(link_id):
+    """
+    Refresh a link with automatic refresh turned on, returning False if the refresh should be tried again later.
+    """
+    link = SectionToCourseLink.objects.filter(id=link_id, auto_refresh=True).first()
+    if link is None:
+        return True
+    user = auto_refresh_user()
+    if user is None:
+        log.warning(
+            'Not refreshing %s automatically, since SECTION_TO_COURSE_AUTO_REFRESH_USERNAME does not name a user.',
+            link,
+        )
+        return True
+    return bool(refresh_links([link], user=user))
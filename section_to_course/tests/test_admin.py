@@ -1,8 +1,11 @@
 """
 Tests for the admin views of the section_to_course app.
 """
+from unittest import mock
+
 from common.djangoapps.student.tests.factories import UserFactory  # pylint: disable=import-error
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from freezegun import freeze_time
@@ -12,7 +15,10 @@ from rest_framework import status
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase  # pylint: disable=import-error
 
 from ..compat import get_course, update_outline_from_modulestore
-from ..models import SectionToCourseLink
+from ..models import SectionToCourseLink, SectionToCourseLinkQuerySet
+from ..profiling import PROFILE_HEADER, get_profile
+from ..progress import DONE, get_job_progress
+from ..throttle import GLOBAL_SCOPE, SLOT_KEY
 from .factories import SectionToCourseLinkFactory
 
 try:
@@ -40,6 +46,70 @@ class TestSectionToCourseLinkAdmin(ModuleStoreTestCase, TestCase):
         response = self.client.get(reverse('admin:section_to_course_sectiontocourselink_changelist'))
         assert response.status_code == status.HTTP_200_OK
         assert '>edit course<' in response.content.decode('utf-8')
+        progress_url = reverse('section_to_course:refresh_progress', kwargs={'job_id': '<job_id>'})
+        assert f'data-url-template="{progress_url}"' in response.content.decode('utf-8')
+
+    def test_read_replica(self):
+        """Test that only displaying the changelist reads from the read replica, and not the change form."""
+        link = SectionToCourseLinkFactory()
+        with mock.patch.object(
+            SectionToCourseLinkQuerySet, 'for_reads', autospec=True, side_effect=lambda queryset: queryset,
+        ) as for_reads:
+            response = self.client.get(reverse('admin:section_to_course_sectiontocourselink_change', args=[link.id]))
+            assert response.status_code == status.HTTP_200_OK
+            for_reads.assert_not_called()
+            response = self.client.get(reverse('admin:section_to_course_sectiontocourselink_changelist'))
+            assert response.status_code == status.HTTP_200_OK
+            for_reads.assert_called_once()
+
+    @override_settings(SECTION_TO_COURSE_MAX_REFRESHES=4)
+    def test_listing_throttle_state(self):
+        """Test that the listing shows the state of the refresh throttles when there are any."""
+        url = reverse('admin:section_to_course_sectiontocourselink_changelist')
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert 'Refresh throttles' in response.content.decode('utf-8')
+        assert '0 / 4' in response.content.decode('utf-8')
+        with override_settings(SECTION_TO_COURSE_MAX_REFRESHES=None):
+            assert 'Refresh throttles' not in self.client.get(url).content.decode('utf-8')
+
+    def test_search(self):
+        """Test that the changelist can be searched by the start of a key, with or without its type."""
+        SectionToCourseLinkFactory(destination_course=None, destination_course_id=CourseLocator('foo', 'bar', 'baz'))
+        SectionToCourseLinkFactory(destination_course=None, destination_course_id=CourseLocator('qux', 'bar', 'baz'))
+        url = reverse('admin:section_to_course_sectiontocourselink_changelist')
+        for term in ('foo+bar', 'course-v1:foo'):
+            response = self.client.get(url, {'q': term})
+            assert response.status_code == status.HTTP_200_OK
+            content = response.content.decode('utf-8')
+            assert 'course-v1:foo+bar+baz' in content
+            assert 'course-v1:qux+bar+baz' not in content
+
+    def test_filter(self):
+        """Test that the changelist can be filtered by destination course without listing every course."""
+        SectionToCourseLinkFactory(destination_course=None, destination_course_id=CourseLocator('foo', 'bar', 'baz'))
+        SectionToCourseLinkFactory(destination_course=None, destination_course_id=CourseLocator('qux', 'bar', 'baz'))
+        response = self.client.get(
+            reverse('admin:section_to_course_sectiontocourselink_changelist'),
+            {'destination_course_id': 'course-v1:foo+bar+baz'},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        content = response.content.decode('utf-8')
+        assert 'section-to-course-filter' in content
+        assert 'course-v1:qux+bar+baz' not in content
+
+    def test_profile_changelist(self):
+        """Test that staff can profile the changelist when profiling is enabled."""
+        SectionToCourseLinkFactory()
+        url = reverse('admin:section_to_course_sectiontocourselink_changelist')
+        response = self.client.get(url, {'_profile': ''})
+        assert PROFILE_HEADER not in response
+        with override_settings(SECTION_TO_COURSE_PROFILING=True):
+            response = self.client.get(url, {'_profile': ''})
+        assert response.status_code == status.HTTP_200_OK
+        profile = get_profile(response[PROFILE_HEADER])
+        assert profile['label'] == 'SectionToCourseLinkAdmin.changelist_view'
+        assert profile['queries'] > 0
 
     def test_detail(self):
         """Test that the admin detail page loads."""
@@ -49,6 +119,7 @@ class TestSectionToCourseLinkAdmin(ModuleStoreTestCase, TestCase):
         content = response.content.decode('utf-8')
         assert '>edit course<' in content
         assert 'Last refresh:' in content
+        assert 'id="section-to-course-progress"' in content
 
     @freeze_time('2018-01-01')
     def test_refresh_from_changelist(self):
@@ -92,6 +163,37 @@ class TestSectionToCourseLinkAdmin(ModuleStoreTestCase, TestCase):
         assert link.last_refresh == new_time
         assert link.last_refresh != original_time
 
+    @override_settings(SECTION_TO_COURSE_MAX_REFRESHES=1, SECTION_TO_COURSE_ADMIN_THROTTLE_WAIT=0)
+    def test_refresh_from_change_throttled(self):
+        """Test that the admin refresh button says when a refresh was rejected because there was no turn for it."""
+        link = SectionToCourseLinkFactory()
+        cache.set(SLOT_KEY.format(GLOBAL_SCOPE, 0), 'elsewhere')
+        response = self.client.post(
+            reverse(
+                'admin:section_to_course_sectiontocourselink_actions', kwargs={'pk': link.id, 'tool': 'refresh_this'},
+            ),
+            follow=True,
+        )
+        assert 'this refresh was rejected' in response.content.decode('utf-8')
+
+    def test_refresh_reports_progress(self):
+        """Test that refreshes from the admin report progress for the job named in the request."""
+        link = SectionToCourseLinkFactory()
+        response = self.client.post(
+            reverse('admin:section_to_course_sectiontocourselink_changelist'), {
+                'action': 'refresh_courses',
+                '_selected_action': str(link.id),
+                'index': '0',
+                'select_across': '0',
+                '_progress_job': 'job-1',
+            },
+            follow=True,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        progress = get_job_progress('job-1')
+        assert progress['phase'] == DONE
+        assert progress['source_section_id'] == str(link.source_section_id)
+
     def create_section_to_course_link(self, course, section, org):
         """Create a section to course link via the admin."""
         return self.client.post(
@@ -127,3 +229,51 @@ class TestSectionToCourseLinkAdmin(ModuleStoreTestCase, TestCase):
         assert 'A course with this number, org, and run already exists.' in response.content.decode('utf-8')
         # Will throw if there's more than one.
         SectionToCourseLink.objects.get()
+
+    @override_settings(SECTION_TO_COURSE_MAX_REFRESHES=1, SECTION_TO_COURSE_ADMIN_THROTTLE_WAIT=0)
+    def test_create_course_throttled(self):
+        """Test that the form shows an error, without creating a course, when there's no turn to copy into it."""
+        course = CourseFactory()
+        section = BlockFactory(parent_location=course.location)
+        org = OrganizationFactory()
+        update_outline_from_modulestore(course.id)
+        cache.set(SLOT_KEY.format(GLOBAL_SCOPE, 0), 'elsewhere')
+        response = self.create_section_to_course_link(course, section, org)
+        assert 'Too many courses are being created or refreshed right now.' in response.content.decode('utf-8')
+        assert get_course(CourseLocator(org.short_name, 'NC101', '2023')) is None
+        assert not SectionToCourseLink.objects.exists()
+
+    def test_create_course_from_linked_section(self):
+        """Test that a section which has already been made into a course can't be used again, first or not."""
+        course = CourseFactory()
+        section = BlockFactory(parent_location=course.location)
+        other_section = BlockFactory(parent_location=course.location)
+        org = OrganizationFactory()
+        update_outline_from_modulestore(course.id)
+        self.create_section_to_course_link(course, section, org)
+        response = self.client.post(
+            reverse('admin:section_to_course_sectiontocourselink_add'), {
+                'source_course_id': str(course.id),
+                'source_section_id': str(section.location),
+                'new_course_name': 'Another Course',
+                'new_course_org': org.short_name,
+                'new_course_number': 'NC102',
+                'new_course_run': '2023',
+            },
+            follow=True,
+        )
+        assert 'This section has already been made into a course.' in response.content.decode('utf-8')
+        response = self.client.post(
+            reverse('admin:section_to_course_sectiontocourselink_add'), {
+                'source_course_id': str(course.id),
+                'source_section_id': str(other_section.location),
+                'additional_source_section_ids': str(section.location),
+                'new_course_name': 'Another Course',
+                'new_course_org': org.short_name,
+                'new_course_number': 'NC102',
+                'new_course_run': '2023',
+            },
+            follow=True,
+        )
+        assert f'Section {section.location} has already been made into a course.' in response.content.decode('utf-8')
+        assert SectionToCourseLink.objects.count() == 1
@@ -0,0 +1,116 @@
+"""
+Tests for copying static assets between courses.
+"""
+from unittest import mock
+
+from common.djangoapps.student.tests.factories import UserFactory  # pylint: disable=import-error
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase  # pylint: disable=import-error
+
+try:
+    from xmodule.modulestore.tests.factories import BlockFactory, CourseFactory
+except ImportError:
+    # This is no longer needed in Palm.
+    from xmodule.modulestore.tests.factories import CourseFactory
+    from xmodule.modulestore.tests.factories import ItemFactory as BlockFactory
+
+from section_to_course.assets import HASH_ATTRIBUTE, AssetCopyReport, copy_assets, referenced_assets
+from section_to_course.compat import contentstore, static_content_class
+from section_to_course.utils import paste_from_template
+
+
+class TestCopyAssets(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of copying the assets a section refers to.
+    """
+
+    def setUp(self):
+        """
+        Set up a section referring to an asset.
+        """
+        super().setUp()
+        self.source_course = CourseFactory()
+        self.destination_course = CourseFactory()
+        self.chapter = BlockFactory(parent=self.source_course, category='chapter')
+        sequential = BlockFactory(parent=self.chapter, category='sequential')
+        vertical = BlockFactory(parent=sequential, category='vertical')
+        course_key = self.source_course.id
+        own_course = f'{course_key.org}+{course_key.course}+{course_key.run}'
+        BlockFactory(
+            parent=vertical, category='html', data=(
+                '<img src="/static/diagram%20one.png"><a href="/static/gone.pdf">'
+                f'<img src="/asset-v1:{own_course}+type@asset+block@chart.png">'
+                '<img src="/asset-v1:Other+Course+Run+type@asset+block@elsewhere.png">'
+                '<script src="https://cdn.example.com/static/library.js"></script>'
+            ),
+        )
+        self.save_asset(self.source_course.id, 'diagram one.png', b'picture')
+
+    def save_asset(self, course_key, name, data):
+        """
+        Save an asset to a course.
+        """
+        static_content = static_content_class()
+        contentstore().save(static_content(
+            static_content.compute_location(course_key, name), name, 'image/png', data,
+        ))
+
+    def test_referenced_assets(self):
+        """
+        Test that asset references are found throughout a section.
+
+        Assets referred to with ``/asset-v1:`` URLs are still served from their course, so they're left alone.
+        """
+        chapter = self.store.get_item(self.chapter.location, depth=None)
+        assert referenced_assets(chapter) == {'diagram one.png', 'gone.pdf'}
+
+    def test_skips_identical_assets(self):
+        """
+        Test that assets are only copied when the destination doesn't have an identical copy.
+        """
+        names = {'diagram one.png', 'gone.pdf'}
+        keys = {'source_course_key': self.source_course.id, 'destination_course_key': self.destination_course.id}
+        report = copy_assets(names, **keys)
+        assert (report.copied, report.skipped, report.missing, report.bytes_copied) == (1, 0, 1, 7)
+        destination_location = static_content_class().compute_location(self.destination_course.id, 'diagram one.png')
+        assert contentstore().find(destination_location).data == b'picture'
+        # Hashes are only stored on the destination.
+        source_location = static_content_class().compute_location(self.source_course.id, 'diagram one.png')
+        assert HASH_ATTRIBUTE not in contentstore().get_attrs(source_location)
+        assert HASH_ATTRIBUTE in contentstore().get_attrs(destination_location)
+        report = copy_assets(names, **keys)
+        assert (report.copied, report.skipped, report.bytes_saved) == (0, 1, 7)
+        self.save_asset(self.source_course.id, 'diagram one.png', b'new picture')
+        report = copy_assets(names, **keys)
+        assert (report.copied, report.skipped) == (1, 0)
+        assert contentstore().find(destination_location).data == b'new picture'
+
+    def test_reads_source_once(self):
+        """
+        Test that a source asset which is hashed to copy it is only read once.
+        """
+        store = contentstore()
+        with mock.patch.object(store, 'find', wraps=store.find) as find, \
+                mock.patch('section_to_course.assets.contentstore', return_value=store):
+            report = copy_assets(
+                {'diagram one.png'},
+                source_course_key=self.source_course.id,
+                destination_course_key=self.destination_course.id,
+            )
+        assert report.copied == 1
+        source_location = static_content_class().compute_location(self.source_course.id, 'diagram one.png')
+        assert [call.args[0] for call in find.call_args_list] == [source_location]
+
+    def test_paste_reports_assets(self):
+        """
+        Test that copying a section copies its assets, and skips them when it is refreshed.
+        """
+        user = UserFactory()
+        for expected in [(1, 0), (0, 1)]:
+            report = AssetCopyReport()
+            paste_from_template(
+                source_block_usage_key=self.chapter.location,
+                destination_course_key=self.destination_course.id,
+                user=user,
+                asset_report=report,
+            )
+            assert (report.copied, report.skipped) == expected
@@ -0,0 +1,180 @@
+"""
+Budgets for the SQL queries and upstream calls made by each entry point of section_to_course.
+
+These guard against N+1 regressions, like fetching a course outline for every row of a listing or scanning
+the modulestore on every keystroke. Calls to upstream services are counted by wrapping the stores compat
+returns in profiling.counting.
+If a change legitimately needs more, raise the budget in the same change, and say why.
+"""
+from common.djangoapps.student.tests.factories import UserFactory  # pylint: disable=import-error
+from django.urls import reverse
+from opaque_keys.edx.locator import CourseLocator
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase  # pylint: disable=import-error
+
+from section_to_course.compat import update_outline_from_modulestore
+from section_to_course.models import SectionToCourseLink
+from section_to_course.profiling import Profile
+from section_to_course.search import course_index
+from section_to_course.utils import paste_from_template, refresh_links
+
+try:
+    from xmodule.modulestore.tests.factories import BlockFactory, CourseFactory
+except ImportError:
+    from xmodule.modulestore.tests.factories import CourseFactory
+    from xmodule.modulestore.tests.factories import ItemFactory as BlockFactory
+
+# Loading the session and the user.
+REQUEST_QUERIES = 2
+# Looking up, copying and publishing a section.
+PASTE_MODULESTORE_CALLS = 8
+# Saving the link with update_or_create, inside a savepoint, then replacing its block map.
+PASTE_QUERIES = 6
+
+
+def upstream_calls(profile, prefix):
+    """
+    Get the total number of calls to an upstream service in a profile.
+    """
+    return sum(count for name, count in profile.calls.items() if name.startswith(f'{prefix}.'))
+
+
+class TestBudgets(ModuleStoreTestCase):
+    """
+    Tests that each entry point stays within its budget.
+    """
+
+    def setUp(self):
+        """
+        Log in as staff.
+        """
+        super().setUp()
+        self.staff = UserFactory.create(is_staff=True, is_superuser=True)
+        self.client.login(username=self.staff.username, password='test')
+
+    def profile_get(self, url, data=None):
+        """
+        Make a GET request, returning the profile of it.
+        """
+        with Profile('budget') as profile:
+            response = self.client.get(url, data)
+        assert response.status_code == 200
+        return profile
+
+    def course_with_sections(self, count):
+        """
+        Create a course with a number of sections, and an outline.
+        """
+        course = CourseFactory.create()
+        for _ in range(count):
+            BlockFactory.create(parent=course, category='chapter')
+        update_outline_from_modulestore(course.id)
+        return course
+
+    def test_course_autocomplete(self):
+        """
+        Test that course autocomplete doesn't touch the modulestore once its index is built.
+        """
+        for _ in range(3):
+            CourseFactory.create()
+        course_index().rebuild()
+        url = reverse('section_to_course:course_autocomplete')
+        profile = self.profile_get(url, {'term': 'a'})
+        # Building the index reads course summaries rather than whole courses.
+        assert profile.calls['modulestore.get_course_summaries'] == 1
+        assert 'modulestore.get_courses' not in profile.calls
+        profile = self.profile_get(url, {'term': 'ab'})
+        assert upstream_calls(profile, 'modulestore') == 0
+        assert profile.queries <= REQUEST_QUERIES
+
+    def test_section_autocomplete(self):
+        """
+        Test that section autocomplete fetches the outline once, however many sections there are, and then caches it.
+        """
+        profiles = []
+        for count in (2, 20):
+            course = self.course_with_sections(count)
+            url = reverse('section_to_course:section_autocomplete', kwargs={'course_id': course.id})
+            first_profile = self.profile_get(url)
+            assert first_profile.calls['outline.get_course_outline'] == 1
+            profiles.append(self.profile_get(url, {'term': 'a'}))
+        for profile in profiles:
+            assert 'outline.get_course_outline' not in profile.calls
+            assert upstream_calls(profile, 'modulestore') <= 1
+        assert profiles[0].queries == profiles[1].queries
+
+    def test_section_autocomplete_without_outline(self):
+        """
+        Test that section autocomplete reads only the top of the course when the course has no outline yet.
+        """
+        course = CourseFactory.create()
+        for _ in range(3):
+            BlockFactory.create(parent=course, category='chapter')
+        url = reverse('section_to_course:section_autocomplete', kwargs={'course_id': course.id})
+        profile = self.profile_get(url)
+        assert profile.calls['outline.get_course_outline'] == 1
+        assert profile.calls['modulestore.get_course'] == 1
+        assert upstream_calls(profile, 'modulestore') <= 2
+
+    def test_changelist(self):
+        """
+        Test that the link changelist makes the same queries for a page of ten links as for a page of a hundred.
+        """
+        profiles = []
+        for count in (10, 100):
+            SectionToCourseLink.objects.all().delete()
+            SectionToCourseLink.objects.bulk_create([
+                SectionToCourseLink(
+                    source_course_id=CourseLocator('edX', 'Source', 'Run'),
+                    destination_course_id=CourseLocator('edX', f'Destination{number}', 'Run'),
+                    source_section_id=CourseLocator('edX', 'Source', 'Run').make_usage_key('chapter', str(number)),
+                    destination_section_id=CourseLocator('edX', f'Destination{number}', 'Run').make_usage_key(
+                        'chapter', 'copy',
+                    ),
+                )
+                for number in range(count)
+            ])
+            profiles.append(self.profile_get(reverse('admin:section_to_course_sectiontocourselink_changelist')))
+        for profile in profiles:
+            assert profile.calls['outline.get_course_titles'] == 1
+            assert 'outline.get_course_outline' not in profile.calls
+            assert upstream_calls(profile, 'modulestore') == 0
+        assert profiles[0].queries == profiles[1].queries
+
+    def test_paste_from_template(self):
+        """
+        Test the cost of copying one section.
+        """
+        source_course = CourseFactory.create()
+        section = BlockFactory.create(parent=source_course, category='chapter')
+        destination_course = CourseFactory.create()
+        for _ in range(2):
+            with Profile('budget') as profile:
+                paste_from_template(
+                    source_block_usage_key=section.location,
+                    destination_course_key=destination_course.id,
+                    user=self.staff,
+                )
+            assert upstream_calls(profile, 'modulestore') <= PASTE_MODULESTORE_CALLS
+            assert profile.queries <= PASTE_QUERIES
+
+    def test_refresh_links(self):
+        """
+        Test that refreshing more links costs a bounded amount of upstream calls per link, and no more queries.
+        """
+        source_course = CourseFactory.create()
+        links = [
+            paste_from_template(
+                source_block_usage_key=BlockFactory.create(parent=source_course, category='chapter').location,
+                destination_course_key=CourseFactory.create().id,
+                user=self.staff,
+            )
+            for _ in range(4)
+        ]
+        profiles = []
+        for count in (2, 4):
+            with Profile('budget') as profile:
+                assert len(refresh_links(links[:count], user=self.staff)) == count
+            profiles.append(profile)
+        calls = [upstream_calls(profile, 'modulestore') for profile in profiles]
+        assert calls[1] - calls[0] <= 2 * PASTE_MODULESTORE_CALLS
+        assert profiles[0].queries == profiles[1].queries
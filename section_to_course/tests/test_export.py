@@ -0,0 +1,78 @@
+"""
+Tests for exporting section to course links.
+"""
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase  # pylint: disable=import-error
+
+from section_to_course.export import EXPORT_FIELDS, link_rows, render_csv, render_jsonl
+from section_to_course.models import SectionToCourseLink
+from section_to_course.profiling import Profile
+from section_to_course.tests.factories import SectionToCourseLinkFactory
+
+
+class TestExport(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the link export.
+    """
+
+    def setUp(self):
+        """
+        Set up a few links.
+        """
+        super().setUp()
+        self.links = sorted(
+            (SectionToCourseLinkFactory.create() for _ in range(3)),
+            key=lambda link: (str(link.source_course_id), link.id),
+        )
+
+    def test_link_rows(self):
+        """
+        Test that every link is exported with its titles, however it is chunked.
+        """
+        for chunk_size in [1, 2, 100]:
+            rows = list(link_rows(chunk_size=chunk_size))
+            assert [row['id'] for row in rows] == [link.id for link in self.links]
+            for row in rows:
+                assert tuple(row) == EXPORT_FIELDS
+                assert row['source_course_title']
+                assert row['source_section_title']
+                assert row['destination_section_title']
+
+    def test_course_titles_per_chunk(self):
+        """
+        Test that the course titles of each chunk are looked up together.
+        """
+        with Profile('export') as profile:
+            list(link_rows(chunk_size=2))
+        assert profile.calls['outline.get_course_titles'] == 2
+
+    def test_missing_titles(self):
+        """
+        Test that links whose sections no longer exist are still exported, without titles.
+        """
+        link = self.links[0]
+        self.store.delete_item(link.source_section_id, self.user.id)
+        rows = list(link_rows(SectionToCourseLink.objects.filter(id=link.id)))
+        assert rows[0]['source_section_title'] == ''
+
+    def test_render(self):
+        """
+        Test that rows are rendered one line each.
+        """
+        rows = list(link_rows())
+        csv_lines = list(render_csv(rows))
+        assert len(csv_lines) == 4
+        assert csv_lines[0] == ','.join(EXPORT_FIELDS) + '\r\n'
+        assert [json.loads(line) for line in render_jsonl(rows)] == rows
+
+    def test_command(self):
+        """
+        Test that the command writes the export to standard output.
+        """
+        stdout = StringIO()
+        call_command('export_section_to_course_links', '--format', 'jsonl', '--chunk-size', '2', stdout=stdout)
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        assert [row['id'] for row in rows] == [link.id for link in self.links]
@@ -0,0 +1,142 @@
+"""
+Tests for refreshing chains of section to course links in dependency order.
+"""
+from common.djangoapps.student.tests.factories import UserFactory  # pylint: disable=import-error
+from django.test import TestCase, override_settings
+from opaque_keys.edx.locator import CourseLocator
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase  # pylint: disable=import-error
+
+from section_to_course.graph import LinkCycleError, downstream_links, refresh_cascade, refresh_generations
+from section_to_course.locks import destination_lock
+from section_to_course.models import SectionToCourseLink
+from section_to_course.utils import paste_from_template
+
+try:
+    from xmodule.modulestore.tests.factories import BlockFactory, CourseFactory
+except ImportError:
+    from xmodule.modulestore.tests.factories import CourseFactory
+    from xmodule.modulestore.tests.factories import ItemFactory as BlockFactory
+
+
+def make_link(source, destination, section='one'):
+    """
+    Create a link between two courses, named by their course numbers.
+    """
+    source_course_key = CourseLocator('edX', source, 'Run')
+    destination_course_key = CourseLocator('edX', destination, 'Run')
+    return SectionToCourseLink.objects.create(
+        source_course_id=source_course_key,
+        destination_course_id=destination_course_key,
+        source_section_id=source_course_key.make_usage_key('chapter', section),
+        destination_section_id=destination_course_key.make_usage_key('chapter', section),
+    )
+
+
+class TestGraph(TestCase):  # pylint: disable=no-self-use
+    """
+    Tests of building and ordering the link dependency graph.
+    """
+
+    def test_generations(self):
+        """
+        Test that links are ordered after everything they depend on.
+        """
+        root_to_a = make_link('Root', 'A')
+        root_to_b = make_link('Root', 'B')
+        a_to_c = make_link('A', 'C')
+        b_to_c = make_link('B', 'C', section='two')
+        c_to_d = make_link('C', 'D')
+        unrelated = make_link('Other', 'E')
+        links = downstream_links([root_to_a, root_to_b])
+        assert unrelated not in links
+        generations = refresh_generations(links)
+        assert [set(generation) for generation in generations] == [
+            {root_to_a, root_to_b}, {a_to_c, b_to_c}, {c_to_d},
+        ]
+        assert refresh_generations(downstream_links([a_to_c])) == [[a_to_c], [c_to_d]]
+
+    def test_cycle(self):
+        """
+        Test that links depending on each other in a cycle are reported.
+        """
+        links = [make_link('A', 'B'), make_link('B', 'A'), make_link('A', 'A', section='two')]
+        with self.assertRaises(LinkCycleError):
+            refresh_generations(downstream_links(links[:1]))
+        assert refresh_generations(links[2:]) == [links[2:]]
+
+
+class TestRefreshCascade(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of refreshing a chain of links.
+    """
+
+    def test_refresh_cascade(self):
+        """
+        Test that changes to a root source reach the end of the chain in one refresh.
+        """
+        user = UserFactory()
+        root_course, middle_course, last_course = CourseFactory(), CourseFactory(), CourseFactory()
+        section = BlockFactory(parent=root_course, category='chapter', display_name='Original')
+        first_link = paste_from_template(
+            source_block_usage_key=section.location, destination_course_key=middle_course.id, user=user,
+        )
+        second_link = paste_from_template(
+            source_block_usage_key=first_link.destination_section_id, destination_course_key=last_course.id, user=user,
+        )
+        section.display_name = 'Changed'
+        self.store.update_item(section, user.id)
+        self.store.publish(section.location, user.id)
+        result = refresh_cascade([first_link], user=user, max_workers=1)
+        assert set(result.refreshed) == {first_link, second_link}
+        assert result.skipped == []
+        assert self.store.get_item(second_link.destination_section_id).display_name == 'Changed'
+
+    def make_tree(self, user):
+        """
+        Create a section copied to two courses, each of which is copied on again, and return the links.
+
+        The links are returned by the course numbers of their destinations, which are B and C for the first
+        copies and D and E for the copies of those.
+        """
+        root_course = CourseFactory()
+        section = BlockFactory(parent=root_course, category='chapter', display_name='Original')
+        links = {}
+        for middle, last in (('B', 'D'), ('C', 'E')):
+            middle_course, last_course = CourseFactory(number=middle), CourseFactory(number=last)
+            links[middle] = paste_from_template(
+                source_block_usage_key=section.location, destination_course_key=middle_course.id, user=user,
+            )
+            links[last] = paste_from_template(
+                source_block_usage_key=links[middle].destination_section_id,
+                destination_course_key=last_course.id,
+                user=user,
+            )
+        section.display_name = 'Changed'
+        self.store.update_item(section, user.id)
+        self.store.publish(section.location, user.id)
+        return links
+
+    def test_refresh_cascade_in_parallel(self):
+        """
+        Test that branches of a cascade refreshed by several workers each reach the end of their chain.
+        """
+        user = UserFactory()
+        links = self.make_tree(user)
+        result = refresh_cascade([links['B'], links['C']], user=user, max_workers=2)
+        assert set(result.refreshed) == set(links.values())
+        for link in links.values():
+            assert self.store.get_item(link.destination_section_id).display_name == 'Changed'
+
+    @override_settings(SECTION_TO_COURSE_LOCK_WAIT=0)
+    def test_skips_downstream_of_skipped(self):
+        """
+        Test that links built from a course which couldn't be refreshed are skipped instead of copying stale content.
+        """
+        user = UserFactory()
+        links = self.make_tree(user)
+        with destination_lock(links['B'].destination_course_id):
+            result = refresh_cascade([links['B'], links['C']], user=user, max_workers=2)
+        assert set(result.refreshed) == {links['C'], links['E']}
+        assert set(result.skipped) == {links['B'], links['D']}
+        assert self.store.get_item(links['D'].destination_section_id).display_name == 'Original'
+        assert self.store.get_item(links['E'].destination_section_id).display_name == 'Changed'
@@ -0,0 +1,73 @@
+"""
+Tests for the cached sets of linked keys.
+"""
+from django.core.cache import cache
+from django.test import TestCase
+from opaque_keys.edx.keys import CourseKey
+
+from section_to_course.linked_keys import linked_destination_courses, linked_source_sections
+from section_to_course.models import SectionToCourseLink
+from section_to_course.utils import SectionToCourseLinkBatch
+
+
+class TestLinkedKeys(TestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the linked key sets.
+    """
+
+    def setUp(self):
+        """
+        Start from an empty cache.
+        """
+        super().setUp()
+        cache.clear()
+        self.source_course_key = CourseKey.from_string('course-v1:edX+Source+2023')
+        self.section_key = self.source_course_key.make_usage_key('chapter', 'one')
+
+    def create_link(self, destination):
+        """
+        Create a link from the test section to a destination course.
+        """
+        return SectionToCourseLink.objects.create(
+            source_course_id=self.source_course_key,
+            destination_course_id=CourseKey.from_string(destination),
+            source_section_id=self.section_key,
+            destination_section_id=CourseKey.from_string(destination).make_usage_key('chapter', 'one'),
+        )
+
+    def test_sets_follow_changes(self):
+        """
+        Test that the sets are reused until links are added or removed.
+        """
+        assert linked_destination_courses() == frozenset()
+        link = self.create_link('course-v1:edX+First+2023')
+        assert linked_destination_courses() == {'course-v1:edX+First+2023'}
+        assert linked_source_sections() == {str(self.section_key)}
+        with self.assertNumQueries(0):
+            linked_destination_courses()
+        with SectionToCourseLinkBatch() as batch:
+            batch.add(
+                source_block_usage_key=self.section_key,
+                destination_course_key=CourseKey.from_string('course-v1:edX+Second+2023'),
+                destination_section_id=self.section_key,
+            )
+        assert linked_destination_courses() == {'course-v1:edX+First+2023', 'course-v1:edX+Second+2023'}
+        link.delete()
+        assert linked_destination_courses() == {'course-v1:edX+Second+2023'}
+
+    def test_lost_cache(self):
+        """
+        Test that the sets are reloaded if the shared version is lost.
+        """
+        linked_destination_courses()
+        SectionToCourseLink.objects.bulk_create([
+            SectionToCourseLink(
+                source_course_id=self.source_course_key,
+                destination_course_id=CourseKey.from_string('course-v1:edX+Quiet+2023'),
+                source_section_id=self.section_key,
+                destination_section_id=self.section_key,
+            ),
+        ])
+        assert linked_destination_courses() == frozenset()
+        cache.clear()
+        assert linked_destination_courses() == {'course-v1:edX+Quiet+2023'}
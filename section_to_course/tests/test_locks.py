@@ -0,0 +1,103 @@
+"""
+Tests for the destination course locks of section_to_course.
+"""
+import threading
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from section_to_course import locks
+from section_to_course.locks import DESTINATION_LOCK_KEY, RefreshInProgress, destination_lock
+
+COURSE_KEY = 'course-v1:edX+DemoX+Demo_Course'
+
+
+class TestDestinationLock(TestCase):
+    """
+    Tests of the destination_lock context manager.
+    """
+
+    def setUp(self):
+        """
+        Make sure no lock is left over from other tests.
+        """
+        super().setUp()
+        cache.delete(DESTINATION_LOCK_KEY.format(COURSE_KEY))
+
+    def test_releases(self):
+        """
+        Test that the lock is released afterwards, even on errors.
+        """
+        with self.assertRaises(ValueError):
+            with destination_lock(COURSE_KEY):
+                assert cache.get(DESTINATION_LOCK_KEY.format(COURSE_KEY)) is not None
+                raise ValueError
+        assert cache.get(DESTINATION_LOCK_KEY.format(COURSE_KEY)) is None
+        with destination_lock(COURSE_KEY):
+            pass
+
+    def test_reentrant(self):
+        """
+        Test that the thread holding the lock can take it again.
+        """
+        with destination_lock(COURSE_KEY):
+            with destination_lock(COURSE_KEY):
+                pass
+            assert cache.get(DESTINATION_LOCK_KEY.format(COURSE_KEY)) is not None
+
+    def test_rejects_other_threads(self):
+        """
+        Test that other threads can't take the lock while it's held.
+        """
+        errors = []
+
+        def refresh():
+            try:
+                with destination_lock(COURSE_KEY, wait=0):
+                    pass
+            except RefreshInProgress as err:
+                errors.append(err)
+
+        with destination_lock(COURSE_KEY):
+            thread = threading.Thread(target=refresh)
+            thread.start()
+            thread.join()
+        assert len(errors) == 1
+        with destination_lock('course-v1:edX+Other+Course'):
+            thread = threading.Thread(target=refresh)
+            thread.start()
+            thread.join()
+        assert len(errors) == 1
+        assert not locks._local_locks  # pylint: disable=protected-access
+
+    def test_waits_for_release(self):
+        """
+        Test that other threads wait for the lock to be released, rather than giving up straight away.
+        """
+        order = []
+        holding = threading.Event()
+
+        def refresh():
+            holding.wait()
+            with destination_lock(COURSE_KEY, wait=5):
+                order.append('waited')
+
+        thread = threading.Thread(target=refresh)
+        thread.start()
+        with destination_lock(COURSE_KEY):
+            holding.set()
+            # Give the other thread time to start waiting.
+            thread.join(0.2)
+            order.append('held')
+        thread.join()
+        assert order == ['held', 'waited']
+
+    def test_rejects_other_processes(self):
+        """
+        Test that the lock can't be taken while another process holds it in the cache.
+        """
+        cache.set(DESTINATION_LOCK_KEY.format(COURSE_KEY), 'other-process')
+        with self.assertRaises(RefreshInProgress):
+            with destination_lock(COURSE_KEY, wait=0):
+                pass
+        assert cache.get(DESTINATION_LOCK_KEY.format(COURSE_KEY)) == 'other-process'
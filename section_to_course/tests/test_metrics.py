@@ -0,0 +1,105 @@
+"""
+Tests for the metrics counted in the cache.
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from section_to_course.metrics import (
+    count_cache,
+    count_failures,
+    flush_batch,
+    increment,
+    observe,
+    render_metrics,
+    start_batch,
+)
+
+
+class TestMetrics(TestCase):
+    """
+    Tests of recording and rendering metrics.
+    """
+
+    def setUp(self):
+        """
+        Start from an empty cache.
+        """
+        super().setUp()
+        cache.clear()
+
+    def test_counters(self):
+        """
+        Test that counters add up, and that every series is rendered even before it's counted.
+        """
+        increment('section_to_course_blocks_copied_total', 5)
+        increment('section_to_course_blocks_copied_total', 3)
+        count_cache('linked_keys', True)
+        count_cache('linked_keys', True)
+        count_cache('linked_keys', False)
+        lines = render_metrics().splitlines()
+        assert '# TYPE section_to_course_blocks_copied_total counter' in lines
+        assert 'section_to_course_blocks_copied_total 8' in lines
+        assert 'section_to_course_cache_requests_total{cache="linked_keys",result="hit"} 2' in lines
+        assert 'section_to_course_cache_requests_total{cache="linked_keys",result="miss"} 1' in lines
+        assert 'section_to_course_cache_requests_total{cache="course_index",result="hit"} 0' in lines
+
+    def test_histograms(self):
+        """
+        Test that histogram buckets are rendered cumulatively, along with their sum and count.
+        """
+        observe('section_to_course_autocomplete_seconds', 0.02, autocomplete='course')
+        observe('section_to_course_autocomplete_seconds', 0.3, autocomplete='course')
+        observe('section_to_course_autocomplete_seconds', 60, autocomplete='course')
+        lines = render_metrics().splitlines()
+        assert 'section_to_course_autocomplete_seconds_bucket{autocomplete="course",le="0.01"} 0' in lines
+        assert 'section_to_course_autocomplete_seconds_bucket{autocomplete="course",le="0.025"} 1' in lines
+        assert 'section_to_course_autocomplete_seconds_bucket{autocomplete="course",le="0.5"} 2' in lines
+        assert 'section_to_course_autocomplete_seconds_bucket{autocomplete="course",le="10"} 2' in lines
+        assert 'section_to_course_autocomplete_seconds_bucket{autocomplete="course",le="+Inf"} 3' in lines
+        assert 'section_to_course_autocomplete_seconds_sum{autocomplete="course"} 60.32' in lines
+        assert 'section_to_course_autocomplete_seconds_count{autocomplete="course"} 3' in lines
+        assert 'section_to_course_autocomplete_seconds_count{autocomplete="section"} 0' in lines
+
+    def test_count_failures(self):
+        """
+        Test that errors are counted as failed refreshes, except for the kinds which are counted elsewhere.
+        """
+        with self.assertRaises(KeyError):
+            with count_failures(unless=KeyError):
+                raise KeyError('skipped')
+        with self.assertRaises(ValueError):
+            with count_failures(unless=KeyError):
+                raise ValueError('failed')
+        assert 'section_to_course_refresh_failures_total{reason="error"} 1' in render_metrics().splitlines()
+
+    def test_batch(self):
+        """
+        Test that metrics recorded during a batch are held back, then written with one call.
+        """
+        start_batch()
+        try:
+            increment('section_to_course_blocks_copied_total', 5)
+            observe('section_to_course_autocomplete_seconds', 0.02, autocomplete='course')
+            count_cache('linked_keys', True)
+            assert 'section_to_course_blocks_copied_total 0' in render_metrics().splitlines()
+        finally:
+            with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+                flush_batch()
+        set_many.assert_called_once()
+        lines = render_metrics().splitlines()
+        assert 'section_to_course_blocks_copied_total 5' in lines
+        assert 'section_to_course_autocomplete_seconds_count{autocomplete="course"} 1' in lines
+        assert 'section_to_course_cache_requests_total{cache="linked_keys",result="hit"} 1' in lines
+        # Once the batch is written, metrics are written as they're recorded again.
+        increment('section_to_course_blocks_copied_total', 1)
+        assert 'section_to_course_blocks_copied_total 6' in render_metrics().splitlines()
+
+    @override_settings(SECTION_TO_COURSE_METRICS=False)
+    def test_disabled(self):
+        """
+        Test that nothing is counted when metrics are turned off.
+        """
+        increment('section_to_course_blocks_copied_total', 5)
+        assert 'section_to_course_blocks_copied_total 0' in render_metrics().splitlines()
@@ -2,7 +2,8 @@
 """
 Tests for the `section-to-course` models module.
 """
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
 
 from section_to_course.models import SectionToCourseLink
 
@@ -21,3 +22,14 @@ class TestSectionToCourseLink(TestCase):  # pylint: disable=no-self-use
         )
         assert str(link) == '<SectionToCourseLink #1, edX+DemoX+Demo_Course to ' \
                             'OpenCraft+Tutorials+Basic_Questions for basic_questions>'
+
+    def test_for_reads(self):
+        """Test that read-only queries only go to a replica which is configured and exists."""
+        assert SectionToCourseLink.objects.for_reads().db == 'default'
+        with override_settings(
+            SECTION_TO_COURSE_READ_DATABASE='replica',
+            DATABASES={**settings.DATABASES, 'replica': settings.DATABASES['default']},
+        ):
+            assert SectionToCourseLink.objects.for_reads().db == 'replica'
+        with override_settings(SECTION_TO_COURSE_READ_DATABASE='missing'):
+            assert SectionToCourseLink.objects.for_reads().db == 'default'
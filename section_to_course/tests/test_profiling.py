@@ -0,0 +1,44 @@
+"""
+Tests for the opt-in profiling of section_to_course.
+"""
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, override_settings
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase  # pylint: disable=import-error
+
+from section_to_course.compat import modulestore
+from section_to_course.profiling import Profile, counting, get_profile, profiling_requested
+
+
+class TestProfile(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of profiling code.
+    """
+
+    def test_profile(self):
+        """
+        Test that queries and modulestore calls are counted and the results stored.
+        """
+        with Profile('test') as profile:
+            list(get_user_model().objects.all())
+            store = counting(modulestore(), 'modulestore')
+            store.get_courses()
+            store.get_courses()
+        store.get_courses()
+        result = get_profile(profile.profile_id)
+        assert result['label'] == 'test'
+        assert result['queries'] == 1
+        assert result['calls']['modulestore.get_courses'] == 2
+        assert 'get_courses' in result['stats']
+
+    def test_profiling_requested(self):
+        """
+        Test that only staff can profile requests, and only when profiling is enabled.
+        """
+        request = RequestFactory().get('/', {'_profile': ''})
+        request.user = self.user
+        request.user.is_staff = False
+        with override_settings(SECTION_TO_COURSE_PROFILING=True):
+            assert not profiling_requested(request)
+            request.user.is_staff = True
+            assert profiling_requested(request)
+        assert not profiling_requested(request)
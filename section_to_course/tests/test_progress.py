@@ -0,0 +1,73 @@
+"""
+Tests for progress reporting in section_to_course.
+"""
+from django.test import TestCase
+
+from section_to_course.progress import (
+    COPYING,
+    DONE,
+    LOADING,
+    CacheProgressReporter,
+    ProgressTracker,
+    get_job_progress,
+    render_progress_bar,
+)
+
+
+class TestProgressTracker(TestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the ProgressTracker class.
+    """
+
+    def test_reports_events(self):
+        """
+        Test that events are sent to the callback, with their fraction spread across links.
+        """
+        events = []
+        tracker = ProgressTracker(events.append, link_count=2)
+        tracker.start_link(0, 'block-v1:edX+DemoX+Demo_Course+type@chapter+block@intro')
+        tracker.report(LOADING)
+        tracker.report(COPYING, blocks_copied=5, blocks_total=10)
+        tracker.report(DONE)
+        tracker.start_link(1, 'block-v1:edX+DemoX+Demo_Course+type@chapter+block@outro')
+        tracker.report(DONE)
+        assert [event.phase for event in events] == [LOADING, COPYING, DONE, DONE]
+        assert events[0].fraction == 0
+        assert events[0].eta is None
+        assert round(events[1].fraction, 3) == 0.225
+        assert events[1].eta is not None
+        assert events[2].fraction == 0.5
+        assert events[3].fraction == 1
+        assert events[3].blocks_total is None
+
+    def test_render(self):
+        """
+        Test that progress bars are rendered.
+        """
+        event = ProgressTracker(link_count=2).report(COPYING, blocks_copied=5, blocks_total=10)
+        assert render_progress_bar(event, width=10).startswith('[##--------]  23% copying, link 1/2, 5/10 blocks')
+
+
+class TestCacheProgressReporter(TestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the CacheProgressReporter class.
+    """
+
+    def test_stores_latest_event(self):
+        """
+        Test that the latest event for a job is stored.
+        """
+        tracker = ProgressTracker(CacheProgressReporter('job-1'))
+        tracker.report(LOADING)
+        tracker.report(DONE)
+        progress = get_job_progress('job-1')
+        assert progress['phase'] == DONE
+        assert progress['fraction'] == 1
+        assert get_job_progress('job-2') is None
+
+    def test_ignores_bad_job_ids(self):
+        """
+        Test that job IDs which can't be used in cache keys are ignored.
+        """
+        ProgressTracker(CacheProgressReporter('bad job/id')).report(DONE)
+        assert get_job_progress('bad job/id') is None
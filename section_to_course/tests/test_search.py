@@ -0,0 +1,169 @@
+"""
+Tests for the trigram search indexes of section_to_course.
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase  # pylint: disable=import-error
+from xmodule.modulestore.tests.factories import CourseFactory  # pylint: disable=import-error
+
+from section_to_course.search import COURSE_INDEX_JOURNAL_KEY, COURSE_INDEX_SEQUENCE_KEY, CourseIndex, TrigramIndex
+
+
+class TestTrigramIndex(TestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the TrigramIndex class.
+    """
+
+    def setUp(self):
+        """
+        Set up an index with a few documents.
+        """
+        super().setUp()
+        self.index = TrigramIndex()
+        self.index.add('course-v1:edX+CS101+2023', 'Intro to Python', 'python')
+        self.index.add('course-v1:edX+JS101+2023', 'JavaScript Basics', 'javascript')
+        self.index.add('course-v1:OpenCraft+PY201+2023', 'Python Data Structures', 'structures')
+
+    def test_blank(self):
+        """
+        Test that a blank term returns every document in insertion order.
+        """
+        assert self.index.search('') == ['python', 'javascript', 'structures']
+        assert self.index.search('   ') == ['python', 'javascript', 'structures']
+
+    def test_substring(self):
+        """
+        Test that substrings of titles are found, ranking titles that start with the term first.
+        """
+        assert self.index.search('python') == ['structures', 'python']
+        assert self.index.search('ytho') == ['python', 'structures']
+        assert self.index.search('to py') == ['python']
+
+    def test_short_terms_match_word_starts(self):
+        """
+        Test that terms too short for trigrams only match the start of words.
+        """
+        assert self.index.search('b') == ['javascript']
+        assert self.index.search('y') == []
+
+    def test_key_prefix(self):
+        """
+        Test that keys are matched by prefix, case-insensitively.
+        """
+        assert self.index.search('course-v1:edx') == ['python', 'javascript']
+
+    def test_key_parts(self):
+        """
+        Test that the parts of keys are matched by substring, like titles are.
+        """
+        assert self.index.search('CS101') == ['python']
+        assert self.index.search('edX+CS') == ['python']
+        assert self.index.search('101') == ['python', 'javascript']
+        assert self.index.search('opencraft') == ['structures']
+        section = 'block-v1:edX+CS101+2023+type@chapter@a1b2c3'
+        self.index.add(section, 'Loops', 'loops')
+        assert self.index.search('a1b2') == ['loops']
+        assert self.index.search('chapter') == []
+
+    def test_typos(self):
+        """
+        Test that near misses are found when nothing matches exactly.
+        """
+        assert self.index.search('javscript') == ['javascript']
+        assert self.index.search('pyhton') == ['python', 'structures']
+        assert self.index.search('zzzzzz') == []
+
+    def test_limit(self):
+        """
+        Test that results can be limited.
+        """
+        assert self.index.search('', limit=2) == ['python', 'javascript']
+
+    def test_replace_and_discard(self):
+        """
+        Test that documents can be replaced and removed.
+        """
+        self.index.add('course-v1:edX+CS101+2023', 'Advanced Rust', 'rust')
+        assert self.index.search('python') == ['structures']
+        assert self.index.search('rust') == ['rust']
+        self.index.discard('course-v1:edX+CS101+2023')
+        self.index.discard('course-v1:edX+CS101+2023')
+        assert self.index.search('rust') == []
+        assert len(self.index) == 2
+
+
+class TestCourseIndex(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the CourseIndex class.
+    """
+
+    def test_replays_changes(self):
+        """
+        Test that changes recorded by one process are picked up by the index of another.
+        """
+        course = CourseFactory(display_name='Demo Course')
+        index = CourseIndex()
+        other_index = CourseIndex()
+        assert index.search('demo') == [{'id': str(course.id), 'text': f'Demo Course ({course.id})'}]
+        assert other_index.search('demo') == [{'id': str(course.id), 'text': f'Demo Course ({course.id})'}]
+        new_course = CourseFactory(display_name='Demonstration Course')
+        # Not yet recorded.
+        assert len(index.search('demo')) == 1
+        CourseIndex.record_change(new_course.id)
+        assert len(index.search('demo')) == 2
+        assert len(other_index.search('demo')) == 2
+
+    def test_waits_for_journal_entry(self):
+        """
+        Test that changes after one which is still being recorded wait for it, rather than rebuilding the index.
+        """
+        CourseFactory(display_name='Demo Course')
+        index = CourseIndex()
+        assert len(index.search('demo')) == 1
+        # Another process has numbered its change, but not written it yet.
+        pending = cache.incr(COURSE_INDEX_SEQUENCE_KEY)
+        new_course = CourseFactory(display_name='Demonstration Course')
+        CourseIndex.record_change(new_course.id)
+        with mock.patch.object(index, 'rebuild') as rebuild:
+            assert len(index.search('demo')) == 1
+        rebuild.assert_not_called()
+        cache.set(COURSE_INDEX_JOURNAL_KEY.format(pending), str(new_course.id))
+        with mock.patch.object(index, 'rebuild') as rebuild:
+            assert len(index.search('demo')) == 2
+        rebuild.assert_not_called()
+
+    def test_rebuilds_for_lost_journal_entry(self):
+        """
+        Test that the index is rebuilt once a journal entry has been missing for too long.
+        """
+        CourseFactory(display_name='Demo Course')
+        index = CourseIndex()
+        assert len(index.search('demo')) == 1
+        cache.incr(COURSE_INDEX_SEQUENCE_KEY)
+        CourseFactory(display_name='Demonstration Course')
+        with mock.patch('section_to_course.search.COURSE_INDEX_JOURNAL_GRACE', -1):
+            assert len(index.search('demo')) == 1
+            assert len(index.search('demo')) == 2
+
+    def test_org_partitions(self):
+        """
+        Test that searches can be scoped to an organization, and that partitions are evicted when unused.
+        """
+        ours = CourseFactory(org='Ours', display_name='Demo Course')
+        CourseFactory(org='Theirs', display_name='Demo Course')
+        CourseFactory(org='Others', display_name='Demo Course')
+        index = CourseIndex()
+        assert index.search('demo', org='Ours') == [{'id': str(ours.id), 'text': f'Demo Course ({ours.id})'}]
+        assert index.index is None
+        with override_settings(SECTION_TO_COURSE_COURSE_INDEX_PARTITIONS=2):
+            assert len(index.search('demo', org='Theirs')) == 1
+            assert len(index.search('demo', org='Ours')) == 1
+            assert len(index.search('demo', org='Others')) == 1
+        assert list(index.partitions) == ['Ours', 'Others']
+        assert len(index.search('demo')) == 3
+        newer = CourseFactory(org='Ours', display_name='Demonstration Course')
+        CourseIndex.record_change(newer.id)
+        assert len(index.search('demo', org='Ours')) == 2
+        assert len(index.search('demo')) == 4
@@ -0,0 +1,121 @@
+"""
+Tests for the automatic refresh of section to course links.
+"""
+from unittest import mock
+
+from common.djangoapps.student.tests.factories import UserFactory  # pylint: disable=import-error
+from django.core.cache import cache
+from django.test import override_settings
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase  # pylint: disable=import-error
+
+from section_to_course.locks import destination_lock
+from section_to_course.metrics import render_metrics
+from section_to_course.models import SectionToCourseLink
+from section_to_course.signals import schedule_auto_refreshes
+from section_to_course.tasks import AUTO_REFRESH_SCHEDULED_KEY, auto_refresh_link, schedule_auto_refresh
+from section_to_course.utils import paste_from_template
+
+try:
+    from xmodule.modulestore.tests.factories import BlockFactory, CourseFactory
+except ImportError:
+    from xmodule.modulestore.tests.factories import CourseFactory
+    from xmodule.modulestore.tests.factories import ItemFactory as BlockFactory
+
+
+class TestAutoRefresh(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of automatic refreshes.
+    """
+
+    def setUp(self):
+        """
+        Set up a link with automatic refresh turned on.
+        """
+        super().setUp()
+        cache.clear()
+        self.refresh_user = UserFactory()
+        self.section = BlockFactory(parent=CourseFactory(), category='chapter', display_name='Original')
+        self.link = paste_from_template(
+            source_block_usage_key=self.section.location,
+            destination_course_key=CourseFactory().id,
+            user=self.refresh_user,
+        )
+        SectionToCourseLink.objects.filter(id=self.link.id).update(auto_refresh=True)
+
+    def test_publishes_are_debounced(self):
+        """
+        Test that a burst of publishes only queues one refresh task.
+        """
+        with mock.patch.object(auto_refresh_link, 'apply_async') as apply_async:
+            for _ in range(3):
+                schedule_auto_refreshes(sender=None, course_key=self.link.source_course_id)
+        apply_async.assert_called_once_with(args=[self.link.id], countdown=60 * 5)
+        assert 'section_to_course_auto_refreshes_queued 1' in render_metrics().splitlines()
+
+    def test_own_publishes_are_ignored(self):
+        """
+        Test that publishes made by a refresh don't schedule automatic refreshes.
+        """
+        with mock.patch.object(auto_refresh_link, 'apply_async') as apply_async:
+            with destination_lock(self.link.source_course_id):
+                schedule_auto_refreshes(sender=None, course_key=self.link.source_course_id)
+        apply_async.assert_not_called()
+
+    def test_refresh(self):
+        """
+        Test that the task refreshes the link as the configured user once it's due.
+        """
+        self.section.display_name = 'Changed'
+        self.store.update_item(self.section, self.refresh_user.id)
+        self.store.publish(self.section.location, self.refresh_user.id)
+        with mock.patch.object(auto_refresh_link, 'apply_async'):
+            schedule_auto_refresh([self.link.id])
+        auto_refresh_link.apply(args=[self.link.id])
+        # Without a user to refresh as, nothing happens.
+        assert self.store.get_item(self.link.destination_section_id).display_name == 'Original'
+        assert cache.get(AUTO_REFRESH_SCHEDULED_KEY.format(self.link.id)) is None
+        assert 'section_to_course_auto_refreshes_queued 0' in render_metrics().splitlines()
+        with override_settings(SECTION_TO_COURSE_AUTO_REFRESH_USERNAME=self.refresh_user.username):
+            auto_refresh_link.apply(args=[self.link.id])
+        assert self.store.get_item(self.link.destination_section_id).display_name == 'Changed'
+
+    def test_requeue_renews_flag(self):
+        """
+        Test that a task which isn't due yet queues itself again and keeps the link marked as scheduled.
+        """
+        with mock.patch.object(auto_refresh_link, 'apply_async') as apply_async:
+            schedule_auto_refresh([self.link.id])
+            cache.delete(AUTO_REFRESH_SCHEDULED_KEY.format(self.link.id))
+            auto_refresh_link(self.link.id)
+        assert apply_async.call_count == 2
+        assert cache.get(AUTO_REFRESH_SCHEDULED_KEY.format(self.link.id))
+
+    def test_publish_during_refresh(self):
+        """
+        Test that a publish while a refresh runs queues another refresh once it finishes.
+        """
+        def publish_during(links, **kwargs):  # pylint: disable=unused-argument
+            """
+            Publish the source course again while refreshing.
+            """
+            schedule_auto_refresh([self.link.id])
+            return links
+
+        with mock.patch.object(auto_refresh_link, 'apply_async') as apply_async:
+            schedule_auto_refresh([self.link.id])
+            with override_settings(SECTION_TO_COURSE_AUTO_REFRESH_USERNAME=self.refresh_user.username), \
+                    mock.patch('section_to_course.tasks.refresh_links', side_effect=publish_during):
+                auto_refresh_link.apply(args=[self.link.id])
+        assert apply_async.call_count == 2
+        assert cache.get(AUTO_REFRESH_SCHEDULED_KEY.format(self.link.id))
+
+    def test_flag_cleared_on_error(self):
+        """
+        Test that the link is no longer marked as scheduled once its refresh fails.
+        """
+        with mock.patch.object(auto_refresh_link, 'apply_async'):
+            schedule_auto_refresh([self.link.id])
+        with override_settings(SECTION_TO_COURSE_AUTO_REFRESH_USERNAME=self.refresh_user.username), \
+                mock.patch('section_to_course.tasks.refresh_links', side_effect=ValueError('Refresh failed')):
+            auto_refresh_link.apply(args=[self.link.id], throw=False)
+        assert cache.get(AUTO_REFRESH_SCHEDULED_KEY.format(self.link.id)) is None
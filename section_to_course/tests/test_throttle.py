@@ -0,0 +1,137 @@
+"""
+Tests for admission control of refreshes.
+"""
+import time
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from opaque_keys.edx.keys import CourseKey
+
+from section_to_course.throttle import (
+    BUCKET_KEY,
+    SLOT_KEY,
+    RefreshThrottled,
+    _waiting,
+    admit_blocks,
+    org_scope,
+    refresh_slot,
+    refreshes_waiting,
+    throttle_state,
+)
+
+
+class TestThrottle(TestCase):
+    """
+    Tests of the refresh throttles.
+    """
+
+    def setUp(self):
+        """
+        Start from an empty cache.
+        """
+        super().setUp()
+        cache.clear()
+        self.course_key = CourseKey.from_string('course-v1:edX+Destination+2023')
+
+    def test_unlimited(self):
+        """
+        Test that nothing is throttled unless limits are set.
+        """
+        with refresh_slot(self.course_key):
+            admit_blocks(self.course_key, 10000)
+        assert throttle_state() == []
+
+    @override_settings(SECTION_TO_COURSE_MAX_REFRESHES=2, SECTION_TO_COURSE_MAX_REFRESHES_PER_ORG=1)
+    def test_slots(self):
+        """
+        Test that refreshes hold turns while they run, and that nested refreshes reuse them.
+        """
+        with refresh_slot(self.course_key):
+            with refresh_slot(self.course_key):
+                assert [row['refreshes'] for row in throttle_state()] == [1, 1]
+        assert [row['refreshes'] for row in throttle_state()] == [0, 0]
+
+    @override_settings(SECTION_TO_COURSE_MAX_REFRESHES_PER_ORG=1, SECTION_TO_COURSE_THROTTLE_WAIT=0)
+    def test_slots_exhausted(self):
+        """
+        Test that refreshes give up once they've waited too long for a turn, without taking any others.
+        """
+        cache.set(SLOT_KEY.format(org_scope('edX'), 0), 'elsewhere')
+        with pytest.raises(RefreshThrottled):
+            with refresh_slot(self.course_key):
+                pass  # pragma: no cover
+        # Other organizations have their own turns.
+        with refresh_slot(CourseKey.from_string('course-v1:OpenCraft+Destination+2023')):
+            pass
+        assert cache.get(SLOT_KEY.format(org_scope('edX'), 0)) == 'elsewhere'
+
+    @override_settings(SECTION_TO_COURSE_BLOCKS_PER_SECOND=10)
+    @patch('section_to_course.throttle.time.sleep')
+    def test_blocks_per_second(self, mock_sleep):
+        """
+        Test that writes wait once more than a second's worth of blocks have been written.
+        """
+        admit_blocks(self.course_key, 10)
+        mock_sleep.assert_not_called()
+        admit_blocks(self.course_key, 20)
+        assert mock_sleep.call_args[0][0] == pytest.approx(2, abs=0.1)
+        assert throttle_state()[0]['blocks_waiting'] == pytest.approx(20, abs=1)
+
+    @override_settings(SECTION_TO_COURSE_BLOCKS_PER_SECOND_PER_ORG=10, SECTION_TO_COURSE_THROTTLE_WAIT=1)
+    @patch('section_to_course.throttle.time.sleep')
+    def test_blocks_per_second_too_slow(self, mock_sleep):
+        """
+        Test that writes which would wait too long give up without using up the rate.
+        """
+        with pytest.raises(RefreshThrottled):
+            admit_blocks(self.course_key, 100)
+        admit_blocks(self.course_key, 10)
+        mock_sleep.assert_not_called()
+        assert throttle_state()[1]['org'] == 'edX'
+
+    @override_settings(
+        SECTION_TO_COURSE_BLOCKS_PER_SECOND=10,
+        SECTION_TO_COURSE_BLOCKS_PER_SECOND_PER_ORG=1000,
+        SECTION_TO_COURSE_THROTTLE_WAIT=1,
+    )
+    @patch('section_to_course.throttle.time.sleep')
+    def test_blocks_per_second_all_or_nothing(self, _mock_sleep):
+        """
+        Test that writes which would wait too long under one throttle don't draw from the others either.
+        """
+        admit_blocks(self.course_key, 10)
+        org_full_at = cache.get(BUCKET_KEY.format(org_scope('edX')))
+        with pytest.raises(RefreshThrottled):
+            admit_blocks(self.course_key, 100)
+        assert cache.get(BUCKET_KEY.format(org_scope('edX'))) == org_full_at
+
+    @override_settings(SECTION_TO_COURSE_BLOCKS_PER_SECOND=10)
+    @patch('section_to_course.throttle.time.sleep')
+    def test_shorter_wait(self, mock_sleep):
+        """
+        Test that callers can give up sooner than SECTION_TO_COURSE_THROTTLE_WAIT.
+        """
+        admit_blocks(self.course_key, 30)
+        with pytest.raises(RefreshThrottled):
+            admit_blocks(self.course_key, 10, wait=1)
+        mock_sleep.assert_called_once()
+
+    @override_settings(SECTION_TO_COURSE_BLOCKS_PER_SECOND=10)
+    def test_refreshes_waiting(self):
+        """
+        Test that refreshes are counted as waiting only while they wait, and only until they should have given up.
+        """
+        admit_blocks(self.course_key, 10)
+        waiting = []
+        with patch('section_to_course.throttle.time.sleep', side_effect=lambda _: waiting.append(refreshes_waiting())):
+            admit_blocks(self.course_key, 10)
+        assert waiting == [1]
+        assert refreshes_waiting() == 0
+        # A refresh which died while waiting stops being counted once it would have given up.
+        with patch('section_to_course.throttle.time.time', return_value=time.time() - 60):
+            dead = _waiting(30)
+            dead.__enter__()  # pylint: disable=unnecessary-dunder-call
+            assert refreshes_waiting() == 1
+        assert refreshes_waiting() == 0
@@ -1,12 +1,19 @@
 """
 Tests utility functions for section_to_course.
 """
+import threading
+from unittest import mock
+
 from common.djangoapps.student.tests.factories import UserFactory  # pylint: disable=import-error
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from freezegun import freeze_time
+from opaque_keys.edx.keys import CourseKey, UsageKey
+from organizations.tests.factories import OrganizationFactory
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase  # pylint: disable=import-error
 
-from section_to_course.compat import modulestore
+from section_to_course.compat import course_published_signal, modulestore, not_found_exception
 
 try:
     from xmodule.modulestore.tests.factories import BlockFactory, CourseFactory
@@ -15,8 +22,19 @@ except ImportError:
     from xmodule.modulestore.tests.factories import CourseFactory
     from xmodule.modulestore.tests.factories import ItemFactory as BlockFactory
 
-from section_to_course.models import SectionToCourseLink
-from section_to_course.utils import paste_from_template
+from section_to_course.locks import RefreshInProgress, destination_lock
+from section_to_course.models import SectionToCourseBlockMap, SectionToCourseLink
+from section_to_course.progress import COPYING, DONE, LOADING, PUBLISHING, SAVING
+from section_to_course.throttle import SLOT_KEY, RefreshThrottled, org_scope
+from section_to_course.utils import (
+    SectionToCourseLinkBatch,
+    _paste_loaded_section,
+    create_course_from_section,
+    paste_from_template,
+    paste_sections,
+    refresh_links,
+    validate_new_courses,
+)
 
 # TODO: Add CI capability. We need to rope in the platform to perform these tests.
 
@@ -60,3 +78,373 @@ class TestPasteFromTemplate(ModuleStoreTestCase):  # pylint: disable=no-self-use
         assert item.published_on == timezone.now()
         assert item.published_by == user.id
         assert SectionToCourseLink.objects.count() == 1
+
+    def test_block_map(self):
+        """
+        Test that a map of where each block of the section was copied to is kept, and replaced on refresh.
+        """
+        source_course = CourseFactory()
+        source_chapter = BlockFactory(parent=source_course, category='chapter', display_name='Source Chapter')
+        sequential = BlockFactory(parent=source_chapter, category='sequential')
+        vertical = BlockFactory(parent=sequential, category='vertical')
+        user = UserFactory()
+        link = paste_from_template(
+            destination_course_key=CourseFactory().id,
+            source_block_usage_key=source_chapter.location,
+            user=user,
+        )
+        store = modulestore()
+        block_maps = {block_map.source_block_id: block_map for block_map in link.block_maps.all()}
+        assert set(block_maps) == {source_chapter.location, sequential.location, vertical.location}
+        assert block_maps[source_chapter.location].destination_block_id == link.destination_section_id
+        destination_sequential = store.get_item(block_maps[sequential.location].destination_block_id)
+        assert destination_sequential.parent == link.destination_section_id
+        assert destination_sequential.children == [block_maps[vertical.location].destination_block_id]
+        assert all(block_map.source_version for block_map in block_maps.values())
+        new_vertical = BlockFactory(parent=sequential, category='vertical')
+        paste_from_template(
+            destination_course_key=link.destination_course_id,
+            source_block_usage_key=source_chapter.location,
+            user=user,
+        )
+        assert SectionToCourseBlockMap.objects.filter(link=link).count() == 4
+        destinations = SectionToCourseBlockMap.objects.destinations(link, [sequential.location, new_vertical.location])
+        assert destinations[sequential.location] == destination_sequential.location
+        assert store.get_item(destinations[new_vertical.location]).parent == destination_sequential.location
+
+    def test_reports_progress(self):
+        """
+        Test that progress is reported for each phase of the copy.
+        """
+        source_course = CourseFactory()
+        destination_course = CourseFactory()
+        source_chapter = BlockFactory(parent=source_course, category='chapter', display_name='Source Chapter')
+        sequential = BlockFactory(parent=source_chapter, category='sequential')
+        BlockFactory(parent=sequential, category='vertical')
+        events = []
+        paste_from_template(
+            destination_course_key=destination_course.id,
+            source_block_usage_key=source_chapter.location,
+            user=UserFactory(),
+            progress=events.append,
+        )
+        assert [event.phase for event in events] == [LOADING, COPYING, COPYING, COPYING, PUBLISHING, SAVING, DONE]
+        assert [event.blocks_copied for event in events if event.phase == COPYING] == [0, 1, 3]
+        assert events[-1].blocks_total == 3
+        assert events[-1].blocks_copied == 3
+        assert events[-1].source_section_id == source_chapter.location
+
+
+class TestCreateCourseFromSection(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the create_course_from_section function.
+    """
+
+    def test_create_course_from_section(self):
+        """
+        Test that a course is created with the section in it, without loading either twice.
+        """
+        org = OrganizationFactory()
+        section = BlockFactory(parent=CourseFactory(), category='chapter', display_name='Only Section')
+        with mock.patch('section_to_course.utils.paste_from_template', wraps=paste_from_template) as paste:
+            link = create_course_from_section(
+                source_block_usage_key=section.location,
+                user=UserFactory(is_staff=True),
+                org=org.short_name,
+                number='NEW101',
+                run='2023',
+                display_name='New Course',
+            )
+        # The course and section are handed over rather than loaded again.
+        assert paste.call_args.kwargs['destination_course'].id == link.destination_course_id
+        assert paste.call_args.kwargs['source_block'].location == section.location
+        assert link.destination_course_id == CourseKey.from_string(f'course-v1:{org.short_name}+NEW101+2023')
+        assert modulestore().get_item(link.destination_section_id).display_name == 'Only Section'
+        assert SectionToCourseLink.objects.get().pk == link.pk
+
+    @override_settings(SECTION_TO_COURSE_MAX_REFRESHES_PER_ORG=1)
+    def test_throttled(self):
+        """
+        Test that no course is created when there's no turn to copy the section into it.
+        """
+        org = OrganizationFactory()
+        section = BlockFactory(parent=CourseFactory(), category='chapter')
+        cache.set(SLOT_KEY.format(org_scope(org.short_name), 0), 'elsewhere')
+        with self.assertRaises(RefreshThrottled):
+            create_course_from_section(
+                source_block_usage_key=section.location,
+                user=UserFactory(is_staff=True),
+                org=org.short_name,
+                number='NEW101',
+                run='2023',
+                display_name='New Course',
+                throttle_wait=0,
+            )
+        assert not modulestore().has_course(CourseKey.from_string(f'course-v1:{org.short_name}+NEW101+2023'))
+        assert not SectionToCourseLink.objects.exists()
+
+
+class TestPasteSections(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the paste_sections function.
+    """
+
+    def test_paste_sections(self):
+        """
+        Test that sections from several courses are copied in order, published once, and linked together.
+        """
+        user = UserFactory()
+        destination_course = CourseFactory()
+        sections = [
+            BlockFactory(parent=CourseFactory(), category='chapter', display_name=f'Section {number}')
+            for number in range(3)
+        ]
+        with mock.patch.object(course_published_signal(), 'send_robust') as send_robust:
+            links = paste_sections(
+                source_block_usage_keys=[section.location for section in sections],
+                destination_course_key=destination_course.id,
+                user=user,
+            )
+        assert send_robust.call_count == 1
+        store = modulestore()
+        course = store.get_course(destination_course.id)
+        assert [store.get_item(child).display_name for child in course.children] == [
+            'Section 0', 'Section 1', 'Section 2',
+        ]
+        assert [link.source_section_id for link in links] == [section.location for section in sections]
+        assert all(link.pk for link in links)
+        for link in links:
+            assert not store.has_changes(store.get_item(link.destination_section_id))
+
+    def test_paste_sections_missing(self):
+        """
+        Test that nothing is copied or linked if one of the sections can't be found.
+        """
+        user = UserFactory()
+        destination_course = CourseFactory()
+        source_course = CourseFactory()
+        section = BlockFactory(parent=source_course, category='chapter', display_name='Copied')
+        with self.assertRaises(not_found_exception()):
+            paste_sections(
+                source_block_usage_keys=[section.location, source_course.id.make_usage_key('chapter', 'missing')],
+                destination_course_key=destination_course.id,
+                user=user,
+            )
+        assert not SectionToCourseLink.objects.exists()
+        store = modulestore()
+        course = store.get_course(destination_course.id)
+        assert not course.children
+        assert not store.has_changes(course)
+
+    def test_paste_sections_failure(self):
+        """
+        Test that the sections copied before one fails to copy are still linked and published.
+        """
+        user = UserFactory()
+        destination_course = CourseFactory()
+        source_course = CourseFactory()
+        sections = [
+            BlockFactory(parent=source_course, category='chapter', display_name=f'Section {number}')
+            for number in range(2)
+        ]
+        calls = []
+
+        def paste_once(*args, **kwargs):
+            """
+            Copy the first section, and fail to copy any others.
+            """
+            calls.append(args)
+            if len(calls) > 1:
+                raise ValueError('Copy failed')
+            return _paste_loaded_section(*args, **kwargs)
+
+        with mock.patch('section_to_course.utils._paste_loaded_section', side_effect=paste_once):
+            with self.assertRaises(ValueError):
+                paste_sections(
+                    source_block_usage_keys=[section.location for section in sections],
+                    destination_course_key=destination_course.id,
+                    user=user,
+                )
+        link = SectionToCourseLink.objects.get()
+        assert link.source_section_id == sections[0].location
+        store = modulestore()
+        assert not store.has_changes(store.get_item(link.destination_section_id))
+
+
+class TestRefreshLinks(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the refresh_links function.
+    """
+
+    def test_refresh_links(self):
+        """
+        Test that several links are refreshed, with progress reported across all of them.
+        """
+        source_course = CourseFactory()
+        user = UserFactory()
+        links = [
+            paste_from_template(
+                destination_course_key=CourseFactory().id,
+                source_block_usage_key=BlockFactory(parent=source_course, category='chapter').location,
+                user=user,
+            )
+            for _ in range(2)
+        ]
+        events = []
+        assert refresh_links(SectionToCourseLink.objects.all(), user=user, progress=events.append) == links
+        done = [event for event in events if event.phase == DONE]
+        assert [(event.link_index, event.link_count, event.fraction) for event in done] == [(0, 2, 0.5), (1, 2, 1)]
+
+    def test_publishes_each_destination_once(self):
+        """
+        Test that links sharing a destination are published together.
+        """
+        source_course = CourseFactory()
+        destination_course = CourseFactory()
+        user = UserFactory()
+        links = [
+            paste_from_template(
+                destination_course_key=destination_course.id,
+                source_block_usage_key=BlockFactory(parent=source_course, category='chapter').location,
+                user=user,
+            )
+            for _ in range(3)
+        ]
+        with mock.patch.object(course_published_signal(), 'send_robust') as send_robust:
+            assert refresh_links(links, user=user) == links
+        assert send_robust.call_count == 1
+        store = modulestore()
+        for link in links:
+            assert not store.has_changes(store.get_item(link.destination_section_id))
+        assert refresh_links(links, user=user, defer_publish=False) == links
+        for link in links:
+            assert not store.has_changes(store.get_item(link.destination_section_id))
+
+    def test_locked_destinations(self):
+        """
+        Test that refreshes wait for other refreshes of their destination, and skip it if they take too long.
+        """
+        source_course = CourseFactory()
+        user = UserFactory()
+        links = [
+            paste_from_template(
+                destination_course_key=CourseFactory().id,
+                source_block_usage_key=BlockFactory(parent=source_course, category='chapter').location,
+                user=user,
+            )
+            for _ in range(2)
+        ]
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with destination_lock(links[0].destination_course_id):
+                locked.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        locked.wait()
+        try:
+            with override_settings(SECTION_TO_COURSE_LOCK_WAIT=0):
+                assert refresh_links(links, user=user) == [links[1]]
+                with self.assertRaises(RefreshInProgress):
+                    paste_from_template(
+                        destination_course_key=links[0].destination_course_id,
+                        source_block_usage_key=links[0].source_section_id,
+                        user=user,
+                    )
+            threading.Timer(0.2, release.set).start()
+            assert refresh_links(links, user=user) == links
+        finally:
+            release.set()
+            thread.join()
+
+
+class TestValidateNewCourses(ModuleStoreTestCase):  # pylint: disable=no-self-use
+    """
+    Tests of the validate_new_courses function.
+    """
+
+    def test_verdicts(self):
+        """
+        Test that each row gets a verdict listing its problems.
+        """
+        org = OrganizationFactory()
+        source_course = CourseFactory()
+        CourseFactory(org=org.short_name, number='TAKEN', run='2023')
+        linked = paste_from_template(
+            destination_course_key=CourseFactory().id,
+            source_block_usage_key=BlockFactory(parent=source_course, category='chapter').location,
+            user=UserFactory(),
+        )
+        section = BlockFactory(parent=source_course, category='chapter')
+        rows = [
+            {'org': org.short_name, 'number': 'NEW', 'run': '2023', 'source_section_id': str(section.location)},
+            {'org': org.short_name, 'number': 'taken', 'run': '2023', 'source_section_id': str(section.location)},
+            {'org': 'bogus', 'number': 'NEW', 'run': '', 'source_section_id': 'bogus'},
+            {
+                'org': org.short_name, 'number': 'OTHER', 'run': '2023',
+                'source_section_id': str(linked.source_section_id),
+            },
+        ]
+        verdicts = validate_new_courses(rows)
+        assert verdicts[0] == {'valid': True, 'course_id': f'course-v1:{org.short_name}+NEW+2023', 'errors': []}
+        assert verdicts[1]['errors'] == [
+            'A course with this number, org, and run already exists. Please choose different values.',
+            'An earlier row would make this section into a course.',
+        ]
+        assert verdicts[2]['errors'] == [
+            'The course run must be a non-empty slug.',
+            'bogus is not a known organization.',
+            'The source section ID is not a valid usage key.',
+        ]
+        assert verdicts[3]['errors'] == ['This section has already been made into a course.']
+        assert not any(verdict['valid'] for verdict in verdicts[1:])
+
+
+class TestSectionToCourseLinkBatch(TestCase):
+    """
+    Tests of the SectionToCourseLinkBatch class.
+    """
+
+    def add_link(self, batch, number, section='new'):
+        """
+        Add a link for the numbered destination course to a batch.
+        """
+        return batch.add(
+            source_block_usage_key=UsageKey.from_string(f'block-v1:edX+DemoX+1+type@chapter+block@s{number}'),
+            destination_course_key=CourseKey.from_string(f'course-v1:edX+Mini{number}+1'),
+            destination_section_id=UsageKey.from_string(f'block-v1:edX+Mini{number}+1+type@chapter+block@{section}'),
+        )
+
+    def test_flush(self):
+        """
+        Test that links are created or updated together when the batch is flushed.
+        """
+        with SectionToCourseLinkBatch() as batch:
+            existing = self.add_link(batch, 0, section='old')
+        assert existing.pk is not None
+        # A lookup, an update, an insert and a lookup of the new primary keys, plus the savepoint.
+        with self.assertNumQueries(6):
+            with SectionToCourseLinkBatch() as batch:
+                links = [self.add_link(batch, number) for number in range(3)]
+        assert links[0].pk == existing.pk
+        assert all(link.pk is not None for link in links)
+        assert SectionToCourseLink.objects.count() == 3
+        assert {str(link.destination_section_id) for link in SectionToCourseLink.objects.all()} == {
+            f'block-v1:edX+Mini{number}+1+type@chapter+block@new' for number in range(3)
+        }
+
+    def test_batch_size(self):
+        """
+        Test that the batch is flushed whenever it fills up.
+        """
+        batch = SectionToCourseLinkBatch(batch_size=2)
+        self.add_link(batch, 0)
+        assert SectionToCourseLink.objects.count() == 0
+        self.add_link(batch, 1)
+        assert SectionToCourseLink.objects.count() == 2
+        self.add_link(batch, 2)
+        batch.flush()
+        assert SectionToCourseLink.objects.count() == 3
@@ -0,0 +1,118 @@
+"""
+Tests for warming section_to_course's caches.
+"""
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.test import TestCase, override_settings
+from opaque_keys.edx.keys import CourseKey
+
+from section_to_course.lookups import ORGANIZATION_OPTIONS_CACHE_KEY
+from section_to_course.models import SectionToCourseLink
+from section_to_course.signals import WARM_UP_DISPATCH_UID, warm_up_on_first_request
+from section_to_course.warmup import WARMERS, recent_source_courses, start_warm_up, warm_sections
+
+
+class TestWarmUp(TestCase):
+    """
+    Tests of the cache warmers.
+    """
+
+    def setUp(self):
+        """
+        Start from an empty cache.
+        """
+        super().setUp()
+        cache.clear()
+
+    def create_link(self, source, section='one'):
+        """
+        Create a link from a section of a source course.
+        """
+        source_course_key = CourseKey.from_string(source)
+        destination_course_key = CourseKey.from_string(f'{source}_copy')
+        return SectionToCourseLink.objects.create(
+            source_course_id=source_course_key,
+            destination_course_id=destination_course_key,
+            source_section_id=source_course_key.make_usage_key('chapter', section),
+            destination_section_id=destination_course_key.make_usage_key('chapter', section),
+        )
+
+    def test_recent_source_courses(self):
+        """
+        Test that source courses are listed once each, most recently used first.
+        """
+        first = self.create_link('course-v1:edX+First+2023')
+        self.create_link('course-v1:edX+Second+2023')
+        self.create_link('course-v1:edX+First+2023', section='two')
+        first.save()
+        assert [str(key) for key in recent_source_courses(10)] == [
+            'course-v1:edX+First+2023', 'course-v1:edX+Second+2023',
+        ]
+        assert len(recent_source_courses(1)) == 1
+
+    @override_settings(SECTION_TO_COURSE_WARM_UP_SECTIONS=1)
+    @patch('section_to_course.warmup.get_course_sections')
+    def test_warm_sections(self, mock_get_course_sections):
+        """
+        Test that only the sections of the most recently used source courses are loaded.
+        """
+        self.create_link('course-v1:edX+First+2023')
+        self.create_link('course-v1:edX+Second+2023')
+        warm_sections()
+        mock_get_course_sections.assert_called_once_with(CourseKey.from_string('course-v1:edX+Second+2023'))
+
+    def test_command(self):
+        """
+        Test that the command warms each cache and reports how long it took.
+        """
+        # The warmers which need the modulestore are replaced, in the table, since it holds the functions themselves.
+        warmers = tuple(
+            (name, Mock() if name in ('course index', 'sections') else warmer) for name, warmer in WARMERS
+        )
+        stdout = StringIO()
+        with patch('section_to_course.warmup.WARMERS', warmers):
+            call_command('warm_section_to_course_caches', stdout=stdout)
+        output = stdout.getvalue()
+        for name, _warmer in WARMERS:
+            assert f'Warmed {name} in ' in output
+        assert cache.get(ORGANIZATION_OPTIONS_CACHE_KEY) is not None
+
+    def test_command_one_cache(self):
+        """
+        Test that the command can warm only the caches asked for.
+        """
+        stdout = StringIO()
+        call_command('warm_section_to_course_caches', '--cache', 'organization options', stdout=stdout)
+        assert stdout.getvalue().count('Warmed ') == 2
+        assert cache.get(ORGANIZATION_OPTIONS_CACHE_KEY) is not None
+
+    def test_start_warm_up_off_by_default(self):
+        """
+        Test that processes don't warm caches as they start unless asked to.
+        """
+        assert start_warm_up() is None
+
+    @override_settings(SECTION_TO_COURSE_WARM_UP_ON_START=True)
+    @patch('section_to_course.warmup.warm_caches', return_value=iter([('course index', 0.5)]))
+    def test_start_warm_up(self, mock_warm_caches):
+        """
+        Test that warming up in the background runs every warmer.
+        """
+        thread = start_warm_up()
+        thread.join()
+        mock_warm_caches.assert_called_once_with()
+
+    @override_settings(SECTION_TO_COURSE_WARM_UP_ON_START=True)
+    @patch('section_to_course.signals.start_warm_up')
+    def test_warm_up_on_first_request(self, mock_start_warm_up):
+        """
+        Test that a process starts warming up on its first request, and only then.
+        """
+        request_started.connect(warm_up_on_first_request, dispatch_uid=WARM_UP_DISPATCH_UID)
+        request_started.send(sender=None)
+        request_started.send(sender=None)
+        mock_start_warm_up.assert_called_once_with()
@@ -0,0 +1,294 @@
+"""
+Admission control for refreshes, so that many at once don't swamp the modulestore.
+
+Copying sections writes a lot to the modulestore, and enough refreshes at once slow Studio down for course
+authors. Before starting, a refresh takes a turn, which limits how many run at once. It also draws the
+blocks it's about to write from a token bucket, which limits how fast blocks are written. Both limits apply
+to every refresh together, and separately to each organization of the destination courses. Work which
+can't go ahead waits its turn rather than piling onto the store, and gives up with RefreshThrottled if it
+would wait for longer than SECTION_TO_COURSE_THROTTLE_WAIT seconds, or whatever shorter wait its caller
+allows. Blocks are admitted before a turn is taken, so that refreshes waiting on the write rates don't hold
+turns others could use.
+
+Like the destination locks, turns and buckets are kept in the cache so that they apply across processes.
+Limits which aren't set aren't applied.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from section_to_course.locks import RefreshInProgress, lock_timeout
+from section_to_course.metrics import increment
+
+log = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = 'global'
+SLOT_KEY = 'section_to_course.throttle.slot.{}.{}'
+BUCKET_KEY = 'section_to_course.throttle.bucket.{}'
+BUCKET_GUARD_KEY = 'section_to_course.throttle.bucket_guard.{}'
+WAITING_KEY = 'section_to_course.throttle.waiting'
+ORGS_KEY = 'section_to_course.throttle.orgs'
+# Seconds between checks for a free turn.
+POLL_INTERVAL = 0.5
+# How long to try for exclusive use of a bucket before updating it anyway. Racing updates only make the
+# bucket a little inaccurate.
+BUCKET_GUARD_WAIT = 1
+
+_held = threading.local()
+
+
+class RefreshThrottled(RefreshInProgress):
+    """
+    Raised when a refresh would wait too long for its turn to write to the modulestore.
+    """
+
+
+def org_scope(org):
+    """
+    Get the name of the throttles for refreshes into an organization's courses.
+    """
+    return f'org.{org}'
+
+
+def max_wait():
+    """
+    Get the most seconds a refresh waits for its turn before giving up.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_THROTTLE_WAIT', 60 * 5)
+
+
+def admin_wait():
+    """
+    Get the most seconds a refresh started from the admin waits for its turn, while the user waits on the page.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_ADMIN_THROTTLE_WAIT', 5)
+
+
+def concurrency_limits(org):
+    """
+    Get the scopes limiting how many refreshes into an organization's courses run at once, with their limits.
+    """
+    limits = (
+        (org_scope(org), getattr(settings, 'SECTION_TO_COURSE_MAX_REFRESHES_PER_ORG', None)),
+        (GLOBAL_SCOPE, getattr(settings, 'SECTION_TO_COURSE_MAX_REFRESHES', None)),
+    )
+    return [(scope, limit) for scope, limit in limits if limit]
+
+
+def rate_limits(org):
+    """
+    Get the scopes limiting how fast blocks are written into an organization's courses, with their limits.
+
+    Limits are in blocks per second.
+    """
+    limits = (
+        (org_scope(org), getattr(settings, 'SECTION_TO_COURSE_BLOCKS_PER_SECOND_PER_ORG', None)),
+        (GLOBAL_SCOPE, getattr(settings, 'SECTION_TO_COURSE_BLOCKS_PER_SECOND', None)),
+    )
+    return [(scope, limit) for scope, limit in limits if limit]
+
+
+def _note_org(org):
+    """
+    Remember that an organization has been throttled, so that the admin can show its state.
+    """
+    orgs = cache.get(ORGS_KEY) or frozenset()
+    if org not in orgs:
+        cache.set(ORGS_KEY, orgs | {org}, timeout=lock_timeout())
+
+
+def _take_slot(scope, limit, token):
+    """
+    Take one of a scope's turns if one is free, returning its cache key, or None if they're all taken.
+    """
+    for number in range(limit):
+        key = SLOT_KEY.format(scope, number)
+        # Turns expire like locks do, in case the refresh holding one dies.
+        if cache.add(key, token, timeout=lock_timeout()):
+            return key
+    return None
+
+
+@contextmanager
+def refresh_slot(destination_course_key, wait=None):
+    """
+    Wait for a turn to refresh a destination course, and hold it until the refresh is done.
+
+    A thread which already holds a turn carries on with it, so that refreshes nested in larger operations
+    don't wait on themselves. Raises RefreshThrottled if no turn comes up within wait seconds, which
+    defaults to SECTION_TO_COURSE_THROTTLE_WAIT.
+    """
+    scopes = concurrency_limits(destination_course_key.org)
+    if getattr(_held, 'active', False) or not scopes:
+        yield
+        return
+    _note_org(destination_course_key.org)
+    token = uuid4().hex
+    taken = []
+    wait = max_wait() if wait is None else wait
+    deadline = time.monotonic() + wait
+    try:
+        with _waiting(wait):
+            # Turns are always taken in the same order, so waiting refreshes can't deadlock each other.
+            for scope, limit in scopes:
+                key = _take_slot(scope, limit, token)
+                while key is None:
+                    if time.monotonic() >= deadline:
+                        increment('section_to_course_refresh_failures_total', reason='throttled')
+                        raise RefreshThrottled(f'Timed out waiting for a turn to refresh {destination_course_key}.')
+                    time.sleep(POLL_INTERVAL)
+                    key = _take_slot(scope, limit, token)
+                taken.append(key)
+        _held.active = True
+        try:
+            yield
+        finally:
+            _held.active = False
+    finally:
+        for key in taken:
+            if cache.get(key) == token:
+                cache.delete(key)
+
+
+def _update_waiting(change):
+    """
+    Change the record of waiting refreshes, which maps a token for each to the time it gives up waiting by.
+
+    Refreshes which should have given up by now are dropped, so ones which died while waiting are forgotten.
+    """
+    with _bucket_guard(WAITING_KEY):
+        now = time.time()
+        waiting = change({token: until for token, until in (cache.get(WAITING_KEY) or {}).items() if until > now})
+        cache.set(WAITING_KEY, waiting, timeout=int(max(waiting.values(), default=now) - now) + 60)
+
+
+@contextmanager
+def _waiting(wait):
+    """
+    Record this refresh as waiting for its turn while the code within this runs, for at most wait seconds.
+    """
+    token = uuid4().hex
+    until = time.time() + wait
+    _update_waiting(lambda waiting: {**waiting, token: until})
+    try:
+        yield
+    finally:
+        _update_waiting(lambda waiting: {key: value for key, value in waiting.items() if key != token})
+
+
+def refreshes_waiting():
+    """
+    Count the refreshes waiting for their turn right now, in every process.
+    """
+    now = time.time()
+    return sum(1 for until in (cache.get(WAITING_KEY) or {}).values() if until > now)
+
+
+@contextmanager
+def _bucket_guard(scope):
+    """
+    Try to hold exclusive use of a scope's bucket, or of the record of waiting refreshes, for a moment.
+    """
+    key = BUCKET_GUARD_KEY.format(scope)
+    token = uuid4().hex
+    deadline = time.monotonic() + BUCKET_GUARD_WAIT
+    acquired = cache.add(key, token, timeout=BUCKET_GUARD_WAIT * 5)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.01)
+        acquired = cache.add(key, token, timeout=BUCKET_GUARD_WAIT * 5)
+    if not acquired:
+        log.warning('Updating the %s write throttle without exclusive use of it.', scope)
+    try:
+        yield
+    finally:
+        if acquired and cache.get(key) == token:
+            cache.delete(key)
+
+
+def _reserve(scopes, blocks, max_seconds):
+    """
+    Draw blocks from the token buckets of several scopes, returning how many seconds to wait before writing them.
+
+    Each bucket holds a second's worth of blocks. Rather than a count of tokens, which would need refilling,
+    it's stored as the time at which it will next be full, so there's only one number to share. Draws may
+    overdraw a bucket, making later draws wait for it to refill. Raises RefreshThrottled without drawing from
+    any of the buckets if the wait under any one of them would be longer than max_seconds.
+    """
+    with ExitStack() as stack:
+        # Guards are always taken in the same order, so reservations can't deadlock each other.
+        for scope, _rate in scopes:
+            stack.enter_context(_bucket_guard(scope))
+        now = time.time()
+        stored = cache.get_many([BUCKET_KEY.format(scope) for scope, _rate in scopes])
+        draws = []
+        for scope, rate in scopes:
+            key = BUCKET_KEY.format(scope)
+            full_at = max(stored.get(key) or now, now) + blocks / rate
+            if full_at - now - 1 > max_seconds:
+                increment('section_to_course_refresh_failures_total', reason='throttled')
+                raise RefreshThrottled(f'Timed out waiting to write {blocks} blocks under the {scope} throttle.')
+            draws.append((key, full_at))
+        for key, full_at in draws:
+            cache.set(key, full_at, timeout=int(full_at - now) + 60)
+    return max(max(full_at - now - 1, 0) for _key, full_at in draws)
+
+
+def admit_blocks(destination_course_key, blocks, wait=None):
+    """
+    Wait until some blocks may be written into a destination course without going over the write rates.
+
+    Raises RefreshThrottled if that would take longer than wait seconds, which defaults to
+    SECTION_TO_COURSE_THROTTLE_WAIT.
+    """
+    scopes = rate_limits(destination_course_key.org)
+    if not scopes:
+        return
+    _note_org(destination_course_key.org)
+    wait = _reserve(scopes, blocks, max_wait() if wait is None else wait)
+    if wait:
+        log.info('Waiting %.1f seconds to write %s blocks into %s.', wait, blocks, destination_course_key)
+        with _waiting(wait):
+            time.sleep(wait)
+
+
+def throttle_state():
+    """
+    Get the state of every throttle in use, for display in the admin.
+
+    Returns a list of dictionaries, one for every refresh and one for each organization throttled recently,
+    saying how many refreshes are running and how many blocks are waiting to be written, against their limits.
+    """
+    if not any(
+        getattr(settings, name, None) for name in (
+            'SECTION_TO_COURSE_MAX_REFRESHES',
+            'SECTION_TO_COURSE_MAX_REFRESHES_PER_ORG',
+            'SECTION_TO_COURSE_BLOCKS_PER_SECOND',
+            'SECTION_TO_COURSE_BLOCKS_PER_SECOND_PER_ORG',
+        )
+    ):
+        return []
+    scopes = [(GLOBAL_SCOPE, None)] + [(org_scope(org), org) for org in sorted(cache.get(ORGS_KEY) or ())]
+    now = time.time()
+    rows = []
+    for scope, org in scopes:
+        if org is None:
+            refresh_limit = getattr(settings, 'SECTION_TO_COURSE_MAX_REFRESHES', None)
+            rate = getattr(settings, 'SECTION_TO_COURSE_BLOCKS_PER_SECOND', None)
+        else:
+            refresh_limit = getattr(settings, 'SECTION_TO_COURSE_MAX_REFRESHES_PER_ORG', None)
+            rate = getattr(settings, 'SECTION_TO_COURSE_BLOCKS_PER_SECOND_PER_ORG', None)
+        running = len(cache.get_many([SLOT_KEY.format(scope, number) for number in range(refresh_limit or 0)]))
+        backlog = max((cache.get(BUCKET_KEY.format(scope)) or now) - now - 1, 0)
+        rows.append({
+            'org': org,
+            'refreshes': running,
+            'refresh_limit': refresh_limit,
+            'blocks_waiting': int(backlog * rate) if rate else 0,
+            'blocks_per_second': rate,
+        })
+    return rows
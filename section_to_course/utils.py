@@ -1,21 +1,288 @@
 """
 Utility functions for section_to_course.
 """
+import time
+from collections import defaultdict, namedtuple
+from functools import wraps
+from itertools import count
 
+from django.core import validators
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
 from django.utils import timezone
+from django.utils.translation import gettext as _
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.locator import BlockUsageLocator, CourseLocator
 
+from section_to_course.assets import copy_assets, referenced_assets
 from section_to_course.compat import (
     block_key_class,
+    block_version,
+    create_course,
     derived_key,
     duplicate_block,
     modulestore,
     not_found_exception,
     update_from_source,
 )
-from section_to_course.models import SectionToCourseLink
+from section_to_course.linked_keys import links_changed
+from section_to_course.locks import RefreshInProgress, destination_lock
+from section_to_course.lookups import organization_options
+from section_to_course.metrics import count_failures, increment, observe
+from section_to_course.models import SectionToCourseBlockMap, SectionToCourseLink
+from section_to_course.profiling import counting
+from section_to_course.progress import COPYING, DONE, LOADING, PUBLISHING, SAVING, ProgressTracker
+from section_to_course.search import course_index
+from section_to_course.throttle import admit_blocks, refresh_slot
 
+# Studio's limit on the combined length of the org, number and run of a course key.
+MAX_COURSE_KEY_LENGTH = 65
 
-def paste_from_template(*, source_block_usage_key, destination_course_key, user):
+CopiedBlock = namedtuple('CopiedBlock', ['source_block_id', 'destination_block_id', 'block_type', 'source_version'])
+
+
+class SectionToCourseLinkBatch:
+    """
+    Collects changes to section to course links and saves them together.
+
+    Saving a link one at a time takes a lookup and then an insert or update for each link. A batch looks
+    up every pending link at once, then bulk updates the ones which exist and bulk creates the rest, all
+    in a single transaction. The map of which blocks each section was copied to is replaced in the same
+    transaction. Use it as a context manager to make sure everything is flushed at the end.
+    """
+
+    def __init__(self, batch_size=500):
+        """
+        Start an empty batch, which will be flushed automatically whenever it reaches batch_size links.
+        """
+        self.batch_size = batch_size
+        self.pending = {}
+        self.pending_blocks = {}
+
+    def __enter__(self):
+        """
+        Use the batch as a context manager.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Save any pending links. The content of these has already been copied, so we save them even on errors.
+        """
+        self.flush()
+
+    def add(self, *, source_block_usage_key, destination_course_key, destination_section_id, copied_blocks=None):
+        """
+        Record that a section has just been copied into a course.
+
+        If given, copied_blocks is a list of CopiedBlock saying where each block of the section was copied to,
+        which replaces the link's block map. Returns the link, which will only have a primary key once the
+        batch has been flushed.
+        """
+        link = SectionToCourseLink(
+            source_course_id=source_block_usage_key.course_key,
+            destination_course_id=destination_course_key,
+            source_section_id=source_block_usage_key,
+            destination_section_id=destination_section_id,
+            last_refresh=timezone.now(),
+        )
+        self.pending[self.unique_key(link)] = link
+        if copied_blocks is not None:
+            self.pending_blocks[self.unique_key(link)] = copied_blocks
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return link
+
+    @staticmethod
+    def unique_key(link):
+        """
+        Get the values which uniquely identify a link.
+        """
+        return str(link.source_course_id), str(link.destination_course_id), str(link.source_section_id)
+
+    def flush(self):
+        """
+        Save all pending links.
+        """
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        pending_blocks, self.pending_blocks = self.pending_blocks, {}
+        now = timezone.now()
+        with transaction.atomic(using=router.db_for_write(SectionToCourseLink)):
+            existing = {
+                self.unique_key(link): link
+                for link in SectionToCourseLink.objects.filter(
+                    destination_course_id__in={link.destination_course_id for link in pending.values()},
+                    source_section_id__in={link.source_section_id for link in pending.values()},
+                ).only('id', 'created', 'source_course_id', 'destination_course_id', 'source_section_id')
+            }
+            to_update, to_create = [], []
+            for key, link in pending.items():
+                if key in existing:
+                    link.pk = existing[key].pk
+                    link.created = existing[key].created
+                    link.modified = now
+                    to_update.append(link)
+                else:
+                    to_create.append(link)
+            SectionToCourseLink.objects.bulk_update(
+                to_update, ['destination_section_id', 'last_refresh', 'modified'], batch_size=self.batch_size,
+            )
+            SectionToCourseLink.objects.bulk_create(to_create, batch_size=self.batch_size)
+            if to_create:
+                # Bulk inserts don't send post_save, so let the linked key sets know ourselves.
+                links_changed()
+                if to_create[0].pk is None:
+                    self._fill_primary_keys(to_create)
+            if pending_blocks:
+                self._save_block_maps(
+                    {key: pending[key] for key in pending_blocks}, pending_blocks, replace=to_update, now=now,
+                )
+
+    def _save_block_maps(self, links, copied_blocks, *, replace, now):
+        """
+        Save the block maps of links, given mappings of their unique keys to them and to their copied blocks.
+
+        Existing maps of the links in replace are deleted first. New links can't have any yet.
+        """
+        replaced_ids = [link.pk for link in replace if self.unique_key(link) in copied_blocks]
+        if replaced_ids:
+            SectionToCourseBlockMap.objects.filter(link_id__in=replaced_ids).delete()
+        SectionToCourseBlockMap.objects.bulk_create(
+            [
+                SectionToCourseBlockMap(link=links[key], last_copied=now, **copied._asdict())
+                for key, blocks in copied_blocks.items()
+                for copied in blocks
+            ],
+            batch_size=self.batch_size,
+        )
+
+    def _fill_primary_keys(self, links):
+        """
+        Look up the primary keys of newly created links, on databases which don't return them from bulk inserts.
+        """
+        created = {
+            self.unique_key(link): link.pk
+            for link in SectionToCourseLink.objects.filter(
+                destination_course_id__in={link.destination_course_id for link in links},
+                source_section_id__in={link.source_section_id for link in links},
+            ).only('id', 'source_course_id', 'destination_course_id', 'source_section_id')
+        }
+        for link in links:
+            link.pk = created[self.unique_key(link)]
+            # Django considers bulk created objects unsaved unless it got their keys back.
+            link._state.adding = False  # pylint: disable=protected-access
+
+
+def count_blocks(block):
+    """
+    Count a block and all of its descendants.
+    """
+    return 1 + sum(count_blocks(child) for child in block.get_children())
+
+
+def derive_copied_blocks(source_block, destination_usage_key):
+    """
+    Work out where a section and each of its descendants were copied to, without loading the copies.
+
+    copy_from_template derives the ID of each copy from the course key of the source keys it's given, the
+    source block and the new parent of the copy, so they can be derived again from the source section alone.
+    Returns a list of CopiedBlock, starting with the section itself.
+    """
+    # The section's children are the source keys copy_from_template is given, so their course key is the one
+    # it derives every copy's ID from.
+    source_course_key = next(iter(source_block.children), source_block.location).course_key
+    destination_course_key = destination_usage_key.course_key
+    copies = []
+    stack = [(source_block, destination_usage_key)]
+    while stack:
+        block, destination = stack.pop()
+        copies.append(CopiedBlock(block.location, destination, block.location.block_type, block_version(block)))
+        parent_key = block_key_class()(destination.block_type, destination.block_id)
+        for child in block.get_children():
+            child_key = derived_key(
+                source_course_key,
+                block_key_class()(child.location.block_type, child.location.block_id),
+                parent_key,
+            )
+            stack.append((child, destination_course_key.make_usage_key(child_key.type, child_key.id)))
+    return copies
+
+
+def load_source_section(source_block_usage_key):
+    """
+    Load a section with all of its descendants, ready to be copied.
+
+    The whole subtree is loaded up front, since we'll be copying all of it anyway.
+    """
+    return counting(modulestore(), 'modulestore').get_item(source_block_usage_key, depth=None)
+
+
+def closing_connections(func):
+    """
+    Wrap a function run in a worker thread, so that it closes the thread's database connections once it's done.
+
+    Each thread gets its own database connections, which would otherwise be left open.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return wrapper
+
+
+def create_course_from_sections(
+    *, source_block_usage_keys, user, org, number, run, display_name, throttle_wait=None,
+):
+    """
+    Create a new course and copy several sections into it, in order.
+
+    The sections are loaded, their blocks admitted under the write rates and a turn taken before the course
+    is created, so that a creation which is throttled doesn't leave an empty course behind. Raises
+    RefreshThrottled if that would take longer than throttle_wait seconds. Returns the new links.
+    """
+    source_block_usage_keys = list(source_block_usage_keys)
+    source_blocks = [load_source_section(usage_key) for usage_key in source_block_usage_keys]
+    course_key = CourseLocator(org, number, run)
+    admit_blocks(course_key, sum(count_blocks(block) for block in source_blocks), wait=throttle_wait)
+    with refresh_slot(course_key, wait=throttle_wait):
+        course = create_course(user=user, org=org, number=number, run=run, display_name=display_name)
+        return paste_sections(
+            destination_course_key=course.id,
+            source_block_usage_keys=source_block_usage_keys,
+            user=user,
+            destination_course=course,
+            source_blocks=source_blocks,
+            admit=False,
+        )
+
+
+def create_course_from_section(*, source_block_usage_key, **kwargs):
+    """
+    Create a new course and copy a section into it. Returns the new link.
+
+    See create_course_from_sections.
+    """
+    return create_course_from_sections(source_block_usage_keys=[source_block_usage_key], **kwargs)[0]
+
+
+def paste_from_template(
+    *,
+    source_block_usage_key,
+    destination_course_key,
+    user,
+    progress=None,
+    link_batch=None,
+    publish=True,
+    asset_report=None,
+    destination_course=None,
+    source_block=None,
+    admit=True,
+    throttle_wait=None,
+):
     """
     Copy a block to a destination course.
 
@@ -23,13 +290,75 @@ def paste_from_template(*, source_block_usage_key, destination_course_key, user)
     the destination course, overwriting any previous copy of that
     block in the destination course. It will also copy over all the block's
     children and any files it determines to be related.
+
+    If given, progress is called with a ProgressEvent as each phase of the copy starts.
+
+    If a SectionToCourseLinkBatch is given, the link is added to it rather than saved right away.
+
+    If publish is False, the copy is left as a draft for the caller to publish along with others. See
+    publish_blocks.
+
+    Static assets the block refers to are copied unless the destination already has identical copies. If
+    an AssetCopyReport is given, it is updated with how many were copied and skipped.
+
+    Callers which already have the destination course, or the source block loaded with all of its
+    descendants, can pass them in to save loading them again.
+
+    The section's blocks are admitted under the write rates before the destination's turn and lock are taken,
+    unless admit is False because the caller has already admitted them. See admit_blocks.
+
+    Raises RefreshInProgress if another refresh of the destination course doesn't finish in time, or
+    RefreshThrottled if it would have to wait longer than throttle_wait seconds, which defaults to
+    SECTION_TO_COURSE_THROTTLE_WAIT, for its turn to write to the modulestore.
+    """
+    if not isinstance(progress, ProgressTracker):
+        progress = ProgressTracker(progress)
+        progress.start_link(0, source_block_usage_key)
+    # Refreshes skipped because the destination is busy or throttled are counted where that's found out.
+    with count_failures(unless=RefreshInProgress):
+        progress.report(LOADING)
+        block = source_block or load_source_section(source_block_usage_key)
+        blocks_total = count_blocks(block)
+        if admit:
+            admit_blocks(destination_course_key, blocks_total, wait=throttle_wait)
+        with refresh_slot(destination_course_key, wait=throttle_wait), destination_lock(destination_course_key):
+            return _paste_loaded_section(
+                block,
+                blocks_total=blocks_total,
+                source_block_usage_key=source_block_usage_key,
+                destination_course_key=destination_course_key,
+                user=user,
+                progress=progress,
+                link_batch=link_batch,
+                publish=publish,
+                asset_report=asset_report,
+                destination_course=destination_course,
+            )
+
+
+def _paste_loaded_section(
+    block,
+    *,
+    blocks_total,
+    source_block_usage_key,
+    destination_course_key,
+    user,
+    progress,
+    link_batch,
+    publish,
+    asset_report,
+    destination_course,
+):
+    """
+    Copy a loaded section into a destination course, once paste_from_template has its turn and lock.
     """
-    store = modulestore()
-    destination_course = store.get_course(destination_course_key)
+    store = counting(modulestore(), 'modulestore')
+    if destination_course is None:
+        destination_course = store.get_course(destination_course_key)
     if not destination_course:
         raise not_found_exception()(f'Course {destination_course_key} could not be found!')
     block_key = block_key_class()(source_block_usage_key.block_type, source_block_usage_key.block_id)
-    block = store.get_item(source_block_usage_key)
+    progress.report(COPYING, blocks_copied=0, blocks_total=blocks_total)
     with store.bulk_operations(destination_course_key):
         destination_key = derived_key(destination_course_key, block_key, destination_course)
         destination_usage_key = destination_course_key.make_usage_key(
@@ -47,19 +376,268 @@ def paste_from_template(*, source_block_usage_key, destination_course_key, user)
                 block=block,
             )
             dest_block = store.get_item(dest_block_location)
+        progress.report(COPYING, blocks_copied=1)
+        # Upstream copies every child in one call, replacing any it isn't given, so this is as fine-grained
+        # as progress through the copy can get.
         dest_block.children = store.copy_from_template(
             source_keys=block.children, dest_key=dest_block.scope_ids.usage_id, user_id=user.id,
         )
-        store.publish(dest_block.scope_ids.usage_id, user.id)
-    obj, _ = SectionToCourseLink.objects.update_or_create(
-        source_course_id=source_block_usage_key.course_key,
-        destination_course_id=destination_course_key,
-        source_section_id=source_block_usage_key,
-        defaults={
-            'last_refresh': timezone.now(),
-            # Not part of the unique constraint, so it must be in the defaults to
-            # avoid triggering a constraint violation.
-            'destination_section_id': dest_block.scope_ids.usage_id,
-        },
-    )
+        progress.report(COPYING, blocks_copied=blocks_total)
+        copy_assets(
+            referenced_assets(block),
+            source_course_key=source_block_usage_key.course_key,
+            destination_course_key=destination_course_key,
+            report=asset_report,
+        )
+        increment('section_to_course_blocks_copied_total', blocks_total)
+        if publish:
+            progress.report(PUBLISHING, blocks_copied=blocks_total)
+            store.publish(dest_block.scope_ids.usage_id, user.id)
+    progress.report(SAVING)
+    link_kwargs = {
+        'source_block_usage_key': source_block_usage_key,
+        'destination_course_key': destination_course_key,
+        'destination_section_id': dest_block.scope_ids.usage_id,
+        'copied_blocks': derive_copied_blocks(block, dest_block.scope_ids.usage_id),
+    }
+    if link_batch is None:
+        obj = save_link(**link_kwargs)
+    else:
+        obj = link_batch.add(**link_kwargs)
+    progress.report(DONE)
     return obj
+
+
+def save_link(*, source_block_usage_key, destination_course_key, destination_section_id, copied_blocks):
+    """
+    Save the link for a section which has just been copied into a course, along with its block map.
+
+    For a single link, this takes fewer queries than going through a SectionToCourseLinkBatch.
+    """
+    now = timezone.now()
+    with transaction.atomic(using=router.db_for_write(SectionToCourseLink), savepoint=False):
+        obj, created = SectionToCourseLink.objects.update_or_create(
+            source_course_id=source_block_usage_key.course_key,
+            destination_course_id=destination_course_key,
+            source_section_id=source_block_usage_key,
+            defaults={
+                'last_refresh': now,
+                # Not part of the unique constraint, so it must be in the defaults to
+                # avoid triggering a constraint violation.
+                'destination_section_id': destination_section_id,
+            },
+        )
+        if not created:
+            SectionToCourseBlockMap.objects.filter(link=obj).delete()
+        SectionToCourseBlockMap.objects.bulk_create([
+            SectionToCourseBlockMap(link=obj, last_copied=now, **copied._asdict()) for copied in copied_blocks
+        ])
+    return obj
+
+
+def publish_blocks(usage_keys, *, user):
+    """
+    Publish several blocks from the same course at once.
+
+    The modulestore holds back its course published signal until the outermost bulk operation on a course
+    ends, so publishing everything in one bulk operation means the platform's handlers for that signal,
+    like outline generation and search indexing, only run once for the course.
+    """
+    if not usage_keys:
+        return
+    store = counting(modulestore(), 'modulestore')
+    started = time.perf_counter()
+    with store.bulk_operations(usage_keys[0].course_key):
+        for usage_key in usage_keys:
+            store.publish(usage_key, user.id)
+    observe('section_to_course_refresh_phase_seconds', time.perf_counter() - started, phase=PUBLISHING)
+
+
+def paste_sections(
+    *,
+    source_block_usage_keys,
+    destination_course_key,
+    user,
+    progress=None,
+    asset_report=None,
+    destination_course=None,
+    source_blocks=None,
+    admit=True,
+):
+    """
+    Copy several sections, possibly from different courses, into one destination course, in order.
+
+    This works like calling paste_from_template for each section, except that everything is copied under
+    one bulk operation and published once at the end, and the links are saved together in one transaction.
+    Callers which already have the sections loaded can pass them in as source_blocks, in the same order.
+    Unless admit is False, the blocks of every section are admitted together before the destination's turn
+    and lock are taken.
+
+    Raises RefreshInProgress if another refresh of the destination course doesn't finish in time, or
+    RefreshThrottled if it would have to wait too long for its turn. Returns the links, in order.
+    """
+    source_block_usage_keys = list(source_block_usage_keys)
+    if source_blocks is None:
+        source_blocks = [load_source_section(usage_key) for usage_key in source_block_usage_keys]
+    if admit:
+        admit_blocks(destination_course_key, sum(count_blocks(block) for block in source_blocks))
+    tracker = ProgressTracker(progress, link_count=len(source_block_usage_keys))
+    store = counting(modulestore(), 'modulestore')
+    links = []
+    with refresh_slot(destination_course_key), destination_lock(destination_course_key), \
+            store.bulk_operations(destination_course_key):
+        with SectionToCourseLinkBatch(batch_size=max(len(source_block_usage_keys), 1)) as link_batch:
+            try:
+                for position, (usage_key, source_block) in enumerate(zip(source_block_usage_keys, source_blocks)):
+                    tracker.start_link(position, usage_key)
+                    links.append(paste_from_template(
+                        source_block_usage_key=usage_key,
+                        destination_course_key=destination_course_key,
+                        user=user,
+                        progress=tracker,
+                        link_batch=link_batch,
+                        publish=False,
+                        asset_report=asset_report,
+                        destination_course=destination_course,
+                        source_block=source_block,
+                        admit=False,
+                    ))
+            finally:
+                # Publish whatever we managed to copy, even if a later copy failed, since its link is saved too.
+                if links:
+                    publish_blocks([link.destination_section_id for link in links], user=user)
+    return links
+
+
+def refresh_links(links, *, user, progress=None, defer_publish=True, asset_report=None, throttle_wait=None):
+    """
+    Refresh several section to course links from their sources.
+
+    If given, progress is called with a ProgressEvent covering all of the links as each phase of each
+    refresh starts.
+
+    Links are refreshed together with any others sharing their destination course. Unless defer_publish is
+    False, all copies into a destination are staged as drafts and published together at the end, so that
+    each destination course is only published once.
+
+    If an AssetCopyReport is given, it is updated with the static assets copied and skipped.
+
+    The sections copied into each destination are loaded, and their blocks admitted under the write rates,
+    before the destination's turn and lock are taken. Links whose destination course is being refreshed
+    elsewhere for longer than SECTION_TO_COURSE_LOCK_WAIT, or which would wait longer than throttle_wait
+    seconds for their turn to write to the modulestore, are skipped. Returns the links which were refreshed.
+    """
+    links = list(links)
+    tracker = ProgressTracker(progress, link_count=len(links))
+    by_destination = defaultdict(list)
+    for link in links:
+        by_destination[str(link.destination_course_id)].append(link)
+    positions = count()
+    refreshed = []
+    store = counting(modulestore(), 'modulestore')
+    with SectionToCourseLinkBatch() as link_batch:
+        for destination_links in by_destination.values():
+            destination_course_key = destination_links[0].destination_course_id
+            started = 0
+            try:
+                source_blocks = [load_source_section(link.source_section_id) for link in destination_links]
+                admit_blocks(
+                    destination_course_key, sum(count_blocks(block) for block in source_blocks), wait=throttle_wait,
+                )
+                with refresh_slot(destination_course_key, wait=throttle_wait), \
+                        destination_lock(destination_course_key), store.bulk_operations(destination_course_key):
+                    staged = []
+                    try:
+                        for link, source_block in zip(destination_links, source_blocks):
+                            tracker.start_link(next(positions), link.source_section_id)
+                            started += 1
+                            refreshed_link = paste_from_template(
+                                destination_course_key=destination_course_key,
+                                source_block_usage_key=link.source_section_id,
+                                user=user,
+                                progress=tracker,
+                                link_batch=link_batch,
+                                publish=not defer_publish,
+                                asset_report=asset_report,
+                                source_block=source_block,
+                                admit=False,
+                            )
+                            refreshed.append(refreshed_link)
+                            staged.append(refreshed_link.destination_section_id)
+                    finally:
+                        # Publish whatever we managed to copy, even if a later copy failed.
+                        if defer_publish and staged:
+                            publish_blocks(staged, user=user)
+            except RefreshInProgress:
+                # The blocks are admitted and the turn and lock taken before any copies start, so this skips
+                # every link to the destination.
+                for _link in destination_links[started:]:
+                    next(positions)
+    return refreshed
+
+
+def validate_new_courses(rows):
+    """
+    Check whether several proposed section-based courses could be created.
+
+    Each row is a dictionary with the org, number and run of the new course and the source_section_id to
+    create it from. Rather than looking things up row by row, every row is checked against a handful of
+    set-based lookups. Returns a verdict for each row, in order, with a list of any errors found.
+    """
+    org_choices = {short_name for short_name, _name in organization_options() if short_name}
+    courses = course_index().scope()
+    section_keys = {}
+    for position, row in enumerate(rows):
+        try:
+            section_keys[position] = BlockUsageLocator.from_string(str(row.get('source_section_id', '')))
+        except InvalidKeyError:
+            pass
+    linked_sections = set(
+        SectionToCourseLink.objects.filter(
+            source_section_id__in=list(section_keys.values()),
+        ).values_list('source_section_id', flat=True)
+    )
+    seen_course_keys = set()
+    seen_sections = set()
+    verdicts = []
+    for position, row in enumerate(rows):
+        errors = []
+        org, number, run = (str(row.get(field, '')).strip() for field in ('org', 'number', 'run'))
+        course_key = None
+        for name, value in (('number', number), ('run', run)):
+            try:
+                validators.validate_slug(value)
+            except ValidationError:
+                errors.append(_('The course {name} must be a non-empty slug.').format(name=name))
+        if org not in org_choices:
+            errors.append(_('{org} is not a known organization.').format(org=org))
+        if len(org + number + run) > MAX_COURSE_KEY_LENGTH:
+            errors.append(
+                _('The course key is too long. Org, number, and run must be less than 65 characters total.'),
+            )
+        elif not errors:
+            course_key = CourseLocator(org, number, run)
+            if courses.contains_ignoring_case(course_key):
+                errors.append(
+                    _('A course with this number, org, and run already exists. Please choose different values.'),
+                )
+            elif str(course_key).lower() in seen_course_keys:
+                errors.append(_('An earlier row would create a course with this number, org, and run.'))
+            seen_course_keys.add(str(course_key).lower())
+        section_key = section_keys.get(position)
+        if section_key is None:
+            errors.append(_('The source section ID is not a valid usage key.'))
+        elif section_key in linked_sections:
+            errors.append(_('This section has already been made into a course.'))
+        elif section_key in seen_sections:
+            errors.append(_('An earlier row would make this section into a course.'))
+        elif not courses.contains_ignoring_case(section_key.course_key):
+            errors.append(_('The source course does not exist.'))
+        if section_key is not None:
+            seen_sections.add(section_key)
+        verdicts.append({
+            'valid': not errors,
+            'course_id': str(course_key) if course_key else None,
+            'errors': errors,
+        })
+    return verdicts
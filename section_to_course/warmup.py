@@ -0,0 +1,116 @@
+"""
+Warming the caches section_to_course relies on, ahead of traffic.
+
+Straight after a deploy, every cache is cold, and the first staff to open the admin wait while the course
+index is built, organizations are listed and section lists are loaded. Warming loads each of them up front,
+timing each one so slow caches stand out.
+
+Some of these caches are shared through Django's cache, and others are kept by each process, so the
+management command only helps with the shared ones. The process-local ones are warmed by a background
+thread, which each process serving requests starts on its first request when SECTION_TO_COURSE_WARM_UP_ON_START
+is on. Management commands, and servers' master processes which fork workers, never serve a request, so they
+never warm up.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Max
+
+from section_to_course.linked_keys import linked_destination_courses, linked_source_sections
+from section_to_course.lookups import get_course_sections, organization_options
+from section_to_course.models import SectionToCourseLink
+from section_to_course.search import course_index
+from section_to_course.utils import closing_connections
+
+log = logging.getLogger(__name__)
+
+
+def warm_up_section_count():
+    """
+    Get the number of most recently used source courses whose sections are loaded when warming up.
+    """
+    return getattr(settings, 'SECTION_TO_COURSE_WARM_UP_SECTIONS', 50)
+
+
+def recent_source_courses(limit):
+    """
+    Get the keys of the source courses most recently copied from or refreshed, most recent first.
+    """
+    return list(
+        SectionToCourseLink.objects.for_reads().values('source_course_id').annotate(
+            last_used=Max('modified'),
+        ).order_by('-last_used').values_list('source_course_id', flat=True)[:limit]
+    )
+
+
+def warm_course_index():
+    """
+    Load the index of every course, used by the course autocomplete and new course validation.
+    """
+    course_index().scope()
+
+
+def warm_linked_keys():
+    """
+    Load the sets of courses and sections which already have links.
+    """
+    linked_destination_courses()
+    linked_source_sections()
+
+
+def warm_sections(limit=None):
+    """
+    Load the sections of the most recently used source courses, used by the section autocomplete.
+    """
+    if limit is None:
+        limit = warm_up_section_count()
+    for course_key in recent_source_courses(limit):
+        get_course_sections(course_key)
+
+
+WARMERS = (
+    ('course index', warm_course_index),
+    ('organization options', organization_options),
+    ('linked keys', warm_linked_keys),
+    ('sections', warm_sections),
+)
+
+
+def warm_caches(names=None):
+    """
+    Warm caches, all of them or only those named, yielding the name of each with the seconds it took.
+    """
+    for name, warmer in WARMERS:
+        if names is not None and name not in names:
+            continue
+        started = time.perf_counter()
+        warmer()
+        yield name, time.perf_counter() - started
+
+
+@closing_connections
+def _warm_up_in_thread():
+    """
+    Warm every cache in a background thread, logging how long each took.
+    """
+    try:
+        for name, elapsed in warm_caches():
+            log.info('Warmed the section_to_course %s cache in %.3f seconds.', name, elapsed)
+    except Exception:  # pylint: disable=broad-except
+        # A failed warm-up only means the first requests are slower, which is no reason to take anything down.
+        log.exception('Failed to warm the section_to_course caches.')
+
+
+def start_warm_up():
+    """
+    Start warming the caches in the background if SECTION_TO_COURSE_WARM_UP_ON_START is on.
+
+    Returns the thread, or None if warming up is turned off.
+    """
+    if not getattr(settings, 'SECTION_TO_COURSE_WARM_UP_ON_START', False):
+        return None
+    thread = threading.Thread(target=_warm_up_in_thread, name='section_to_course_warm_up', daemon=True)
+    thread.start()
+    return thread